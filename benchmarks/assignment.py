@@ -0,0 +1,77 @@
+"""Симуляция дня записи: сколько слотов заполняет каждая стратегия выбора мастера.
+
+Поток заявок на услуги с мастерами: часть пользователей просит конкретного
+специалиста (популярность неравномерная), остальные — «любого». Если просьба
+не выполнима, пользователь пробует пару соседних слотов и уходит.
+
+Запуск из корня проекта:
+    python -m benchmarks.assignment               # 50 дней на стратегию
+    python -m benchmarks.assignment --days 200 --named 0.5
+"""
+import argparse
+import asyncio
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.run import InMemoryRepository  # noqa: E402
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG  # noqa: E402
+from services.booking_service import BookingService  # noqa: E402
+from services.master_assignment import STRATEGIES, get_strategy  # noqa: E402
+
+DEMAND = 1.2       # заявок на одно место за день
+RETRIES = 2        # сколько следующих слотов пробует отказанный пользователь
+
+
+async def simulate_day(strategy: str, seed: int, named: float) -> int:
+    rng = random.Random(seed)
+    service = BookingService(InMemoryRepository({ev: [] for ev in EVENTS_CONFIG}),
+                             assignment=get_strategy(strategy))
+    filled = 0
+    uid = 0
+    for event, masters in MASTERS_CONFIG.items():
+        slots = service.get_slot_list(event)
+        places = sum(1 for s in slots for m in masters if s not in m.get("breaks", []))
+        # Первый мастер в конфиге самый популярный
+        weights = [len(masters) - i for i in range(len(masters))]
+        for _ in range(int(places * DEMAND)):
+            uid += 1
+            master_id = rng.choices(masters, weights)[0]["id"] if rng.random() < named else None
+            start = rng.randrange(len(slots))
+            for time_str in slots[start:start + RETRIES + 1]:
+                res = await service.execute_booking(str(uid), "", "", event, time_str, master_id=master_id)
+                if res["ok"]:
+                    filled += 1
+                    break
+    return filled
+
+
+def run(days: int, named: float, strategies: Optional[List[str]] = None) -> Dict[str, float]:
+    results = {}
+    for name in strategies or list(STRATEGIES):
+        # Одинаковые seed — все стратегии видят одинаковый поток заявок
+        total = sum(asyncio.run(simulate_day(name, seed, named)) for seed in range(days))
+        results[name] = total / days
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=50)
+    parser.add_argument("--named", type=float, default=0.4, help="доля заявок к конкретному мастеру")
+    args = parser.parse_args(argv)
+
+    results = run(args.days, args.named)
+    base = results["random"]
+    print(f"{'стратегия':<15} {'слотов/день':>12} {'vs random':>10}")
+    for name, value in sorted(results.items(), key=lambda kv: -kv[1]):
+        print(f"{name:<15} {value:>12.1f} {value / base - 1:>+9.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
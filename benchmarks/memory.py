@@ -0,0 +1,132 @@
+"""Память на записи: 100k строк таблицы в разных представлениях.
+
+Строки приходят из JSON-ответа Sheets API, поэтому у каждой ячейки свой объект
+строки — повторяющиеся время и мастер не разделяются сами по себе.
+Сравниваются:
+  dict        — словарь get_all_records на строку (кэш bot.py),
+  dataclass   — прежний BookingRecord с __dict__,
+  interned    — dict с интернированными временем и мастером (bot.py сейчас),
+  BookingRecord — slots + frozen + интернированные event/time/master_id.
+
+Запуск из корня проекта:
+    python -m benchmarks.memory                 # 100 000 записей
+    python -m benchmarks.memory --records 500000
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.run import InMemoryRepository  # noqa: E402
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG  # noqa: E402
+from infrastructure.google_sheets import COLUMNS, _parse_rows  # noqa: E402
+from services.booking_service import BookingService  # noqa: E402
+
+EVENT = "массаж"
+
+
+@dataclass
+class LegacyRecord:
+    user_id: str
+    username: str
+    full_name: str
+    event: str
+    time: str
+    master_id: str
+
+
+def sheet_payload(n: int) -> bytes:
+    """Ответ values:get на n строк одной услуги — как он приходит по сети."""
+    slots = BookingService(InMemoryRepository({})).get_slot_list(EVENT)
+    masters = [m["id"] for m in MASTERS_CONFIG[EVENT]]
+    rows = [list(COLUMNS)] + [
+        [str(100_000 + i), f"@u{i}", f"User {i}", slots[i % len(slots)], masters[i % len(masters)]]
+        for i in range(n)
+    ]
+    return json.dumps({"values": rows}, ensure_ascii=False).encode("utf-8")
+
+
+def as_dicts(rows: List[List[str]]) -> list:
+    header = rows[0]
+    return [dict(zip(header, r)) for r in rows[1:]]
+
+
+def as_interned_dicts(rows: List[List[str]]) -> list:
+    result = as_dicts(rows)
+    for row in result:
+        for key in ("Время", "Мастер/Детали"):
+            row[key] = sys.intern(row[key])
+    return result
+
+
+def as_legacy(rows: List[List[str]]) -> list:
+    # Прежний _parse_rows: словарь на строку, затем dataclass
+    header = rows[0]
+    result = []
+    for values in rows[1:]:
+        row = dict(zip(header, list(values) + [""] * (len(header) - len(values))))
+        result.append(LegacyRecord(str(row.get("ID", "")), str(row.get("Username", "")), str(row.get("ФИО", "")),
+                                   EVENT, str(row.get("Время", "")), str(row.get("Мастер/Детали", ""))))
+    return result
+
+
+VARIANTS: Dict[str, Callable[[List[List[str]]], list]] = {
+    "dict": as_dicts,
+    "dataclass": as_legacy,
+    "interned": as_interned_dicts,
+    "BookingRecord": lambda rows: _parse_rows(EVENT, rows),
+}
+
+
+def measure(payload: bytes, build: Callable[[List[List[str]]], list]) -> Dict[str, float]:
+    """Память, удерживаемая результатом (включая строки ячеек), и время разбора.
+
+    Время меряется отдельным прогоном: tracemalloc замедляет аллокации в разы.
+    """
+    rows = json.loads(payload)["values"]
+    start = time.perf_counter()
+    build(rows)
+    elapsed = time.perf_counter() - start
+    del rows
+    gc.collect()
+
+    tracemalloc.start()
+    rows = json.loads(payload)["values"]
+    records = build(rows)
+    del rows
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bytes": size / len(records), "ms": elapsed * 1e3}
+
+
+def run(n: int, variants: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    payload = sheet_payload(n)
+    return {name: measure(payload, VARIANTS[name]) for name in variants or list(VARIANTS)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    results = run(args.records)
+    base = results["dict"]["bytes"]
+    print(f"{args.records} записей «{EVENT}» (из {len(EVENTS_CONFIG)} услуг)")
+    print(f"{'представление':<15} {'байт/запись':>12} {'МБ всего':>10} {'vs dict':>8} {'разбор, мс':>11}")
+    for name, r in results.items():
+        print(f"{name:<15} {r['bytes']:>12.0f} {r['bytes'] * args.records / 2**20:>10.1f} "
+              f"{r['bytes'] / base - 1:>+7.0%} {r['ms']:>11.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
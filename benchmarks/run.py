@@ -0,0 +1,356 @@
+"""Бенчмарки горячих путей бота с контролем регрессий.
+
+Каждый сценарий прогоняется на двух объёмах данных:
+  realistic — около 500 записей на мероприятие,
+  x10       — около 5000 записей на мероприятие.
+
+Запуск из корня проекта:
+    python -m benchmarks.run                    # сравнить с baselines.json
+    python -m benchmarks.run --update           # перезаписать базовые значения
+    python -m benchmarks.run --tolerance 0.3    # допустимое замедление 30%
+    python -m benchmarks.run --only slot        # только сценарии с «slot» в имени
+    python -m benchmarks.run --runs 9           # медиана по 9 прогонам
+
+Время сценария делится на время калибровочного цикла (чистый Python: словари,
+строки, сортировка), замеренного в том же процессе перед каждым объёмом, —
+baselines.json хранит эти отношения, а не микросекунды конкретной машины.
+Каждый сценарий прогоняется --runs раз, сравнивается медиана. Код возврата 1,
+если хотя бы один сценарий медленнее базового отношения больше чем на tolerance
+и при этом больше чем на --noise-floor микросекунд: пути в единицы мкс
+дрожат на десятки процентов от прогона к прогону.
+"""
+import argparse
+import asyncio
+import itertools
+from collections import Counter
+from dataclasses import replace
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# bot.py подключается к Google Sheets при импорте — подменяем клиента,
+# как это делает tests/conftest.py
+os.environ.setdefault("TELEGRAM_TOKEN", "1234567890:ABCdefGHIjklMNOpqrsTUVwxyz123456789")
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("GOOGLE_SHEET_URL", "https://docs.google.com/spreadsheets/d/fake")
+os.environ.setdefault("GOOGLE_CREDS_PATH", "fake_creds.json")
+os.environ.setdefault("REMINDERS_DB_PATH", ":memory:")
+patch("gspread.authorize", return_value=MagicMock()).start()
+patch(
+    "oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_name",
+    return_value=MagicMock(),
+).start()
+
+import bot as bot_module  # noqa: E402
+from core.config import EVENTS_CONFIG as SERVICE_EVENTS_CONFIG  # noqa: E402
+from core.interfaces import IBookingRepository  # noqa: E402
+from core.models import BookingRecord  # noqa: E402
+from core.snapshot import EventSnapshot  # noqa: E402
+from infrastructure.column_store import EventColumns  # noqa: E402
+from presentation.callbacks import Action  # noqa: E402
+from services.booking_service import BookingService  # noqa: E402
+
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+SCALES = {"realistic": 500, "x10": 5000}
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_RUNS = 5
+# Абсолютный порог шума (мкс): меньшее замедление не считается регрессией
+NOISE_FLOOR_US = 5.0
+CALIBRATION_ROWS = 500
+
+
+# ══════════════════════════════════════════════
+#  ДАННЫЕ
+# ══════════════════════════════════════════════
+def make_sheet_cache(per_event: int) -> Dict[str, list]:
+    """Кэш bot.py: per_event строк на мероприятие, равномерно по слотам."""
+    cache = {}
+    uid = 100_000
+    for ev in bot_module.EVENTS_CONFIG:
+        slots = bot_module.get_slot_list(ev)
+        masters = bot_module.MASTERS_CONFIG.get(ev, [])
+        rows = []
+        for i in range(per_event):
+            rows.append({
+                "ID": uid,
+                "Username": f"@u{uid}",
+                "ФИО": f"User {uid}",
+                "Время": slots[i % len(slots)],
+                "Мастер/Детали": masters[i % len(masters)]["id"] if masters else "Записано",
+            })
+            uid += 1
+        cache[ev] = rows
+    return cache
+
+
+class InMemoryRepository(IBookingRepository):
+    """Репозиторий без сети — измеряем только логику BookingService."""
+
+    def __init__(self, data: Dict[str, List[BookingRecord]]):
+        self._cache = data
+
+    async def get_records(self, event: str) -> List[BookingRecord]:
+        return self._cache.get(event, [])
+
+    async def add_record(self, record: BookingRecord) -> None:
+        self._cache[record.event].append(record)
+
+    async def delete_record(self, event: str, user_id: str) -> None:
+        self._cache[event] = [r for r in self._cache[event] if r.user_id != user_id]
+
+    async def sync(self) -> None:
+        pass
+
+    def get_last_sync_time(self):
+        return None
+
+
+def make_service_records(per_event: int, free_event: str, free_slots: List[str]) -> Dict[str, List[BookingRecord]]:
+    """Записи для BookingService; слоты free_slots в free_event оставляем пустыми."""
+    probe = BookingService(InMemoryRepository({}))
+    data = {}
+    uid = 100_000
+    for ev in SERVICE_EVENTS_CONFIG:
+        slots = [s for s in probe.get_slot_list(ev) if not (ev == free_event and s in free_slots)]
+        data[ev] = []
+        for i in range(per_event):
+            data[ev].append(BookingRecord(str(uid), f"u{uid}", f"User {uid}", ev, slots[i % len(slots)], "Записано"))
+            uid += 1
+    return data
+
+
+# ══════════════════════════════════════════════
+#  ИЗМЕРЕНИЕ
+# ══════════════════════════════════════════════
+def measure(fn: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> float:
+    """Минимальное время одного вызова в микросекундах."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or number >= 1_000_000:
+            break
+        number *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def measure_async(make_coro: Callable[[], object], iterations: int, repeat: int = 5,
+                  reset: Optional[Callable[[], object]] = None) -> float:
+    """Как measure, но для корутин. reset (если задан) возвращает состояние после
+    каждого вызова и в замер не входит; тогда берётся медиана отдельных вызовов."""
+    async def run() -> float:
+        if reset is not None:
+            calls = []
+            for _ in range(repeat * iterations):
+                start = time.perf_counter()
+                await make_coro()
+                calls.append(time.perf_counter() - start)
+                await reset()
+            return statistics.median(calls)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await make_coro()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best / iterations
+
+    return asyncio.run(run()) * 1e6
+
+
+def calibration_workload() -> list:
+    """Эталонная нагрузка того же рода, что горячие пути: словари, f-строки, сортировка."""
+    counts: Dict[str, int] = {}
+    for i in range(CALIBRATION_ROWS):
+        t = f"{10 + i % 8:02d}:{i % 6 * 10:02d}"
+        counts[t] = counts.get(t, 0) + 1
+    return sorted(counts.items(), key=lambda kv: -kv[1])
+
+
+# ══════════════════════════════════════════════
+#  СЦЕНАРИИ
+# ══════════════════════════════════════════════
+def bench_scale(per_event: int) -> Dict[str, float]:
+    results = {}
+    cache = make_sheet_cache(per_event)
+    bot_module._sheet_cache = cache
+
+    uid = "777"
+    program_events = ["массаж", "макияж", "аромапсихолог", "мастерская чехова"]
+    for ev, t in zip(program_events, ["11:00", "10:00", "14:00", "15:00"]):
+        cache[ev].append({"ID": int(uid), "Время": t, "Мастер/Детали": "Записано"})
+
+    massage = cache["массаж"]
+    at_slot = [r for r in massage if r["Время"] == "12:00"]
+    suggested = bot_module.get_suggested_slots("массаж", massage, top_n=999)
+    # Программа пользователя: 7 записей в реальности, в x10 — в 10 раз больше
+    user_bookings = bot_module.get_all_user_bookings(uid) * (per_event // SCALES["realistic"])
+
+    results["get_slot_list"] = measure(lambda: bot_module.get_slot_list("массаж"))
+    results["get_suggested_slots"] = measure(
+        lambda: bot_module.get_suggested_slots("массаж", massage, top_n=999)
+    )
+    results["count_available_masters"] = measure(
+        lambda: bot_module.count_available_masters("массаж", "12:00", at_slot)
+    )
+    results["check_time_conflict"] = measure(
+        lambda: bot_module.check_time_conflict("аромапсихолог", "16:30", user_bookings)
+    )
+    results["build_services_keyboard"] = measure(
+        lambda: bot_module.build_services_keyboard(user_id=uid)
+    )
+    results["build_slot_keyboard"] = measure(
+        lambda: bot_module.build_slot_keyboard("массаж", suggested, "book")
+    )
+    results["build_program_message"] = measure(
+        lambda: bot_module.build_program_message(uid)
+    )
+    packed = bot_module.callback_codec.encode(
+        Action.MASTER, "массаж", "12:00", bot_module.MASTERS_CONFIG["массаж"][1]["id"], mode="reschedule"
+    )
+    results["callback_decode"] = measure(lambda: bot_module.callback_codec.decode(packed))
+
+    # Новая запись в свободный слот; отмена после каждого вызова в замер не входит
+    free_slots = ["14:00", "14:10"]
+    repo = InMemoryRepository(make_service_records(per_event, "аромапсихолог", free_slots))
+    service = BookingService(repo)
+    results["BookingService.execute_booking.new"] = measure_async(
+        lambda: service.execute_booking("555", "u555", "User 555", "аромапсихолог", free_slots[0]),
+        iterations=100,
+        reset=lambda: service.cancel_booking("555", "аромапсихолог"),
+    )
+
+    # Перенос туда-обратно между двумя свободными слотами: состояние после
+    # каждой пары вызовов одинаковое, поэтому меряем один и тот же путь.
+    asyncio.run(service.execute_booking("555", "u555", "User 555", "аромапсихолог", free_slots[0]))
+    targets = itertools.cycle(reversed(free_slots))
+    results["BookingService.execute_booking.reschedule"] = measure_async(
+        lambda: service.execute_booking(
+            "555", "u555", "User 555", "аромапсихолог", next(targets), is_reschedule=True
+        ),
+        iterations=2 * max(10, 10_000 // per_event),
+    )
+
+    # Занятость слотов: обход записей с чтением поля против bincount по столбцу кодов
+    records = repo._cache["массаж"]
+    columns = EventColumns("массаж", records)
+    results["slot_counts.scan"] = measure(lambda: Counter(r.time for r in records))
+    results["slot_counts.columns"] = measure(columns.slot_counts)
+
+    # Запись в снимок репозитория: новая запись и её отмена, перенос на месте
+    snapshot = EventSnapshot.build("массаж", records)
+    extra = BookingRecord("556", "u556", "User 556", "массаж", "12:00", "Записано")
+    moved = records[len(records) // 2]
+    target = replace(moved, time="13:00")
+    results["EventSnapshot.add_remove"] = measure(lambda: snapshot.added([extra]).removed({"556"}))
+    results["EventSnapshot.replaced"] = measure(lambda: snapshot.replaced(moved, target))
+
+    # Автосоставление программы при почти полной занятости (свободны только free_slots)
+    index = asyncio.run(service._occupancy())
+    events = list(SERVICE_EVENTS_CONFIG)
+    results["BookingService.plan_program"] = measure(lambda: service._plan(index, "777", events, {}))
+
+    # «Куда можно в 14:00» по всем услугам — из обратного индекса
+    results["BookingService.availability_at"] = measure_async(
+        lambda: service.availability_at("14:00", user_id="555"), iterations=1000
+    )
+    return results
+
+
+def run_all(only: Optional[str] = None, runs: int = DEFAULT_RUNS) -> Tuple[Dict[str, float], float]:
+    """Медианы по runs прогонам: отношение каждого сценария к калибровке и сама калибровка в мкс.
+
+    Калибровка меряется перед каждым объёмом, так что фоновая нагрузка на машину
+    замедляет и сценарий, и делитель.
+    """
+    samples: Dict[str, List[float]] = {}
+    units: List[float] = []
+    for _ in range(runs):
+        for scale, per_event in SCALES.items():
+            unit = measure(calibration_workload)
+            units.append(unit)
+            for name, value in bench_scale(per_event).items():
+                key = f"{name}@{scale}"
+                if only and only not in key:
+                    continue
+                samples.setdefault(key, []).append(value / unit)
+    return {key: statistics.median(values) for key, values in samples.items()}, statistics.median(units)
+
+
+def compare(results: Dict[str, float], baselines: Dict[str, float], tolerance: float, unit: float,
+            noise_floor: float = NOISE_FLOOR_US) -> List[str]:
+    """results и baselines — в долях калибровки; unit — калибровка этой машины в мкс."""
+    regressions = []
+    print(f"{'сценарий':<45} {'мкс':>12} {'база, мкс':>12} {'Δ':>8}")
+    for key, value in results.items():
+        base = baselines.get(key)
+        if base is None:
+            print(f"{key:<45} {value * unit:>12.2f} {'—':>12} {'new':>8}")
+            continue
+        delta = value / base - 1
+        mark = ""
+        if delta > tolerance and (value - base) * unit > noise_floor:
+            mark = "  ✗ РЕГРЕССИЯ"
+            regressions.append(key)
+        print(f"{key:<45} {value * unit:>12.2f} {base * unit:>12.2f} {delta:>+7.0%}{mark}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="записать результаты как новые базовые значения")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое относительное замедление (по умолчанию 0.5)")
+    parser.add_argument("--only", help="подстрока имени сценария")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help=f"число прогонов, сравнивается медиана (по умолчанию {DEFAULT_RUNS})")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR_US,
+                        help=f"замедление меньше стольких мкс не регрессия (по умолчанию {NOISE_FLOOR_US:g})")
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    args = parser.parse_args(argv)
+
+    results, unit = run_all(args.only, args.runs)
+    print(f"Калибровка: {unit:.1f} мкс\n")
+
+    baselines = {}
+    if args.baselines.exists():
+        baselines = json.loads(args.baselines.read_text(encoding="utf-8"))
+
+    if args.update:
+        baselines.update({k: round(v, 5) for k, v in results.items()})
+        args.baselines.write_text(
+            json.dumps(dict(sorted(baselines.items())), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        compare(results, {}, args.tolerance, unit)
+        print(f"\nБазовые значения сохранены в {args.baselines}")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance, unit, args.noise_floor)
+    if regressions:
+        print(f"\nРегрессии (> {args.tolerance:.0%}): {', '.join(regressions)}")
+        return 1
+    print("\nРегрессий нет ✅")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
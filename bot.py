@@ -3,20 +3,36 @@ import json
 import logging
 import os
 import re
+import sys
+from bisect import bisect_left
+from collections import Counter
 from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
 
-from aiogram import Bot, Dispatcher, types, F
+from aiogram import Bot, Dispatcher, types
 from aiogram.filters import CommandStart
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from aiohttp import web
 
+from infrastructure.telegram_outbound import (
+    OutboundDispatcher, OutboundRequestMiddleware, background_lane,
+)
+from infrastructure.adaptive_sync import AdaptiveSync
+from infrastructure.idempotency import CallbackIdempotencyMiddleware, IdempotencyCache
+from infrastructure.timer_wheel import TimerWheel
+from infrastructure.update_scheduler import UpdateScheduler, UpdateSchedulingMiddleware
+from infrastructure.webhook import TelegramWebhook
+from services.reminder_service import ReminderService, ReminderStore
+from presentation.callbacks import Action, Callback, CallbackCodec
+from core.masters import MasterMasks
+from core.slots import from_minutes, to_minutes
+
 load_dotenv()
 
 
@@ -34,13 +50,23 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_SHEET_URL = os.getenv("GOOGLE_SHEET_URL")
 GOOGLE_CREDS_PATH = os.getenv("GOOGLE_CREDS_PATH", "google_creds.json")
+REMINDERS_DB_PATH = os.getenv("REMINDERS_DB_PATH", "reminders.sqlite3")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+CALLBACK_DEDUP_SECONDS = float(os.getenv("CALLBACK_DEDUP_SECONDS", "10"))
 
 if not GOOGLE_SHEET_URL:
     raise ValueError("Переменная GOOGLE_SHEET_URL не найдена!")
 
 bot = Bot(token=TELEGRAM_TOKEN)
 dp = Dispatcher()
-scheduler = AsyncIOScheduler()
+outbound = OutboundDispatcher()
+timer_wheel = TimerWheel()
+updates = UpdateScheduler(workers=UPDATE_WORKERS)
+callback_cache = IdempotencyCache(ttl=CALLBACK_DEDUP_SECONDS)
+webhook: TelegramWebhook | None = None
 llm_client = AsyncOpenAI(
     base_url="https://openai.api.proxyapi.ru/v1", api_key=OPENAI_API_KEY
 )
@@ -133,6 +159,24 @@ MASTERS_CONFIG = {
     ],
 }
 
+# Бит на мастера и готовые маски перерывов по времени (core/masters.py)
+MASTER_MASKS = {ev: MasterMasks(ms) for ev, ms in MASTERS_CONFIG.items()}
+
+# Компактный callback_data для всех inline-кнопок (индексы вместо кириллических строк)
+callback_codec = CallbackCodec(EVENTS_CONFIG, MASTERS_CONFIG)
+
+# Обработчики кнопок по Action: dispatch_callback делает один decode и один поиск
+CallbackHandler = Callable[[types.CallbackQuery, FSMContext, Callback], Awaitable[Any]]
+CALLBACK_HANDLERS: Dict[Action, CallbackHandler] = {}
+
+
+def on_callback(action: Action):
+    def register(handler: CallbackHandler) -> CallbackHandler:
+        CALLBACK_HANDLERS[action] = handler
+        return handler
+    return register
+
+
 EVENT_ALIASES = {
     "гадалка": "гадалки", "таро": "гадалки", "таролог": "гадалки",
     "мэйкап": "макияж", "мейкап": "макияж",
@@ -231,15 +275,35 @@ def plural_places(n: int) -> str:
 # ══════════════════════════════════════════════
 #  СУПЕР-КЭШ (IN-MEMORY STATE)
 # ══════════════════════════════════════════════
-_booking_locks: dict[str, asyncio.Lock] = {}
+class _SheetLock(asyncio.Lock):
+    """Блокировка листа со счётчиком захватов: по нему background_sync видит,
+    что в лист писали (или пишут), пока он читал таблицу."""
+
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+
+    async def acquire(self) -> bool:
+        await super().acquire()
+        self.generation += 1
+        return True
+
+
+_booking_locks: dict[str, _SheetLock] = {}
 _user_locks: dict[str, asyncio.Lock] = {}
-_sheet_cache: dict[str, list] = {}
+# Значения — неизменяемые кортежи: любое изменение публикует новый кортеж одним
+# присваиванием, поэтому читатели (клавиатуры, программа) обходят его без копий
+_sheet_cache: dict[str, tuple] = {}
 _last_sync_ok: datetime | None = None
 _cache_ready: bool = False
 
-def get_lock(event: str) -> asyncio.Lock:
+def _drop_user_from_cache(event: str, uid: str) -> None:
+    _sheet_cache[event] = tuple(r for r in _sheet_cache.get(event, ()) if str(r.get("ID", "")) != uid)
+
+
+def get_lock(event: str) -> _SheetLock:
     if event not in _booking_locks:
-        _booking_locks[event] = asyncio.Lock()
+        _booking_locks[event] = _SheetLock()
     return _booking_locks[event]
 
 
@@ -249,29 +313,95 @@ def get_user_lock(user_id: str) -> asyncio.Lock:
     return _user_locks[user_id]
 
 
+_sheet_revision: str | None = None
+
+
 def _fetch_all_sheets_sync() -> dict:
     data = {}
     for ev, cfg in EVENTS_CONFIG.items():
-        data[ev] = sheet.worksheet(cfg["sheet"]).get_all_records()
+        rows = sheet.worksheet(cfg["sheet"]).get_all_records()
+        # Время и мастер повторяются в тысячах строк — одна строка-объект на значение
+        for row in rows:
+            for key in ("Время", "Мастер/Детали"):
+                if isinstance(row.get(key), str):
+                    row[key] = sys.intern(row[key])
+        data[ev] = tuple(rows)
     return data
 
 
+def _sheet_modified_sync() -> str | None:
+    """modifiedTime таблицы из Drive (один лёгкий запрос); None — узнать не удалось."""
+    try:
+        return sheet.get_lastUpdateTime()
+    except Exception as e:
+        logging.warning(f"Не удалось узнать время изменения таблицы: {e}")
+        return None
+
+
+def _row_key(row: dict) -> tuple:
+    return tuple(row.items())
+
+
+def _apply_sheet_diff(event: str, old: tuple, new: tuple) -> None:
+    """Строковая разница листа → напоминания; изменённая строка — отмена и новое."""
+    old_keys = Counter(_row_key(r) for r in old)
+    new_keys = Counter(_row_key(r) for r in new)
+    for r in old:
+        key = _row_key(r)
+        if old_keys[key] > new_keys[key]:
+            old_keys[key] -= 1
+            reminders.cancel(str(r.get("ID", "")), event)
+    for r in new:
+        key = _row_key(r)
+        if new_keys[key] > old_keys[key]:
+            new_keys[key] -= 1
+            reminders.schedule(str(r.get("ID", "")), event, str(r.get("Время", "")))
+
+
 async def sync_cache_with_google():
-    global _sheet_cache, _last_sync_ok, _cache_ready
+    global _sheet_cache, _last_sync_ok, _cache_ready, _sheet_revision
     logging.info("Скачиваю данные из Google Sheets...")
+    _sheet_revision = await asyncio.to_thread(_sheet_modified_sync)
     _sheet_cache = await asyncio.to_thread(_fetch_all_sheets_sync)
     _last_sync_ok = datetime.now()
     _cache_ready = True
+    rebuild_reminders()
     logging.info("Данные успешно загружены в память!")
 
 
-async def background_sync():
-    global _sheet_cache, _last_sync_ok
-    try:
-        _sheet_cache = await asyncio.to_thread(_fetch_all_sheets_sync)
+async def background_sync() -> int:
+    """Перечитывает таблицу, только если она изменилась; применяет разницу по листам.
+
+    Неизменённый лист сохраняет прежний кортеж кэша, изменённый публикуется
+    новым, а напоминания правятся по разнице строк, без полной пересборки.
+    Лист, в который бот писал во время чтения, откладывается до следующего
+    раза (строки могли не застать запись или отмену), и версия не запоминается.
+    Возвращает число изменённых листов. Ошибку не глушит: sync_loop удлиняет
+    интервал после неудачи, а не долбит недоступную таблицу с прежней частотой.
+    """
+    global _last_sync_ok, _sheet_revision
+    revision = await asyncio.to_thread(_sheet_modified_sync)
+    if revision is not None and revision == _sheet_revision:
         _last_sync_ok = datetime.now()
-    except Exception as e:
-        logging.error(f"Фоновая синхронизация не удалась: {e}")
+        return 0
+    locks = {ev: get_lock(ev) for ev in EVENTS_CONFIG}
+    before = {ev: (lock.generation, lock.locked()) for ev, lock in locks.items()}
+    fresh = await asyncio.to_thread(_fetch_all_sheets_sync)
+    changed, deferred = 0, False
+    for ev, rows in fresh.items():
+        lock = locks[ev]
+        if before[ev] != (lock.generation, False) or lock.locked():
+            deferred = True
+            continue
+        old = _sheet_cache.get(ev, ())
+        if rows != old:
+            _sheet_cache[ev] = rows
+            _apply_sheet_diff(ev, old, rows)
+            changed += 1
+    if not deferred:
+        _sheet_revision = revision
+    _last_sync_ok = datetime.now()
+    return changed
 
 # ══════════════════════════════════════════════
 #  HEALTH CHECK SERVER
@@ -279,6 +409,15 @@ async def background_sync():
 HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
 SYNC_STALE_MINUTES = int(os.getenv("SYNC_STALE_MINUTES", "10"))
 
+# Интервал background_sync: чаще, пока таблицу правят, реже в тишине; в пределах бюджета готовности
+sync_loop = AdaptiveSync(
+    background_sync,
+    interval=float(os.getenv("SYNC_INTERVAL_SECONDS", "120")),
+    min_interval=float(os.getenv("SYNC_MIN_SECONDS", "15")),
+    max_interval=float(os.getenv("SYNC_MAX_SECONDS", "300")),
+    budget=SYNC_STALE_MINUTES * 60,
+)
+
 async def handle_healthz(request: web.Request) -> web.Response:
     return web.json_response({"status": "alive"}, status=200)
 
@@ -308,10 +447,28 @@ async def handle_readyz(request: web.Request) -> web.Response:
     )
 
 
-async def start_health_server() -> web.AppRunner:
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.json_response(
+        {
+            "outbound": outbound.metrics(),
+            "reminders": reminders.metrics(),
+            "timers": timer_wheel.metrics(),
+            "updates": updates.metrics(),
+            "callbacks": callback_cache.metrics(),
+            "sync": sync_loop.metrics(),
+        },
+        status=200,
+    )
+
+
+async def start_health_server(webhook: TelegramWebhook | None = None) -> web.AppRunner:
     app = web.Application()
     app.router.add_get("/healthz", handle_healthz)
     app.router.add_get("/readyz", handle_readyz)
+    app.router.add_get("/metrics", handle_metrics)
+    if webhook:
+        # Апдейты Telegram принимает тот же сервер
+        webhook.register(app)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", HEALTH_PORT)
@@ -355,11 +512,12 @@ async def parse_intent(text: str) -> dict | None:
 # ══════════════════════════════════════════════
 #  ЛОГИКА ВАЛИДАЦИИ
 # ══════════════════════════════════════════════
-def find_available_master(event, time_str, bookings_at_time, preferred_name=None):
+def find_available_master(event, time_str, bookings_at_time, preferred_name=None, event_records=None):
     if event not in MASTERS_CONFIG:
         return None, None
     masters = MASTERS_CONFIG[event]
-    busy_ids = [str(r.get("Мастер/Детали", "")) for r in bookings_at_time]
+    masks = MASTER_MASKS[event]
+    free_mask = masks.free(time_str, masks.mask({str(r.get("Мастер/Детали", "")) for r in bookings_at_time}))
 
     if preferred_name:
         pn = preferred_name.lower().strip()
@@ -369,32 +527,33 @@ def find_available_master(event, time_str, bookings_at_time, preferred_name=None
             None,
         )
         if matched:
-            if time_str in matched.get("breaks", []):
+            bit = masks.bit(matched["id"])
+            if masks.on_break(time_str) & bit:
                 return None, f"У **{matched['label']}** в {time_str} перерыв 😔"
-            if matched["id"] in busy_ids:
+            if not free_mask & bit:
                 return None, f"**{matched['label']}** уже занят(а) в {time_str} 😔"
             return matched, None
 
-    for m in masters:
-        if time_str not in m.get("breaks", []) and m["id"] not in busy_ids:
-            return m, None
-    return None, None
+    free = masks.members(free_mask)
+    if not free:
+        return None, None
+    if event_records is None:
+        return free[0], None
+    # Наименее загруженный за день (при равенстве — первый по конфигу)
+    load = Counter(str(r.get("Мастер/Детали", "")) for r in event_records)
+    return min(free, key=lambda m: load[m["id"]]), None
 
 
 def count_available_masters(event, time_str, bookings_at_time, preferred_name=None) -> int:
     if event not in MASTERS_CONFIG:
         return 0
-    busy_ids = [str(r.get("Мастер/Детали", "")) for r in bookings_at_time]
-    count = 0
-    for m in MASTERS_CONFIG[event]:
-        if time_str in m.get("breaks", []) or m["id"] in busy_ids:
-            continue
-        if preferred_name:
-            pn = preferred_name.lower().strip()
-            if pn not in m["name"].lower() and pn not in m["label"].lower():
-                continue
-        count += 1
-    return count
+    masks = MASTER_MASKS[event]
+    free = masks.free(time_str, masks.mask({str(r.get("Мастер/Детали", "")) for r in bookings_at_time}))
+    if preferred_name:
+        pn = preferred_name.lower().strip()
+        free &= masks.mask(m["id"] for m in MASTERS_CONFIG[event]
+                           if pn in m["name"].lower() or pn in m["label"].lower())
+    return free.bit_count()
 
 
 def get_slot_list(event: str) -> list[str]:
@@ -403,45 +562,32 @@ def get_slot_list(event: str) -> list[str]:
         return [cfg["fixed_time"]]
     if "custom_slots" in cfg:
         return list(cfg["custom_slots"])
-    start_dt = datetime.strptime(cfg["start"], "%H:%M")
-    end_dt = datetime.strptime(cfg["end"], "%H:%M")
-    delta = timedelta(minutes=cfg["duration"])
-    slots, cur = [], start_dt
-    while cur < end_dt:
-        slots.append(cur.strftime("%H:%M"))
-        cur += delta
-    return slots
+    return [from_minutes(m) for m in range(to_minutes(cfg["start"]), to_minutes(cfg["end"]), cfg["duration"])]
 
 
 def is_valid_slot_time(event: str, time_str: str) -> tuple[bool, str | None]:
     cfg = EVENTS_CONFIG[event]
-    valid_slots = get_slot_list(event)
-
-    if time_str in valid_slots:
-        return True, None
 
     if "fixed_time" in cfg:
+        if time_str == cfg["fixed_time"]:
+            return True, None
         return False, f"**{ef(event)}** начинается строго в **{cfg['fixed_time']}** 🕒"
     if "custom_slots" in cfg:
-        return False, f"⏰ Доступные сеансы: **{', '.join(valid_slots)}**"
+        if time_str in cfg["custom_slots"]:
+            return True, None
+        return False, f"⏰ Доступные сеансы: **{', '.join(cfg['custom_slots'])}**"
 
-    start_dt = datetime.strptime(cfg["start"], "%H:%M")
-    end_dt = datetime.strptime(cfg["end"], "%H:%M")
-    req_dt = datetime.strptime(time_str, "%H:%M")
+    # Сетка равномерная: попадание и соседние слоты — целочисленная арифметика в минутах
+    start, end = to_minutes(cfg["start"]), to_minutes(cfg["end"])
+    req = to_minutes(time_str)
 
-    if req_dt < start_dt or req_dt >= end_dt:
+    if req < start or req >= end:
         return False, f"⏰ Рабочие часы: {cfg['start']} до {cfg['end']}."
 
     dur = cfg["duration"]
-    mins = int((req_dt - start_dt).total_seconds() / 60)
-    if mins % dur != 0:
-        prev = start_dt + timedelta(minutes=(mins // dur) * dur)
-        nxt = prev + timedelta(minutes=dur)
-        opts = [
-            t.strftime("%H:%M")
-            for t in (prev, nxt)
-            if start_dt <= t < end_dt
-        ]
+    prev = start + (req - start) // dur * dur
+    if prev != req:
+        opts = [from_minutes(t) for t in (prev, prev + dur) if t < end]
         return False, f"Ближайшие слоты: **{', '.join(opts)}** 🕒"
     return True, None
 
@@ -466,6 +612,15 @@ def get_suggested_slots(event, records, preferred_master=None, top_n=6) -> list[
     return slots[:top_n]
 
 
+def _slot_label(event: str, s: str, avail: int) -> str:
+    label = (
+        plural_masters(avail, event)
+        if event in MASTERS_CONFIG
+        else "осталось " + plural_places(avail)
+    )
+    return f"{s} ({label})"
+
+
 def get_available_slots(event, records, preferred_master=None) -> list[str]:
     cfg = EVENTS_CONFIG[event]
     free = []
@@ -476,15 +631,49 @@ def get_available_slots(event, records, preferred_master=None) -> list[str]:
         else:
             avail = cfg["capacity"] - len(at_slot)
         if avail > 0:
-            label = (
-                plural_masters(avail, event)
-                if event in MASTERS_CONFIG
-                else "осталось " + plural_places(avail)
-            )
-            free.append(f"{s} ({label})")
+            free.append(_slot_label(event, s, avail))
     return free
 
 
+# Сколько ближайших свободных слотов предлагать, когда выбранный занят
+NEAREST_FREE = 3
+
+
+def nearest_free_slots(event: str, time_str: str, records, k: int = NEAREST_FREE) -> list[str]:
+    """k ближайших к time_str слотов с местами (при равной удалённости — более ранний).
+
+    Записи раскладываются по времени за один проход, слоты проверяются от
+    time_str наружу до первых k свободных — без подсчёта по всему дню.
+    """
+    cfg = EVENTS_CONFIG[event]
+    by_time: dict[str, list] = {}
+    for r in records:
+        by_time.setdefault(str(r.get("Время", "")), []).append(r)
+
+    slots = get_slot_list(event)
+    minutes = [to_minutes(s) for s in slots]
+    target = to_minutes(time_str)
+    hi = bisect_left(minutes, target)
+    lo = hi - 1
+    found = []
+    while len(found) < k and (lo >= 0 or hi < len(slots)):
+        if hi < len(slots) and (lo < 0 or minutes[hi] - target < target - minutes[lo]):
+            i, hi = hi, hi + 1
+        else:
+            i, lo = lo, lo - 1
+        s = slots[i]
+        if s == time_str:
+            continue
+        at_slot = by_time.get(s, [])
+        if event in MASTERS_CONFIG:
+            avail = count_available_masters(event, s, at_slot)
+        else:
+            avail = cfg["capacity"] - len(at_slot)
+        if avail > 0:
+            found.append(_slot_label(event, s, avail))
+    return found
+
+
 def format_slots_message(slots: list[str]) -> str:
     if not slots:
         return "К сожалению, свободных окошек больше не осталось 😔"
@@ -550,19 +739,19 @@ def build_services_keyboard(user_id: str = None) -> InlineKeyboardMarkup:
         if already_booked:
             buttons.append([InlineKeyboardButton(
                 text=f"✅ {title} — вы записаны",
-                callback_data=f"my_booking_detail|{ev}",
+                callback_data=callback_codec.encode(Action.BOOKING_DETAIL, ev),
             )])
         else:
             has_slots = bool(get_suggested_slots(ev, _sheet_cache.get(ev, []), top_n=1))
             if has_slots:
                 buttons.append([InlineKeyboardButton(
                     text=f"{icon} {title}",
-                    callback_data=f"start_book|{ev}",
+                    callback_data=callback_codec.encode(Action.START_BOOK, ev),
                 )])
             else:
                 buttons.append([InlineKeyboardButton(
                     text=f"⛔ {title} — мест нет",
-                    callback_data=f"no_slots|{ev}",
+                    callback_data=callback_codec.encode(Action.NO_SLOTS, ev),
                 )])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -580,11 +769,11 @@ def build_slot_keyboard(
             avail_text = plural_places(a)
         buttons.append([InlineKeyboardButton(
             text=f"🕐 {t}  ·  {avail_text}",
-            callback_data=f"slot|{event}|{t}|{action}",
+            callback_data=callback_codec.encode(Action.SLOT, event, t, mode=action),
         )])
     buttons.append([InlineKeyboardButton(
         text="← Назад к услугам",
-        callback_data="back_to_services",
+        callback_data=callback_codec.encode(Action.BACK_TO_SERVICES),
     )])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -686,7 +875,7 @@ async def send_program(chat_id: int, user_id_str: str):
         buttons = [
             [InlineKeyboardButton(
                 text=f"{EVENT_ICONS.get(ev, '✨')} {ef(ev)}",
-                callback_data=f"start_book|{ev}",
+                callback_data=callback_codec.encode(Action.START_BOOK, ev),
             )]
             for ev in remaining_bookable
         ]
@@ -702,12 +891,26 @@ async def send_program(chat_id: int, user_id_str: str):
 
 
 async def send_reminder(user_id, event_name, time_str):
-    await bot.send_message(
-        user_id,
-        f"✨ **Напоминалочка!**\n"
-        f"Запись {ef(event_name.lower(), 'to')} начнётся через 3 минутки "
-        f"(в {time_str}). Ждём вас! 💖",
-        parse_mode="Markdown",
+    # Напоминания уступают очередь интерактивным ответам
+    with background_lane():
+        await bot.send_message(
+            user_id,
+            f"✨ **Напоминалочка!**\n"
+            f"Запись {ef(event_name.lower(), 'to')} начнётся через 3 минутки "
+            f"(в {time_str}). Ждём вас! 💖",
+            parse_mode="Markdown",
+        )
+
+
+reminders = ReminderService(ReminderStore(REMINDERS_DB_PATH), send_reminder, wheel=timer_wheel)
+
+
+def rebuild_reminders():
+    """Восстанавливает напоминания из кэша таблиц (после рестарта и синхронизации)."""
+    reminders.rebuild_from(
+        (str(r.get("ID", "")), ev, str(r.get("Время", "")))
+        for ev in EVENTS_CONFIG
+        for r in _sheet_cache.get(ev, [])
     )
 
 
@@ -770,37 +973,26 @@ async def execute_booking(
 
             if event in MASTERS_CONFIG:
                 master, merr = find_available_master(
-                    event, time_str, at_time, preferred_master
+                    event, time_str, at_time, preferred_master, records
                 )
                 if not master:
                     avail_text = format_slots_message(
-                        get_available_slots(event, records)
+                        nearest_free_slots(event, time_str, records)
                     )
                     return {
                         "ok": False,
-                        "text": merr or f"На {time_str} все заняты 😔\n💡 Свободные: {avail_text}",
+                        "text": merr or f"На {time_str} все заняты 😔\n💡 Ближайшие свободные: {avail_text}",
                     }
                 master_id = master["id"]
             elif len(at_time) >= cfg["capacity"]:
-                avail_text = format_slots_message(get_available_slots(event, records))
+                avail_text = format_slots_message(nearest_free_slots(event, time_str, records))
                 return {
                     "ok": False,
-                    "text": f"На {time_str} всё занято 😔\n💡 Свободные: {avail_text}",
+                    "text": f"На {time_str} всё занято 😔\n💡 Ближайшие свободные: {avail_text}",
                 }
 
             ws = sheet.worksheet(cfg["sheet"])
 
-            if is_reschedule:
-                def delete_row_sync():
-                    ids = [str(v) for v in ws.col_values(1)]
-                    if uid in ids:
-                        ws.delete_rows(ids.index(uid) + 1)
-
-                await asyncio.to_thread(delete_row_sync)
-                _sheet_cache[event] = [
-                    r for r in _sheet_cache[event] if str(r.get("ID", "")) != uid
-                ]
-
             new_record = {
                 "ID": user_id,
                 "Username": username,
@@ -808,24 +1000,34 @@ async def execute_booking(
                 "Время": time_str,
                 "Мастер/Детали": master_id or "Записано",
             }
-            await asyncio.to_thread(
-                ws.append_row,
-                [user_id, username, full_name, time_str, master_id or "Записано"],
-            )
-            _sheet_cache[event].append(new_record)
 
-    # Напоминание
-    now = datetime.now()
-    ev_t = datetime.strptime(time_str, "%H:%M").replace(
-        year=now.year, month=now.month, day=now.day
-    )
-    rem = ev_t - timedelta(minutes=3)
-    if rem > now:
-        scheduler.add_job(
-            send_reminder, "date", run_date=rem,
-            args=[user_id, event, time_str],
-            id=f"{uid}_{event}", replace_existing=True,
-        )
+            if is_reschedule:
+                # Перенос на месте: в строке меняются только «Время» и «Мастер/Детали»
+                def move_row_sync():
+                    ids = [str(v) for v in ws.col_values(1)]
+                    if uid not in ids:
+                        # Строку успели удалить в таблице вручную — записываем заново
+                        ws.append_row([user_id, username, full_name, time_str, master_id or "Записано"])
+                        return
+                    row = ids.index(uid) + 1
+                    ws.batch_update([{"range": f"D{row}:E{row}", "values": [[time_str, master_id or "Записано"]]}])
+
+                await asyncio.to_thread(move_row_sync)
+                # Подмена в кэше одним присваиванием: читатели не видят «записи нет»
+                _sheet_cache[event] = tuple(
+                    {**r, "Время": time_str, "Мастер/Детали": master_id or "Записано"}
+                    if str(r.get("ID", "")) == uid else r
+                    for r in _sheet_cache[event]
+                )
+            else:
+                await asyncio.to_thread(
+                    ws.append_row,
+                    [user_id, username, full_name, time_str, master_id or "Записано"],
+                )
+                _sheet_cache[event] = (*_sheet_cache.get(event, ()), new_record)
+
+    # Напоминание (срабатывает в колесе таймеров пачкой за минуту)
+    reminders.schedule(uid, event, time_str)
 
     icon = EVENT_ICONS.get(event, "✨")
     end_time = (
@@ -862,28 +1064,41 @@ async def cancel_all_bookings(user_id: int) -> str:
     if not bookings:
         return "У вас нет активных записей 😊"
 
-    cancelled = []
-    for b in bookings:
-        event = b["event"]
-        async with get_lock(event):
-            records = _sheet_cache.get(event, [])
-            if any(str(r.get("ID", "")) == uid for r in records):
-                def delete_sync(ev=event):
-                    ws = sheet.worksheet(EVENTS_CONFIG[ev]["sheet"])
-                    ids = [str(v) for v in ws.col_values(1)]
-                    if uid in ids:
-                        ws.delete_rows(ids.index(uid) + 1)
-
-                await asyncio.to_thread(delete_sync)
-                _sheet_cache[event] = [
-                    r for r in _sheet_cache[event]
-                    if str(r.get("ID", "")) != uid
-                ]
-                job_id = f"{uid}_{event}"
-                if scheduler.get_job(job_id):
-                    scheduler.remove_job(job_id)
-                icon = EVENT_ICONS.get(event, "✨")
-                cancelled.append(f"  {icon} {ef(event)} ({b['time']})")
+    # Все листы сразу: один batchGet столбцов ID и один batchUpdate с удалением строк
+    events = sorted({b["event"] for b in bookings})
+    locks = [get_lock(ev) for ev in events]
+    for lock in locks:
+        await lock.acquire()
+    try:
+        def delete_all_sync():
+            titles = [EVENTS_CONFIG[ev]["sheet"] for ev in events]
+            sheet_ids = {ws.title: ws.id for ws in sheet.worksheets()}
+            columns = sheet.values_batch_get([f"'{t}'!A:A" for t in titles]).get("valueRanges", [])
+            requests = []
+            for title, column in zip(titles, columns):
+                ids = [str(row[0]) if row else "" for row in column.get("values", [])]
+                # Снизу вверх: удаление строки не сдвигает индексы следующих в пакете
+                for idx in sorted((i for i, v in enumerate(ids) if v == uid), reverse=True):
+                    requests.append({"deleteDimension": {"range": {
+                        "sheetId": sheet_ids[title], "dimension": "ROWS",
+                        "startIndex": idx, "endIndex": idx + 1,
+                    }}})
+            if requests:
+                sheet.batch_update({"requests": requests})
+
+        await asyncio.to_thread(delete_all_sync)
+
+        # Кэш и напоминания — только после успешного пакета
+        cancelled = []
+        for b in bookings:
+            event = b["event"]
+            _drop_user_from_cache(event, uid)
+            reminders.cancel(uid, event)
+            icon = EVENT_ICONS.get(event, "✨")
+            cancelled.append(f"  {icon} {ef(event)} ({b['time']})")
+    finally:
+        for lock in reversed(locks):
+            lock.release()
 
     if cancelled:
         lines = ["🗑 **Все записи отменены:**", ""] + cancelled
@@ -905,18 +1120,18 @@ def build_cancel_keyboard(user_id_str: str) -> InlineKeyboardMarkup | None:
         icon = EVENT_ICONS.get(b["event"], "✨")
         buttons.append([InlineKeyboardButton(
             text=f"❌ {icon} {ef(b['event'])} — {b['time']}",
-            callback_data=f"confirm_cancel|{b['event']}",
+            callback_data=callback_codec.encode(Action.CANCEL_BOOKING, b['event']),
         )])
 
     if len(bookings) > 1:
         buttons.append([InlineKeyboardButton(
             text="🗑 Отменить все записи",
-            callback_data="cancel_all_confirmed",
+            callback_data=callback_codec.encode(Action.CANCEL_ALL),
         )])
 
     buttons.append([InlineKeyboardButton(
         text="← Назад к услугам",
-        callback_data="back_to_services",
+        callback_data=callback_codec.encode(Action.BACK_TO_SERVICES),
     )])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -1069,15 +1284,15 @@ async def handle_booking(message: types.Message, state: FSMContext):
                 buttons = [
                     [InlineKeyboardButton(
                         text="🔄 Перенести",
-                        callback_data=f"start_reschedule|{event}",
+                        callback_data=callback_codec.encode(Action.REQUEST_RESCHEDULE, event),
                     ),
                     InlineKeyboardButton(
                         text="❌ Отменить",
-                        callback_data=f"confirm_cancel|{event}",
+                        callback_data=callback_codec.encode(Action.CANCEL_BOOKING, event),
                     )],
                     [InlineKeyboardButton(
                         text="← Назад к услугам",
-                        callback_data="back_to_services",
+                        callback_data=callback_codec.encode(Action.BACK_TO_SERVICES),
                     )],
                 ]
                 return await message.reply(
@@ -1123,13 +1338,8 @@ async def handle_booking(message: types.Message, state: FSMContext):
                             ws.delete_rows(ids.index(uid) + 1)
 
                     await asyncio.to_thread(delete_sync)
-                    _sheet_cache[single_event] = [
-                        r for r in _sheet_cache[single_event]
-                        if str(r.get("ID", "")) != uid
-                    ]
-                    job_id = f"{uid}_{single_event}"
-                    if scheduler.get_job(job_id):
-                        scheduler.remove_job(job_id)
+                    _drop_user_from_cache(single_event, uid)
+                    reminders.cancel(uid, single_event)
                     await message.reply(
                         f"🗑 Запись {ef(single_event, 'to')} отменена."
                     )
@@ -1167,13 +1377,8 @@ async def handle_booking(message: types.Message, state: FSMContext):
                         ws.delete_rows(ids.index(uid) + 1)
 
                 await asyncio.to_thread(delete_sync)
-                _sheet_cache[event] = [
-                    r for r in _sheet_cache[event]
-                    if str(r.get("ID", "")) != uid
-                ]
-                job_id = f"{uid}_{event}"
-                if scheduler.get_job(job_id):
-                    scheduler.remove_job(job_id)
+                _drop_user_from_cache(event, uid)
+                reminders.cancel(uid, event)
                 await message.reply(f"🗑 Запись {ef(event, 'to')} отменена.")
                 await send_program(message.chat.id, uid)
             else:
@@ -1239,13 +1444,10 @@ async def handle_booking(message: types.Message, state: FSMContext):
 #  CALLBACK-ОБРАБОТЧИКИ
 # ══════════════════════════════════════════════
 
-@dp.callback_query(F.data.startswith("slot|"))
-async def process_slot(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.SLOT)
+async def process_slot(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
-    parts = callback.data.split("|")
-    event = parts[1]
-    time_str = parts[2]
-    action = parts[3] if len(parts) > 3 else "book"
+    event, time_str, action = cb.event, cb.time, cb.mode
     data = await state.get_data()
 
     # ВЫБОР МАСТЕРА
@@ -1264,9 +1466,10 @@ async def process_slot(callback: types.CallbackQuery, state: FSMContext):
             for m in available_masters:
                 buttons.append([InlineKeyboardButton(
                     text=f"👩‍⚕️ {m['name']}",
-                    callback_data=f"book_master|{event}|{time_str}|{m['id']}|{action}"
+                    callback_data=callback_codec.encode(Action.MASTER, event, time_str, m["id"], mode=action)
                 )])
-            back_cb = f"start_{action}|{event}" if action == "reschedule" else f"start_book|{event}"
+            back = Action.REQUEST_RESCHEDULE if action == "reschedule" else Action.START_BOOK
+            back_cb = callback_codec.encode(back, event)
             buttons.append([InlineKeyboardButton(text="← Назад к времени", callback_data=back_cb)])
 
             await callback.message.edit_text(
@@ -1297,14 +1500,10 @@ async def process_slot(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.edit_text("Произошла ошибка при записи 😔 Попробуйте ещё раз.")
 
 
-@dp.callback_query(F.data.startswith("book_master|"))
-async def process_book_master(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.MASTER)
+async def process_book_master(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
-    parts = callback.data.split("|")
-    event = parts[1]
-    time_str = parts[2]
-    master_id = parts[3]
-    action = parts[4] if len(parts) > 4 else "book"
+    event, time_str, master_id, action = cb.event, cb.time, cb.master_id, cb.mode
 
     await state.clear()
 
@@ -1328,11 +1527,11 @@ async def process_book_master(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.edit_text("Произошла ошибка при записи 😔 Попробуйте ещё раз.")
 
 
-@dp.callback_query(F.data.startswith("start_book|"))
-async def process_start_book(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.START_BOOK)
+async def process_start_book(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
     await state.clear()
-    event = callback.data.split("|")[1]
+    event = cb.event
     uid = str(callback.from_user.id)
 
     if event not in EVENTS_CONFIG:
@@ -1394,10 +1593,10 @@ async def process_start_book(callback: types.CallbackQuery, state: FSMContext):
         )
 
 
-@dp.callback_query(F.data.startswith("my_booking_detail|"))
-async def process_booking_detail(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.BOOKING_DETAIL)
+async def process_booking_detail(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
-    event = callback.data.split("|")[1]
+    event = cb.event
     uid = str(callback.from_user.id)
     records = _sheet_cache.get(event, [])
     user_rec = next((r for r in records if str(r.get("ID", "")) == uid), None)
@@ -1406,7 +1605,7 @@ async def process_booking_detail(callback: types.CallbackQuery, state: FSMContex
         return await callback.message.edit_text(
             f"Запись {ef(event, 'to')} не найдена 🤔",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="← Назад", callback_data="back_to_services")]
+                [InlineKeyboardButton(text="← Назад", callback_data=callback_codec.encode(Action.BACK_TO_SERVICES))]
             ]),
         )
 
@@ -1433,10 +1632,10 @@ async def process_booking_detail(callback: types.CallbackQuery, state: FSMContex
 
     buttons = [
         [
-            InlineKeyboardButton(text="🔄 Перенести", callback_data=f"start_reschedule|{event}"),
-            InlineKeyboardButton(text="❌ Отменить", callback_data=f"confirm_cancel|{event}"),
+            InlineKeyboardButton(text="🔄 Перенести", callback_data=callback_codec.encode(Action.REQUEST_RESCHEDULE, event)),
+            InlineKeyboardButton(text="❌ Отменить", callback_data=callback_codec.encode(Action.CANCEL_BOOKING, event)),
         ],
-        [InlineKeyboardButton(text="← Назад к услугам", callback_data="back_to_services")],
+        [InlineKeyboardButton(text="← Назад к услугам", callback_data=callback_codec.encode(Action.BACK_TO_SERVICES))],
     ]
     await callback.message.edit_text(
         "\n".join(lines),
@@ -1445,10 +1644,10 @@ async def process_booking_detail(callback: types.CallbackQuery, state: FSMContex
     )
 
 
-@dp.callback_query(F.data.startswith("confirm_cancel|"))
-async def process_confirm_cancel(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.CANCEL_BOOKING)
+async def process_confirm_cancel(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
-    event = callback.data.split("|")[1]
+    event = cb.event
     uid = str(callback.from_user.id)
 
     async with get_lock(event):
@@ -1461,31 +1660,27 @@ async def process_confirm_cancel(callback: types.CallbackQuery, state: FSMContex
                     ws.delete_rows(ids.index(uid) + 1)
 
             await asyncio.to_thread(delete_sync)
-            _sheet_cache[event] = [
-                r for r in _sheet_cache[event] if str(r.get("ID", "")) != uid
-            ]
-            job_id = f"{uid}_{event}"
-            if scheduler.get_job(job_id):
-                scheduler.remove_job(job_id)
+            _drop_user_from_cache(event, uid)
+            reminders.cancel(uid, event)
             await callback.message.edit_text(f"🗑 Запись {ef(event, 'to')} отменена.")
             await send_program(callback.message.chat.id, uid)
         else:
             await callback.message.edit_text(f"У вас нет записи {ef(event, 'to')} 😊")
 
 
-@dp.callback_query(F.data == "cancel_all_confirmed")
-async def process_cancel_all_confirmed(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.CANCEL_ALL)
+async def process_cancel_all_confirmed(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
     await state.clear()
     result = await cancel_all_bookings(callback.from_user.id)
     await callback.message.edit_text(result, parse_mode="Markdown")
 
 
-@dp.callback_query(F.data.startswith("start_reschedule|"))
-async def process_start_reschedule(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.REQUEST_RESCHEDULE)
+async def process_start_reschedule(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
     await state.clear()
-    event = callback.data.split("|")[1]
+    event = cb.event
 
     records = _sheet_cache.get(event, [])
     suggested = get_suggested_slots(event, records)
@@ -1502,13 +1697,13 @@ async def process_start_reschedule(callback: types.CallbackQuery, state: FSMCont
         await callback.message.edit_text(
             f"Нет свободных окошек для переноса 😔",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="← Назад", callback_data="back_to_services")]
+                [InlineKeyboardButton(text="← Назад", callback_data=callback_codec.encode(Action.BACK_TO_SERVICES))]
             ]),
         )
 
 
-@dp.callback_query(F.data == "back_to_services")
-async def process_back_to_services(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.BACK_TO_SERVICES)
+async def process_back_to_services(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer()
     await state.clear()
     uid = str(callback.from_user.id)
@@ -1519,27 +1714,55 @@ async def process_back_to_services(callback: types.CallbackQuery, state: FSMCont
     )
 
 
-@dp.callback_query(F.data.startswith("no_slots|"))
-async def process_no_slots(callback: types.CallbackQuery, state: FSMContext):
+@on_callback(Action.NO_SLOTS)
+async def process_no_slots(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     await callback.answer(
         "К сожалению, все места заняты 😔 Попробуйте позже!",
         show_alert=True,
     )
 
 
+@dp.callback_query()
+async def dispatch_callback(callback: types.CallbackQuery, state: FSMContext):
+    """Единая точка входа для inline-кнопок: один decode и поиск по таблице."""
+    cb = callback_codec.decode(callback.data)
+    if cb is None or cb.action not in CALLBACK_HANDLERS:
+        # Кнопки из старых сообщений (до смены формата callback_data)
+        return await callback.answer("Это меню устарело — откройте список услуг заново 🙏", show_alert=True)
+    await CALLBACK_HANDLERS[cb.action](callback, state, cb)
+
+
 # ══════════════════════════════════════════════
 #  ЗАПУСК
 # ══════════════════════════════════════════════
 async def main():
-    health_runner = await start_health_server()
+    global webhook
+    bot.session.middleware(OutboundRequestMiddleware(outbound))
+    outbound.start()
+    dp.callback_query.outer_middleware(CallbackIdempotencyMiddleware(callback_cache, mutating=callback_codec.mutating))
+    if WEBHOOK_URL:
+        webhook = TelegramWebhook(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET or None, scheduler=updates)
+    else:
+        dp.update.outer_middleware(UpdateSchedulingMiddleware(updates))
+    health_runner = await start_health_server(webhook)
 
     await sync_cache_with_google()
-    scheduler.add_job(background_sync, "interval", minutes=2)
-    scheduler.start()
+    sync_loop.start()
+    timer_wheel.start()
 
     try:
-        await dp.start_polling(bot)
+        if webhook:
+            await webhook.start(WEBHOOK_URL)
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook()
+            updates.start()
+            await dp.start_polling(bot, handle_as_tasks=False)
     finally:
+        await updates.stop()
+        await sync_loop.stop()
+        await timer_wheel.stop()
+        await outbound.stop()
         await health_runner.cleanup()
 
 
@@ -9,6 +9,34 @@ GOOGLE_SHEET_URL = os.environ.get("GOOGLE_SHEET_URL", "")
 GOOGLE_CREDS_PATH = os.environ.get("GOOGLE_CREDS_PATH", "google_creds.json")
 HEALTH_PORT = int(os.environ.get("HEALTH_PORT", "8080"))
 SYNC_STALE_MINUTES = int(os.environ.get("SYNC_STALE_MINUTES", "10"))
+# Адаптивный интервал фоновой синхронизации (infrastructure/adaptive_sync.py), в секундах
+SYNC_INTERVAL_SECONDS = float(os.environ.get("SYNC_INTERVAL_SECONDS", "120"))
+SYNC_MIN_SECONDS = float(os.environ.get("SYNC_MIN_SECONDS", "15"))
+SYNC_MAX_SECONDS = float(os.environ.get("SYNC_MAX_SECONDS", "300"))
+REMINDERS_DB_PATH = os.environ.get("REMINDERS_DB_PATH", "reminders.sqlite3")
+# Webhook: если задан публичный URL, бот принимает апдейты на health-сервере вместо polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+# Параллельная обработка апдейтов: разные пользователи — одновременно, один — по очереди
+UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", "16"))
+# Сколько секунд повторный тап по той же кнопке отдаёт результат первого
+CALLBACK_DEDUP_SECONDS = float(os.environ.get("CALLBACK_DEDUP_SECONDS", "10"))
+# Сколько секунд слот удерживается за пользователем, пока он выбирает мастера/подтверждает
+SLOT_HOLD_SECONDS = float(os.environ.get("SLOT_HOLD_SECONDS", "120"))
+# Поминутные квоты Google Sheets API (на пользователя сервисного аккаунта) и число повторов
+SHEETS_READS_PER_MINUTE = float(os.environ.get("SHEETS_READS_PER_MINUTE", "60"))
+SHEETS_WRITES_PER_MINUTE = float(os.environ.get("SHEETS_WRITES_PER_MINUTE", "60"))
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+# Как выбирать мастера, если пользователь не назвал конкретного (services/master_assignment.py)
+MASTER_ASSIGNMENT = os.environ.get("MASTER_ASSIGNMENT", "least_loaded")
+# Хранилище записей: "sheets" — Google Sheets, "event_log" — локальный журнал изменений (infrastructure/event_log.py)
+BOOKING_STORE = os.environ.get("BOOKING_STORE", "sheets")
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "bookings.jsonl")
+EVENT_LOG_COMPACT_EVERY = int(os.environ.get("EVENT_LOG_COMPACT_EVERY", "1000"))
+# Столбцовое хранение записей в памяти поверх выбранного хранилища (infrastructure/column_store.py):
+# ускоряет только отчёт BookingService.occupancy, доступность считается по OccupancyIndex
+COLUMN_STORE = os.environ.get("COLUMN_STORE", "0") == "1"
 
 EVENTS_CONFIG = {
     "аромапсихолог": {"sheet": "Аромапсихолог", "duration": 10, "capacity": 1, "start": "14:00", "end": "17:00"},
@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
 from core.models import BookingRecord, Intent
+from core.snapshot import EventSnapshot, RowDiff
+
+class RepositoryError(Exception):
+    """Хранилище записей недоступно (сеть, квоты) — операцию можно повторить позже."""
 
 class IBookingRepository(ABC):
     @abstractmethod
-    async def get_records(self, event: str) -> List[BookingRecord]: pass
+    async def get_records(self, event: str) -> Sequence[BookingRecord]: pass
 
     @abstractmethod
     async def add_record(self, record: BookingRecord) -> None: pass
@@ -13,9 +18,45 @@ class IBookingRepository(ABC):
     @abstractmethod
     async def delete_record(self, event: str, user_id: str) -> None: pass
 
+    async def snapshot(self, event: str) -> EventSnapshot:
+        """Неизменяемый снимок услуги. По умолчанию строится из get_records на каждый вызов."""
+        return EventSnapshot.build(event, await self.get_records(event))
+
+    async def slot_counts(self, event: str) -> Dict[str, int]:
+        """Число записей на каждое занятое время услуги."""
+        return dict((await self.snapshot(event)).by_time)
+
+    async def add_records(self, records: List[BookingRecord]) -> None:
+        """Пакетная запись (всё или ничего, если хранилище умеет). По умолчанию — по одной."""
+        for record in records:
+            await self.add_record(record)
+
+    async def delete_records(self, keys: List[Tuple[str, str]]) -> None:
+        """Пакетное удаление по парам (услуга, user_id). По умолчанию — по одной."""
+        for event, user_id in keys:
+            await self.delete_record(event, user_id)
+
+    async def move_record(self, event: str, user_id: str, time_str: str, master_id: str) -> None:
+        """Перенос записи: меняются только время и мастер. По умолчанию — удаление и добавление."""
+        record = next((r for r in await self.get_records(event) if r.user_id == user_id), None)
+        if record is None:
+            return
+        await self.delete_record(event, user_id)
+        await self.add_record(replace(record, time=time_str, master_id=master_id))
+
+    def audit(self, op: str, **data) -> None:
+        """Событие без изменения записей (удержание слота и т.п.) — для хранилищ с историей."""
+
     @abstractmethod
     async def sync(self) -> None: pass
 
+    def sync_changes(self) -> Optional[Dict[str, RowDiff]]:
+        """Что изменил последний sync: услуга → разница строк ({} — ничего).
+
+        None — неизвестно (хранилище не сравнивает), производные структуры пересобираются целиком.
+        """
+        return None
+
     @abstractmethod
     def get_last_sync_time(self) -> Optional[datetime]: pass
 
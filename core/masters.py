@@ -0,0 +1,52 @@
+from typing import Dict, Iterable, List
+
+from core.config import MASTERS_CONFIG
+
+
+class MasterMasks:
+    """Мастера услуги как биты целого: бит i — i-й мастер в конфиге.
+
+    Маски перерывов по времени вычисляются один раз; «есть ли свободный»,
+    «сколько свободно» и «свободен ли этот» — битовые операции и popcount.
+    """
+
+    __slots__ = ("masters", "all", "_bits", "_breaks")
+
+    def __init__(self, masters: List[dict]):
+        self.masters = masters
+        self.all = (1 << len(masters)) - 1
+        self._bits: Dict[str, int] = {m["id"]: 1 << i for i, m in enumerate(masters)}
+        self._breaks: Dict[str, int] = {}
+        for i, m in enumerate(masters):
+            for time_str in m.get("breaks", []):
+                self._breaks[time_str] = self._breaks.get(time_str, 0) | 1 << i
+
+    def bit(self, master_id: str) -> int:
+        """Бит мастера; 0 для значений не из конфига («Записано», ручные правки)."""
+        return self._bits.get(master_id, 0)
+
+    def mask(self, master_ids: Iterable[str]) -> int:
+        mask = 0
+        for bit in map(self._bits.get, master_ids):
+            if bit:
+                mask |= bit
+        return mask
+
+    def on_break(self, time_str: str) -> int:
+        return self._breaks.get(time_str, 0)
+
+    def free(self, time_str: str, blocked: int = 0) -> int:
+        """Маска мастеров без перерыва в time_str и не попавших в blocked."""
+        return self.all & ~(self._breaks.get(time_str, 0) | blocked)
+
+    def members(self, mask: int) -> List[dict]:
+        """Мастера, чьи биты выставлены в mask, в порядке конфига."""
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self.masters[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+
+MASTER_MASKS: Dict[str, MasterMasks] = {ev: MasterMasks(ms) for ev, ms in MASTERS_CONFIG.items()}
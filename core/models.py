@@ -1,8 +1,15 @@
+import sys
 from dataclasses import dataclass
 from typing import Optional
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class BookingRecord:
+    """Запись на услугу. Неизменяемая и без __dict__: в памяти живут десятки тысяч таких.
+
+    event, time и master_id повторяются у множества записей — строки интернируются,
+    и все записи ссылаются на один объект вместо отдельной копии из разбора JSON.
+    Числовая ячейка (журнал событий, импорт) приводится к строке.
+    """
     user_id: str
     username: str
     full_name: str
@@ -10,9 +17,17 @@ class BookingRecord:
     time: str
     master_id: str
 
+    def __post_init__(self):
+        # frozen запрещает присваивание — единственный штатный путь в слоты
+        _setattr(self, "event", sys.intern(str(self.event)))
+        _setattr(self, "time", sys.intern(str(self.time)))
+        _setattr(self, "master_id", sys.intern(str(self.master_id)))
+
+_setattr = object.__setattr__
+
 @dataclass
 class Intent:
     action: str
     event: Optional[str] = None
     time: Optional[str] = None
-    preferred_master: Optional[str] = None
\ No newline at end of file
+    preferred_master: Optional[str] = None
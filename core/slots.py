@@ -0,0 +1,40 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from core.config import EVENTS_CONFIG
+
+
+def to_minutes(time_str: str) -> int:
+    """«ЧЧ:ММ» → минуты от полуночи; ValueError для всего остального."""
+    h, m = time_str.split(":")
+    return int(h) * 60 + int(m)
+
+
+def from_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@lru_cache(maxsize=None)
+def slot_grid(event: str) -> Tuple[str, ...]:
+    """Сетка слотов услуги из конфига; вычисляется один раз на услугу."""
+    cfg = EVENTS_CONFIG[event]
+    if "fixed_time" in cfg: return (cfg["fixed_time"],)
+    if "custom_slots" in cfg: return tuple(cfg["custom_slots"])
+    return tuple(map(from_minutes, range(to_minutes(cfg["start"]), to_minutes(cfg["end"]), cfg["duration"])))
+
+
+@lru_cache(maxsize=None)
+def slot_minutes(event: str) -> Tuple[int, ...]:
+    return tuple(map(to_minutes, slot_grid(event)))
+
+
+@lru_cache(maxsize=None)
+def slot_index(event: str) -> Dict[str, int]:
+    """Время → номер слота в сетке (общий словарь — только для чтения)."""
+    return {s: i for i, s in enumerate(slot_grid(event))}
+
+
+def slot_position(event: str, minutes: int) -> int:
+    """Номер первого слота, начинающегося не раньше minutes (len(сетки), если таких нет)."""
+    return bisect_left(slot_minutes(event), minutes)
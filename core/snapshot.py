@@ -0,0 +1,246 @@
+from collections import Counter
+from collections.abc import Mapping
+from itertools import chain
+from types import MappingProxyType
+from typing import Callable, Collection, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from core.models import BookingRecord
+
+
+class RowDiff(NamedTuple):
+    """Разница между снимком и свежим чтением листа (изменённая строка — в обоих)."""
+    removed: Tuple[BookingRecord, ...]
+    added: Tuple[BookingRecord, ...]
+
+
+# Записи лежат кусками по CHUNK, индекс пользователей — в SHARDS частях по хэшу:
+# изменение копирует только затронутые кусок и часть плюс кортежи ссылок на них
+CHUNK = 64
+SHARDS = 64
+
+# Запись индекса пользователей: его первая запись и номера кусков со всеми его записями
+_Entry = Tuple[BookingRecord, Tuple[int, ...]]
+
+
+def _shard(user_id: str) -> int:
+    return hash(user_id) % SHARDS
+
+
+def _locate(chunks: Sequence[Tuple[BookingRecord, ...]], user_id: str, candidates: Iterable[int]) -> Optional[_Entry]:
+    """Запись индекса для user_id по кускам-кандидатам (после их изменения); None — записей нет."""
+    nos = tuple(no for no in sorted(candidates) if any(r.user_id == user_id for r in chunks[no]))
+    if not nos:
+        return None
+    return next(r for r in chunks[nos[0]] if r.user_id == user_id), nos
+
+
+def _position(chunk: Tuple[BookingRecord, ...], record: BookingRecord) -> Optional[int]:
+    """Позиция record в куске: сначала по идентичности — сравнение dataclass по полям дорогое."""
+    for i, r in enumerate(chunk):
+        if r is record:
+            return i
+    return chunk.index(record) if record in chunk else None
+
+
+class _Users(Mapping):
+    """user_id → первая запись пользователя (только чтение); части словаря общие у снимков."""
+
+    __slots__ = ("_shards", "_size")
+
+    def __init__(self, shards: Tuple[Dict[str, _Entry], ...], size: int):
+        self._shards = shards
+        self._size = size
+
+    @classmethod
+    def empty(cls) -> "_Users":
+        return cls(tuple({} for _ in range(SHARDS)), 0)
+
+    def entry(self, user_id: str) -> Optional[_Entry]:
+        return self._shards[_shard(user_id)].get(user_id)
+
+    def chunks(self, user_id: str) -> Tuple[int, ...]:
+        entry = self.entry(user_id)
+        return entry[1] if entry else ()
+
+    def updated(self, changes: Dict[str, Optional[_Entry]]) -> "_Users":
+        """Новый индекс с changes (None — удалить); копируются только затронутые части."""
+        if not changes:
+            return self
+        shards, size, copied = list(self._shards), self._size, set()
+        for user_id, entry in changes.items():
+            i = _shard(user_id)
+            if i not in copied:
+                shards[i] = dict(shards[i])
+                copied.add(i)
+            had = user_id in shards[i]
+            if entry is None:
+                if had:
+                    del shards[i][user_id]
+                    size -= 1
+            else:
+                shards[i][user_id] = entry
+                size += not had
+        return _Users(tuple(shards), size)
+
+    def get(self, user_id, default=None):
+        entry = self.entry(user_id)
+        return entry[0] if entry else default
+
+    def __getitem__(self, user_id: str) -> BookingRecord:
+        entry = self.entry(user_id)
+        if entry is None:
+            raise KeyError(user_id)
+        return entry[0]
+
+    def __iter__(self):
+        for shard in self._shards:
+            yield from shard
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class EventSnapshot:
+    """Неизменяемый снимок записей одной услуги с готовыми индексами.
+
+    Репозиторий публикует новый снимок на каждое изменение, подменяя ссылку
+    одним присваиванием, поэтому читатели работают без блокировок и без
+    защитных копий: полученный снимок уже никто не изменит. Новый снимок
+    разделяет с предыдущим все нетронутые куски записей и части индекса
+    пользователей, так что запись стоит O(CHUNK + SHARDS + n / CHUNK + n / SHARDS),
+    а не O(n). Кортеж records собирается при первом чтении.
+    """
+
+    __slots__ = ("event", "_chunks", "_size", "_records", "by_user", "by_time")
+
+    def __init__(self, event: str, chunks: Tuple[Tuple[BookingRecord, ...], ...], size: int,
+                 by_user: _Users, by_time: Mapping[str, int]):
+        self.event = event
+        self._chunks = chunks     # записи по порядку, кусками до CHUNK (пустые куски остаются)
+        self._size = size
+        self._records: Optional[Tuple[BookingRecord, ...]] = None
+        self.by_user = by_user    # user_id → запись (только чтение)
+        self.by_time = by_time    # время → число записей
+
+    @classmethod
+    def build(cls, event: str, records: Iterable[BookingRecord] = ()) -> "EventSnapshot":
+        return cls.empty(event).added(records)
+
+    @classmethod
+    def empty(cls, event: str) -> "EventSnapshot":
+        return cls(event, (), 0, _Users.empty(), MappingProxyType({}))
+
+    @property
+    def records(self) -> Tuple[BookingRecord, ...]:
+        if self._records is None:
+            self._records = tuple(chain.from_iterable(self._chunks))
+        return self._records
+
+    def added(self, records: Iterable[BookingRecord]) -> "EventSnapshot":
+        new = tuple(records)
+        if not new:
+            return self
+        chunks = list(self._chunks)
+        tail = list(chunks.pop()) if chunks and len(chunks[-1]) < CHUNK else []
+        by_time = dict(self.by_time)
+        users: Dict[str, _Entry] = {}
+        for r in new:
+            if len(tail) == CHUNK:
+                chunks.append(tuple(tail))
+                tail = []
+            no = len(chunks)
+            tail.append(r)
+            by_time[r.time] = by_time.get(r.time, 0) + 1
+            entry = users.get(r.user_id) or self.by_user.entry(r.user_id)
+            if entry is None:
+                users[r.user_id] = (r, (no,))
+            elif entry[1][-1] != no:
+                users[r.user_id] = (entry[0], entry[1] + (no,))
+        chunks.append(tuple(tail))
+        return EventSnapshot(self.event, tuple(chunks), self._size + len(new),
+                             self.by_user.updated(users), MappingProxyType(by_time))
+
+    def _without(self, nos: Iterable[int], drop: Callable[[BookingRecord], bool],
+                 users: Iterable[str]) -> "EventSnapshot":
+        """Снимок без записей, для которых drop() истинно, из кусков nos; users — чьи записи затронуты."""
+        chunks, by_time, gone = list(self._chunks), dict(self.by_time), 0
+        for no in nos:
+            kept = []
+            for r in chunks[no]:
+                if drop(r):
+                    gone += 1
+                    left = by_time[r.time] - 1
+                    if left:
+                        by_time[r.time] = left
+                    else:
+                        del by_time[r.time]
+                else:
+                    kept.append(r)
+            chunks[no] = tuple(kept)
+        changes = {uid: _locate(chunks, uid, self.by_user.chunks(uid)) for uid in users}
+        return EventSnapshot(self.event, tuple(chunks), self._size - gone,
+                             self.by_user.updated(changes), MappingProxyType(by_time))
+
+    def removed(self, user_ids: Collection[str]) -> "EventSnapshot":
+        nos = {no for uid in user_ids for no in self.by_user.chunks(uid)}
+        if not nos:
+            return self
+        users = [uid for uid in user_ids if uid in self.by_user]
+        return self._without(sorted(nos), lambda r: r.user_id in user_ids, users)
+
+    def replaced(self, old: BookingRecord, new: BookingRecord) -> "EventSnapshot":
+        """Запись new на месте old (перенос): позиция в снимке сохраняется."""
+        for no in self.by_user.chunks(old.user_id):
+            pos = _position(self._chunks[no], old)
+            if pos is not None:
+                break
+        else:
+            raise ValueError(f"{old!r} нет в снимке")
+        chunks, chunk = list(self._chunks), self._chunks[no]
+        chunks[no] = chunk[:pos] + (new,) + chunk[pos + 1:]
+        by_time = dict(self.by_time)
+        by_time[old.time] -= 1
+        if not by_time[old.time]:
+            del by_time[old.time]
+        by_time[new.time] = by_time.get(new.time, 0) + 1
+        changes = {uid: _locate(chunks, uid, set(self.by_user.chunks(uid)) | {no})
+                   for uid in {old.user_id, new.user_id}}
+        return EventSnapshot(self.event, tuple(chunks), self._size,
+                             self.by_user.updated(changes), MappingProxyType(by_time))
+
+    def diff(self, records: Iterable[BookingRecord]) -> RowDiff:
+        """Что убрать из снимка и что добавить, чтобы получить records (как мультимножество)."""
+        fresh = Counter(records)
+        fresh.subtract(self.records)
+        return RowDiff(
+            tuple(r for r, n in fresh.items() if n < 0 for _ in range(-n)),
+            tuple(r for r, n in fresh.items() if n > 0 for _ in range(n)),
+        )
+
+    def patched(self, diff: RowDiff) -> "EventSnapshot":
+        """Снимок с применённой разницей: убранные записи — по одной на каждую, новые — в конец."""
+        if not diff.removed:
+            return self.added(diff.added)
+        gone = Counter(diff.removed)
+        users = {r.user_id for r in gone}
+        nos = sorted({no for uid in users for no in self.by_user.chunks(uid)})
+
+        def drop(r: BookingRecord) -> bool:
+            if gone[r] > 0:
+                gone[r] -= 1
+                return True
+            return False
+
+        return self._without(nos, drop, users).added(diff.added)
+
+    def booking(self, user_id: str) -> Optional[BookingRecord]:
+        return self.by_user.get(user_id)
+
+    def count(self, time_str: str) -> int:
+        return self.by_time.get(time_str, 0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks)
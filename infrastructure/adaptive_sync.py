@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+# Доля бюджета готовности (SYNC_STALE_MINUTES), которую может занять пауза + сам sync:
+# одна неудачная синхронизация ещё не переводит /readyz в «not ready»
+BUDGET_SHARE = 0.5
+SPEEDUP = 0.5    # правки в таблице — интервал вдвое короче
+SLOWDOWN = 1.5   # тишина — понемногу реже
+BACKOFF = 2.0    # ошибка или мало квоты — вдвое реже
+LOW_HEADROOM = 0.2
+
+
+class AdaptiveSync:
+    """Периодическая синхронизация с интервалом, подстроенным под активность таблицы.
+
+    sync() возвращает признак внешних правок: непустой результат — правки были
+    (интервал сокращается до min_interval), пустой — тишина (интервал растёт),
+    None — неизвестно (интервал прежний). Ошибка и нехватка квоты (headroom()
+    ниже LOW_HEADROOM) удлиняют интервал. Пауза отсчитывается от конца
+    предыдущего sync, так что два sync не пересекаются; вызов run_once во время
+    идущего sync пропускается. Пауза вместе с длительностью sync не выходит
+    за BUDGET_SHARE бюджета готовности budget.
+    """
+
+    def __init__(self, sync: Callable[[], Awaitable[Any]], interval: float = 120.0,
+                 min_interval: float = 15.0, max_interval: float = 300.0, budget: float = 600.0,
+                 headroom: Optional[Callable[[], float]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self._sync = sync
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self._headroom = headroom
+        self._clock = clock
+        self._sleep = sleep
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self.last_duration = 0.0
+        self.interval = self._clamp(interval)
+        self.stats = {"syncs": 0, "edits": 0, "quiet": 0, "errors": 0, "throttled": 0, "skipped": 0}
+
+    def ceiling(self) -> float:
+        """Наибольший интервал: пауза и следующий sync укладываются в долю бюджета."""
+        limit = min(self.max_interval, self.budget * BUDGET_SHARE - self.last_duration)
+        return max(self.min_interval, limit)
+
+    def _clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.ceiling())
+
+    def _next_interval(self, changed: Any, failed: bool) -> float:
+        interval = self.interval
+        if failed:
+            self.stats["errors"] += 1
+            interval *= BACKOFF
+        elif changed is None:
+            pass
+        elif changed:
+            self.stats["edits"] += 1
+            interval *= SPEEDUP
+        else:
+            self.stats["quiet"] += 1
+            interval *= SLOWDOWN
+        if self._headroom is not None and self._headroom() < LOW_HEADROOM:
+            # Квоту ждут интерактивные запросы — фоновый sync уступает даже при правках
+            self.stats["throttled"] += 1
+            interval = max(interval, self.interval * BACKOFF)
+        return self._clamp(interval)
+
+    async def run_once(self) -> bool:
+        """Один sync с пересчётом интервала; False — пропущен, т.к. предыдущий ещё идёт."""
+        if self._running:
+            self.stats["skipped"] += 1
+            return False
+        self._running = True
+        started = self._clock()
+        changed, failed = None, False
+        try:
+            changed = await self._sync()
+        except Exception as e:
+            failed = True
+            logging.error(f"Фоновая синхронизация не удалась: {e}")
+        finally:
+            self._running = False
+            self.last_duration = self._clock() - started
+        self.stats["syncs"] += 1
+        self.interval = self._next_interval(changed, failed)
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._sleep(self.interval)
+            await self.run_once()
+
+    def metrics(self) -> dict:
+        return {
+            "interval": round(self.interval, 3),
+            "last_duration": round(self.last_duration, 3),
+            "running": self._running,
+            **self.stats,
+        }
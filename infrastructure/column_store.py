@@ -0,0 +1,189 @@
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG
+from core.interfaces import IBookingRepository
+from core.models import BookingRecord
+from core.slots import slot_grid
+from core.snapshot import EventSnapshot, RowDiff
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него считаем через Counter по array
+    np = None
+
+
+class _Codes:
+    """Словарь значение ↔ небольшой целый код; известные заранее значения — первыми."""
+
+    def __init__(self, known: Iterable[str]):
+        self.values: List[str] = []
+        self._code: Dict[str, int] = {}
+        for v in known:
+            self.code(v)
+
+    def code(self, value: str) -> int:
+        code = self._code.get(value)
+        if code is None:
+            code = self._code[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class EventColumns:
+    """Записи одной услуги параллельными столбцами: строка i — i-й элемент каждого.
+
+    Время и мастер хранятся кодами в array('H') (2 байта на запись); подсчёт
+    занятости слотов и нагрузки мастеров — один bincount по столбцу вместо
+    обхода записей с чтением поля у каждой.
+    """
+
+    def __init__(self, event: str, records: Iterable[BookingRecord] = ()):
+        self.event = event
+        self.times = _Codes(slot_grid(event))
+        self.masters = _Codes(m["id"] for m in MASTERS_CONFIG.get(event, []))
+        self.user_ids: List[str] = []
+        self.usernames: List[str] = []
+        self.full_names: List[str] = []
+        self.slot = array("H")
+        self.master = array("H")
+        self._snapshot: Optional[EventSnapshot] = None
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def extend(self, records: Iterable[BookingRecord]) -> None:
+        for r in records:
+            self.user_ids.append(r.user_id)
+            self.usernames.append(r.username)
+            self.full_names.append(r.full_name)
+            self.slot.append(self.times.code(r.time))
+            self.master.append(self.masters.code(r.master_id))
+        self._snapshot = None
+
+    def remove(self, user_ids: Iterable[str]) -> None:
+        gone = set(user_ids)
+        keep = [i for i, uid in enumerate(self.user_ids) if uid not in gone]
+        if len(keep) == len(self.user_ids):
+            return
+        self.user_ids = [self.user_ids[i] for i in keep]
+        self.usernames = [self.usernames[i] for i in keep]
+        self.full_names = [self.full_names[i] for i in keep]
+        self.slot = array("H", (self.slot[i] for i in keep))
+        self.master = array("H", (self.master[i] for i in keep))
+        self._snapshot = None
+
+    def move(self, user_id: str, time_str: str, master_id: str) -> None:
+        if user_id in self.user_ids:
+            i = self.user_ids.index(user_id)
+            self.slot[i] = self.times.code(time_str)
+            self.master[i] = self.masters.code(master_id)
+            self._snapshot = None
+
+    def _bincount(self, column: array, size: int) -> List[int]:
+        if np is not None:
+            return np.bincount(np.frombuffer(column, dtype=np.uint16), minlength=size).tolist()
+        counts = [0] * size
+        for code, n in Counter(column).items():
+            counts[code] = n
+        return counts
+
+    def slot_counts(self) -> Dict[str, int]:
+        """Записей на каждое занятое время."""
+        return {t: n for t, n in zip(self.times.values, self._bincount(self.slot, len(self.times.values))) if n}
+
+    def master_loads(self) -> Dict[str, int]:
+        return {m: n for m, n in zip(self.masters.values, self._bincount(self.master, len(self.masters.values))) if n}
+
+    def snapshot(self) -> EventSnapshot:
+        """Записи в виде BookingRecord — собираются при первом чтении после изменения."""
+        if self._snapshot is None:
+            times, masters = self.times.values, self.masters.values
+            self._snapshot = EventSnapshot.build(self.event, (
+                BookingRecord(uid, name, full, self.event, times[s], masters[m])
+                for uid, name, full, s, m in zip(self.user_ids, self.usernames, self.full_names,
+                                                 self.slot, self.master)
+            ))
+        return self._snapshot
+
+
+class ColumnStoreRepository(IBookingRepository):
+    """Столбцовое хранение поверх любого репозитория (Sheets, журнал) — только хранилище.
+
+    Запись идёт в основной репозиторий и затем в столбцы; чтения и slot_counts —
+    из столбцов. Решения о доступности (подсказки слотов, execute_booking,
+    plan_program, availability_at) принимаются по OccupancyIndex в BookingService
+    и столбцы не читают: bincount обслуживает только отчётный
+    BookingService.occupancy. Основной репозиторий хранит свои записи сам,
+    так что столбцы — дополнительная память и лишняя запись на каждое изменение;
+    включать (COLUMN_STORE=1) имеет смысл ради частых отчётов по занятости.
+    Быстрый подсчёт требует numpy (requirements-optional.txt), без него — Counter.
+    """
+
+    def __init__(self, backend: IBookingRepository):
+        self.backend = backend
+        self._columns: Dict[str, EventColumns] = {ev: EventColumns(ev) for ev in EVENTS_CONFIG}
+
+    async def sync(self) -> None:
+        await self.backend.sync()
+        changes = self.backend.sync_changes()
+        if changes is None:
+            self._columns = {ev: EventColumns(ev, await self.backend.get_records(ev)) for ev in EVENTS_CONFIG}
+            return
+        # Затронутые пользователи: убираем их строки и берём актуальные из основного репозитория
+        for event, diff in changes.items():
+            touched = {r.user_id for r in diff.removed + diff.added}
+            columns = self._columns[event]
+            columns.remove(touched)
+            columns.extend(r for r in await self.backend.get_records(event) if r.user_id in touched)
+
+    def sync_changes(self) -> Optional[Dict[str, RowDiff]]:
+        return self.backend.sync_changes()
+
+    def columns(self, event: str) -> EventColumns:
+        return self._columns[event]
+
+    async def get_records(self, event: str) -> Sequence[BookingRecord]:
+        return (await self.snapshot(event)).records
+
+    async def snapshot(self, event: str) -> EventSnapshot:
+        return self._columns[event].snapshot()
+
+    async def slot_counts(self, event: str) -> Dict[str, int]:
+        return self._columns[event].slot_counts()
+
+    async def add_record(self, record: BookingRecord) -> None:
+        await self.backend.add_record(record)
+        self._columns[record.event].extend([record])
+
+    async def add_records(self, records: List[BookingRecord]) -> None:
+        await self.backend.add_records(records)
+        for event in {r.event for r in records}:
+            self._columns[event].extend(r for r in records if r.event == event)
+
+    async def delete_record(self, event: str, user_id: str) -> None:
+        await self.backend.delete_record(event, user_id)
+        self._columns[event].remove([user_id])
+
+    async def delete_records(self, keys: List[Tuple[str, str]]) -> None:
+        await self.backend.delete_records(keys)
+        for event in {ev for ev, _ in keys}:
+            self._columns[event].remove(uid for ev, uid in keys if ev == event)
+
+    async def move_record(self, event: str, user_id: str, time_str: str, master_id: str) -> None:
+        await self.backend.move_record(event, user_id, time_str, master_id)
+        self._columns[event].move(user_id, time_str, master_id)
+
+    def audit(self, op: str, **data) -> None:
+        self.backend.audit(op, **data)
+
+    async def close(self) -> None:
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            await close()
+
+    def get_last_sync_time(self) -> Optional[datetime]:
+        return self.backend.get_last_sync_time()
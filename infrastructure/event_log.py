@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.config import EVENTS_CONFIG
+from core.interfaces import IBookingRepository
+from core.models import BookingRecord
+from core.snapshot import EventSnapshot
+
+
+def _row(record: BookingRecord) -> List[str]:
+    return [record.user_id, record.username, record.full_name, record.time, record.master_id]
+
+
+def _record(event: str, row: Sequence[str]) -> BookingRecord:
+    return BookingRecord(row[0], row[1], row[2], event, row[3], row[4])
+
+
+class EventLogRepository(IBookingRepository):
+    """Журнал изменений записей (JSON lines) как хранилище: состояние — результат его проигрывания.
+
+    Каждое изменение — одна строка в конце файла (пакеты — тоже одна строка,
+    поэтому применяются целиком или никак). Журнал не переписывается и служит
+    историей для разбора споров («я был записан на 12:20!»). Раз в compact_every
+    изменений состояние сохраняется снимком вместе со смещением в журнале:
+    при старте читается снимок и только хвост журнала после него.
+    """
+
+    def __init__(self, path: str, compact_every: int = 1000, fsync: bool = False,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._clock = clock
+        self._snapshots: Dict[str, EventSnapshot] = {ev: EventSnapshot.empty(ev) for ev in EVENTS_CONFIG}
+        self._seq = 0
+        self._since_compact = 0
+        self._file = None
+        self._last_sync: Optional[datetime] = None
+        self.stats = {"replayed": 0, "appended": 0, "compactions": 0}
+
+    # ── Чтение ──────────────────────────────────
+
+    async def sync(self) -> None:
+        # Источник истины — сам журнал: загружаем один раз при старте
+        if self._file is None:
+            self._load()
+        self._last_sync = datetime.now()
+
+    def _load(self) -> None:
+        offset = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snap = json.load(f)
+            self._seq, offset = snap["seq"], snap["offset"]
+            self._snapshots = {ev: EventSnapshot.build(ev, (_record(ev, row) for row in snap["events"].get(ev, [])))
+                               for ev in EVENTS_CONFIG}
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка (падение посреди записи) — отбрасываем
+                        logging.warning(f"Журнал записей: отброшена неполная строка на смещении {offset}")
+                        break
+                    self._apply(entry)
+                    self._seq = entry["seq"]
+                    offset += len(line)
+                    self._since_compact += 1
+                    self.stats["replayed"] += 1
+            with open(self.path, "ab") as f:
+                f.truncate(offset)
+        self._file = open(self.path, "ab")
+
+    async def get_records(self, event: str) -> Sequence[BookingRecord]:
+        return (await self.snapshot(event)).records
+
+    async def snapshot(self, event: str) -> EventSnapshot:
+        return self._snapshots.get(event) or EventSnapshot.empty(event)
+
+    def history(self, user_id: Optional[str] = None, event: Optional[str] = None) -> List[dict]:
+        """Все записи журнала по пользователю и/или услуге — для разбора спорных случаев."""
+        result = []
+        if not os.path.exists(self.path):
+            return result
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                for op in entry.get("ops", [entry]):
+                    if user_id is not None and op.get("user_id", user_id) != user_id:
+                        continue
+                    if event is not None and op.get("event") != event:
+                        continue
+                    result.append({"seq": entry["seq"], "ts": entry["ts"], **op})
+        return result
+
+    # ── Изменения ───────────────────────────────
+
+    async def add_record(self, record: BookingRecord) -> None:
+        self._append(self._book(record))
+
+    async def add_records(self, records: List[BookingRecord]) -> None:
+        if records:
+            self._append({"op": "batch", "ops": [self._book(r) for r in records]})
+
+    async def delete_record(self, event: str, user_id: str) -> None:
+        self._append({"op": "cancel", "event": event, "user_id": user_id})
+
+    async def delete_records(self, keys: List[Tuple[str, str]]) -> None:
+        if keys:
+            self._append({"op": "batch", "ops": [{"op": "cancel", "event": ev, "user_id": uid} for ev, uid in keys]})
+
+    async def move_record(self, event: str, user_id: str, time_str: str, master_id: str) -> None:
+        if self._snapshots[event].booking(user_id) is not None:
+            self._append({"op": "move", "event": event, "user_id": user_id, "time": time_str, "master_id": master_id})
+
+    def audit(self, op: str, **data) -> None:
+        self._append({"op": op, **data})
+
+    def import_records(self, records: Iterable[BookingRecord]) -> None:
+        """Полная замена состояния (например, перенос из Google Sheets) одной записью журнала."""
+        by_event: Dict[str, List[List[str]]] = {ev: [] for ev in EVENTS_CONFIG}
+        for r in records:
+            by_event[r.event].append(_row(r))
+        self._append({"op": "import", "events": by_event})
+
+    def is_empty(self) -> bool:
+        return self._seq == 0
+
+    @staticmethod
+    def _book(record: BookingRecord) -> dict:
+        return {"op": "book", "event": record.event, "user_id": record.user_id, "record": _row(record)}
+
+    def _apply(self, entry: dict) -> None:
+        op = entry["op"]
+        if op == "batch":
+            for sub in entry["ops"]:
+                self._apply(sub)
+        elif op == "book":
+            self._publish(self._snapshots[entry["event"]].added([_record(entry["event"], entry["record"])]))
+        elif op == "cancel":
+            self._publish(self._snapshots[entry["event"]].removed({entry["user_id"]}))
+        elif op == "move":
+            snap = self._snapshots[entry["event"]]
+            old = snap.booking(entry["user_id"])
+            if old is not None:
+                self._publish(snap.replaced(old, replace(old, time=entry["time"], master_id=entry["master_id"])))
+        elif op == "import":
+            self._snapshots = {ev: EventSnapshot.build(ev, (_record(ev, row) for row in entry["events"].get(ev, [])))
+                               for ev in EVENTS_CONFIG}
+        # Прочие (удержания и т.п.) — только история, состояние не меняют
+
+    def _publish(self, snapshot: EventSnapshot) -> None:
+        self._snapshots[snapshot.event] = snapshot
+
+    def _append(self, entry: dict) -> None:
+        if self._file is None:
+            self._load()
+        entry = {"seq": self._seq + 1, "ts": round(self._clock(), 3), **entry}
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        # Состояние меняется только после записи в журнал
+        self._seq = entry["seq"]
+        self._apply(entry)
+        self.stats["appended"] += 1
+        self._since_compact += 1
+        if self._since_compact >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Снимок текущего состояния и смещения в журнале; пишется атомарно через rename."""
+        snap = {
+            "seq": self._seq,
+            "offset": self._file.tell(),
+            "events": {ev: [_row(r) for r in s.records] for ev, s in self._snapshots.items()},
+        }
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self._since_compact = 0
+        self.stats["compactions"] += 1
+
+    async def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get_last_sync_time(self) -> Optional[datetime]:
+        return self._last_sync
+
+    def metrics(self) -> dict:
+        return {"seq": self._seq, "since_compact": self._since_compact, **self.stats}
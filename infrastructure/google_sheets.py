@@ -1,67 +1,255 @@
 import asyncio
-import gspread
+import logging
+from contextlib import contextmanager
+from dataclasses import replace
 from datetime import datetime
-from typing import List, Optional, Dict
-from oauth2client.service_account import ServiceAccountCredentials
+from typing import Iterable, List, Optional, Dict, Sequence, Tuple
 from core.interfaces import IBookingRepository
 from core.models import BookingRecord
 from core.config import EVENTS_CONFIG
+from core.snapshot import EventSnapshot, RowDiff
+from infrastructure.sheets_client import SheetsAPIError, SheetsClient, a1
+from infrastructure.sheets_quota import background_sheets
+
+COLUMNS = ("ID", "Username", "ФИО", "Время", "Мастер/Детали")
+
+def _parse_rows(event: str, rows: List[List[str]]) -> List[BookingRecord]:
+    """Как gspread get_all_records, но сразу в BookingRecord: без словаря на строку.
+
+    Первая строка — заголовки; позиции столбцов вычисляются один раз, недостающие
+    ячейки (пустые хвосты строк, нет столбца) читаются как "".
+    """
+    if not rows:
+        return []
+    header = rows[0]
+    width = len(header)
+    # Отсутствующий столбец указывает за конец строки, там всегда ""
+    uid, username, full_name, time_, master = (header.index(c) if c in header else width for c in COLUMNS)
+    pad = [""] * (width + 1)
+    records = []
+    for values in rows[1:]:
+        row = values + pad[len(values):] if len(values) <= width else values[:width] + [""]
+        records.append(BookingRecord(row[uid], row[username], row[full_name], event, row[time_], row[master]))
+    return records
+
+def _digest(rows: List[List[str]]) -> int:
+    """Отпечаток значений листа: совпал — лист не менялся и разбирать его незачем."""
+    return hash(tuple(map(tuple, rows)))
+
+def _row(record: BookingRecord) -> List[str]:
+    return [record.user_id, record.username, record.full_name, record.time, record.master_id]
 
 class GoogleSheetsRepository(IBookingRepository):
-    def __init__(self, creds_path: str, sheet_url: str):
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-        self.client = gspread.authorize(creds)
-        self.sheet = self.client.open_by_url(sheet_url)
-        
-        self._cache: Dict[str, List[BookingRecord]] = {ev: [] for ev in EVENTS_CONFIG}
+    def __init__(self, creds_path: str, sheet_url: str, client: Optional[SheetsClient] = None):
+        # Асинхронный клиент Sheets API: без gspread и потоков на каждый вызов
+        self.client = client or SheetsClient.from_service_account(creds_path, sheet_url)
+
+        # Неизменяемые снимки: каждое изменение публикует новый, читатели не блокируются
+        self._snapshots: Dict[str, EventSnapshot] = {ev: EventSnapshot.empty(ev) for ev in EVENTS_CONFIG}
         self._locks: Dict[str, asyncio.Lock] = {ev: asyncio.Lock() for ev in EVENTS_CONFIG}
         self._last_sync: Optional[datetime] = None
+        self._sheet_ids: Dict[str, int] = {}
+        # Проверка изменений: версия файла и отпечатки листов с прошлого чтения
+        self._revision: Optional[str] = None
+        self._probe = True
+        self._digests: Dict[str, int] = {}
+        self._changes: Optional[Dict[str, RowDiff]] = None
+        # Поколение записей листа: +1 в начале и в конце каждой записи (нечётное — запись идёт)
+        self._writes: Dict[str, int] = {ev: 0 for ev in EVENTS_CONFIG}
+        self.sync_stats = {"syncs": 0, "skipped": 0, "sheets_unchanged": 0, "sheets_changed": 0,
+                           "sheets_deferred": 0}
+
+    @contextmanager
+    def _writing(self, events: Iterable[str]):
+        """Запись в листы events (под их блокировками): sync, читавший их в это время, отложит их."""
+        events = list(events)
+        for ev in events:
+            self._writes[ev] += 1
+        try:
+            yield
+        finally:
+            for ev in events:
+                self._writes[ev] += 1
 
     async def sync(self) -> None:
-        def fetch():
-            data = {}
-            for ev, cfg in EVENTS_CONFIG.items():
-                ws = self.sheet.worksheet(cfg["sheet"])
-                records = []
-                for row in ws.get_all_records():
-                    records.append(BookingRecord(
-                        user_id=str(row.get("ID", "")),
-                        username=str(row.get("Username", "")),
-                        full_name=str(row.get("ФИО", "")),
-                        event=ev,
-                        time=str(row.get("Время", "")),
-                        master_id=str(row.get("Мастер/Детали", ""))
-                    ))
-                data[ev] = records
-            return data
-
-        self._cache = await asyncio.to_thread(fetch)
+        """Чтение таблицы, только если она изменилась с прошлой синхронизации.
+
+        Сначала версия файла (один лёгкий запрос к Drive): та же — чтение
+        пропускается. Иначе все листы одним values:batchGet; лист с прежним
+        отпечатком не разбирается, изменённый сравнивается со снимком, и
+        публикуется снимок с применённой разницей строк (sync_changes).
+
+        Лист, в который бот писал во время чтения, откладывается до следующего
+        sync: прочитанные строки могли не застать запись (или отмену), и разница
+        со снимком вернула бы её обратно. Версия тогда не запоминается.
+        """
+        self.sync_stats["syncs"] += 1
+        writes = dict(self._writes)
+        with background_sheets():
+            revision = await self._read_revision()
+            if revision is not None and revision == self._revision:
+                self._changes = {}
+                self.sync_stats["skipped"] += 1
+                self._last_sync = datetime.now()
+                return
+            events = list(EVENTS_CONFIG)
+            ranges = await self.client.batch_get([a1(EVENTS_CONFIG[ev]["sheet"]) for ev in events])
+        changes = {}
+        deferred = False
+        for ev, rows in zip(events, ranges):
+            if self._writes[ev] != writes[ev] or writes[ev] % 2:
+                deferred = True
+                self.sync_stats["sheets_deferred"] += 1
+                continue
+            digest = _digest(rows)
+            if self._digests.get(ev) == digest:
+                self.sync_stats["sheets_unchanged"] += 1
+                continue
+            self._digests[ev] = digest
+            self.sync_stats["sheets_changed"] += 1
+            snap = self._snapshots[ev]
+            diff = snap.diff(_parse_rows(ev, rows))
+            if diff.removed or diff.added:
+                self._publish(snap.patched(diff))
+                changes[ev] = diff
+        self._changes = changes
+        if not deferred:
+            self._revision = revision
         self._last_sync = datetime.now()
 
-    async def get_records(self, event: str) -> List[BookingRecord]:
-        return self._cache.get(event, [])
+    async def _read_revision(self) -> Optional[str]:
+        if not self._probe:
+            return None
+        try:
+            return await self.client.revision()
+        except SheetsAPIError as e:
+            # Drive API не включён или нет доступа к метаданным — дальше читаем без проверки
+            logging.warning(f"Проверка версии таблицы недоступна, синхронизация без неё: {e}")
+            self._probe = False
+            return None
+
+    def sync_changes(self) -> Optional[Dict[str, RowDiff]]:
+        return self._changes
+
+    async def get_records(self, event: str) -> Sequence[BookingRecord]:
+        return (await self.snapshot(event)).records
+
+    async def snapshot(self, event: str) -> EventSnapshot:
+        return self._snapshots.get(event) or EventSnapshot.empty(event)
+
+    async def _sheet_id(self, event: str) -> int:
+        if not self._sheet_ids:
+            self._sheet_ids = await self.client.sheet_ids()
+        return self._sheet_ids[EVENTS_CONFIG[event]["sheet"]]
 
     async def add_record(self, record: BookingRecord) -> None:
         async with self._locks[record.event]:
-            def append():
-                ws = self.sheet.worksheet(EVENTS_CONFIG[record.event]["sheet"])
-                ws.append_row([record.user_id, record.username, record.full_name, record.time, record.master_id])
-            
-            await asyncio.to_thread(append)
-            self._cache[record.event].append(record)
+            with self._writing([record.event]):
+                await self.client.append_rows(a1(EVENTS_CONFIG[record.event]["sheet"], "A1"), [_row(record)])
+                self._publish(self._snapshots[record.event].added([record]))
+
+    async def add_records(self, records: List[BookingRecord]) -> None:
+        """Все записи одним spreadsheets.batchUpdate (appendCells на каждый лист) — атомарно."""
+        if not records:
+            return
+        events = sorted({r.event for r in records})
+        locks = [self._locks[ev] for ev in events]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            with self._writing(events):
+                requests = []
+                for r in records:
+                    requests.append({"appendCells": {
+                        "sheetId": await self._sheet_id(r.event),
+                        "rows": [{"values": [{"userEnteredValue": {"stringValue": v}} for v in _row(r)]}],
+                        "fields": "userEnteredValue",
+                    }})
+                await self.client.batch_update(requests)
+                for ev in events:
+                    self._publish(self._snapshots[ev].added(r for r in records if r.event == ev))
+        finally:
+            for lock in reversed(locks):
+                lock.release()
 
     async def delete_record(self, event: str, user_id: str) -> None:
         async with self._locks[event]:
-            def delete():
-                ws = self.sheet.worksheet(EVENTS_CONFIG[event]["sheet"])
-                ids = [str(v) for v in ws.col_values(1)]
+            with self._writing([event]):
+                # Номер строки — по свежему столбцу ID (таблицу могли править вручную)
+                ids = [str(row[0]) if row else "" for row in
+                       await self.client.get_values(a1(EVENTS_CONFIG[event]["sheet"], "A:A"))]
                 if user_id in ids:
-                    ws.delete_rows(ids.index(user_id) + 1)
+                    idx = ids.index(user_id)
+                    await self.client.batch_update([{"deleteDimension": {"range": {
+                        "sheetId": await self._sheet_id(event), "dimension": "ROWS",
+                        "startIndex": idx, "endIndex": idx + 1,
+                    }}}])
+                self._publish(self._snapshots[event].removed({user_id}))
+
+    async def move_record(self, event: str, user_id: str, time_str: str, master_id: str) -> None:
+        """Перенос одним values:batchUpdate ячеек «Время» и «Мастер/Детали» той же строки.
+
+        Новый снимок публикуется одним присваиванием — читатели не застают
+        момент, когда старой записи уже нет, а новой ещё нет.
+        """
+        async with self._locks[event]:
+            with self._writing([event]):
+                sheet = EVENTS_CONFIG[event]["sheet"]
+                snap = self._snapshots[event]
+                old = snap.booking(user_id)
+                if old is None:
+                    return
+                moved = replace(old, time=time_str, master_id=master_id)
+                ids = [str(row[0]) if row else "" for row in await self.client.get_values(a1(sheet, "A:A"))]
+                if user_id in ids:
+                    row = ids.index(user_id) + 1
+                    await self.client.update_values({a1(sheet, f"D{row}:E{row}"): [[time_str, master_id]]})
+                else:
+                    # Строку удалили в таблице вручную — записываем заново
+                    await self.client.append_rows(a1(sheet, "A1"), [_row(moved)])
+                self._publish(snap.replaced(old, moved))
+
+    async def delete_records(self, keys: List[Tuple[str, str]]) -> None:
+        """Удаление строк на нескольких листах: один batchGet столбцов ID и один batchUpdate.
+
+        Строки удаляются снизу вверх, чтобы удаление не сдвигало индексы следующих;
+        кэш обновляется только после успешного запроса.
+        """
+        if not keys:
+            return
+        events = sorted({event for event, _ in keys})
+        locks = [self._locks[ev] for ev in events]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            with self._writing(events):
+                columns = await self.client.batch_get([a1(EVENTS_CONFIG[ev]["sheet"], "A:A") for ev in events])
+                requests = []
+                for ev, rows in zip(events, columns):
+                    users = {uid for e, uid in keys if e == ev}
+                    ids = [str(row[0]) if row else "" for row in rows]
+                    for idx in sorted((i for i, v in enumerate(ids) if v in users), reverse=True):
+                        requests.append({"deleteDimension": {"range": {
+                            "sheetId": await self._sheet_id(ev), "dimension": "ROWS",
+                            "startIndex": idx, "endIndex": idx + 1,
+                        }}})
+                if requests:
+                    await self.client.batch_update(requests)
+                for ev in events:
+                    users = {uid for e, uid in keys if e == ev}
+                    self._publish(self._snapshots[ev].removed(users))
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _publish(self, snapshot: EventSnapshot) -> None:
+        self._snapshots[snapshot.event] = snapshot
+
+    async def close(self) -> None:
+        await self.client.close()
 
-            await asyncio.to_thread(delete)
-            self._cache[event] = [r for r in self._cache[event] if r.user_id != user_id]
+    def metrics(self) -> dict:
+        return {**self.client.metrics(), "sync": dict(self.sync_stats)}
 
     def get_last_sync_time(self) -> Optional[datetime]:
-        return self._last_syncopenai_service.py
-    
\ No newline at end of file
+        return self._last_sync
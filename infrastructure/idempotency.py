@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+
+class IdempotencyCache:
+    """Результат первого выполнения по ключу живёт ttl секунд.
+
+    Повтор с тем же ключом получает тот же результат без повторного выполнения,
+    в том числе если первый вызов ещё идёт (ждёт общий Future). TTL одинаковый,
+    поэтому порядок вставки совпадает с порядком истечения — чистка идёт с головы
+    до первой неистёкшей записи; истёкшие, но ещё выполняющиеся, пропускаются.
+    """
+
+    def __init__(self, ttl: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, asyncio.Future]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _purge(self, now: float) -> None:
+        stale = []
+        for key, (expires, future) in self._entries.items():
+            if expires > now:
+                break
+            if future.done():
+                stale.append(key)
+        for key in stale:
+            del self._entries[key]
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Возвращает (результат, был_ли_повтор)."""
+        now = self._clock()
+        self._purge(now)
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] > now or not entry[1].done()):
+            self.hits += 1
+            return await asyncio.shield(entry[1]), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (now + self.ttl, future)
+        self._entries.move_to_end(key)
+        try:
+            result = await factory()
+        except BaseException as e:
+            # Ошибку не кэшируем: следующий тап выполнится заново
+            self._entries.pop(key, None)
+            future.set_exception(e)
+            future.exception()  # помечаем как полученное, если дублей не было
+            raise
+        future.set_result(result)
+        return result, False
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def callback_key(callback: CallbackQuery) -> Hashable:
+    message = callback.message
+    message_id = message.message_id if message is not None else callback.inline_message_id
+    return callback.from_user.id, message_id, callback.data
+
+
+class CallbackIdempotencyMiddleware(BaseMiddleware):
+    """Двойной тап по кнопке: второй callback не выполняет хэндлер, а берёт результат первого.
+
+    mutating отбирает кнопки, меняющие записи; остальные (навигация) выполняются
+    всегда — сообщение редактируется на месте, и «назад» → та же услуга снова
+    даёт тот же ключ в пределах TTL.
+    """
+
+    def __init__(self, cache: IdempotencyCache, mutating: Optional[Callable[[CallbackQuery], bool]] = None):
+        self.cache = cache
+        self.mutating = mutating
+
+    async def __call__(self, handler, event: CallbackQuery, data: Dict[str, Any]) -> Optional[Any]:
+        if self.mutating is not None and not self.mutating(event):
+            return await handler(event, data)
+        result, duplicate = await self.cache.run(callback_key(event), lambda: handler(event, data))
+        if duplicate:
+            # Убираем «часики» на кнопке второго тапа; первый уже ответил пользователю
+            try:
+                await event.answer()
+            except Exception:
+                pass
+        return result
@@ -10,7 +10,8 @@ class OpenAILLMService(ILLMService):
 
     async def parse_intent(self, text: str) -> Intent | None:
         prompt = (
-            "Определи action: book, cancel, cancel_all, reschedule, availability, info, my_bookings.\n"
+            "Определи action: book, cancel, cancel_all, reschedule, availability, info, my_bookings, plan_program (записать сразу на всё/собрать программу), "
+            "free_at (куда можно сходить в HH:MM — услуга не указана, только время).\n"
             'Ответь JSON: {"action":"...","event":"...","time":"HH:MM","preferred_master":"..."}\n'
             f"Текст: {text}"
         )
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from typing import Optional
+
+# Погрешность float при больших значениях monotonic(): без неё ровно накопленный
+# токен может оказаться 0.999999…, и delay() вернёт микроскопическую паузу
+_EPSILON = 1e-9
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def delay(self, amount: float = 1.0, now: Optional[float] = None) -> float:
+        """Сколько секунд ждать, пока в ведре появится amount токенов."""
+        now = time.monotonic() if now is None else now
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self.tokens >= amount - _EPSILON:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float = 1.0, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.delay(amount, now) > 0:
+            return False
+        self.tokens -= amount
+        return True
+
+    def block(self, seconds: float) -> None:
+        """Запрет на выдачу токенов (например, после 429 / RetryAfter)."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self.tokens = 0.0
+        self._updated = max(self._updated, self._blocked_until)
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity - _EPSILON
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        while True:
+            wait = self.delay(amount)
+            if wait <= 0:
+                self.tokens -= amount
+                return
+            await asyncio.sleep(wait)
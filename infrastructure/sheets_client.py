@@ -0,0 +1,204 @@
+import asyncio
+import json
+import re
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import aiohttp
+from google.auth import crypt, jwt
+
+from core.interfaces import RepositoryError
+
+if TYPE_CHECKING:
+    from infrastructure.sheets_quota import SheetsQuota
+
+SHEETS_API = "https://sheets.googleapis.com/v4"
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+SCOPES = ("https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.metadata.readonly")
+# Обновляем токен заранее, чтобы он не истёк посреди запроса
+REFRESH_MARGIN = 60.0
+
+
+class SheetsAPIError(RepositoryError):
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Sheets API {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def spreadsheet_id_from_url(url: str) -> str:
+    m = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", url)
+    if not m:
+        raise ValueError(f"Не удалось извлечь id таблицы из {url}")
+    return m.group(1)
+
+
+def a1(sheet: str, cells: str = "") -> str:
+    """Диапазон A1 с экранированием названия листа: 'Лист'!A:A."""
+    name = "'" + sheet.replace("'", "''") + "'"
+    return f"{name}!{cells}" if cells else name
+
+
+class ServiceAccountToken:
+    """OAuth2-токен сервисного аккаунта: JWT подписывается локально, обмен — через aiohttp.
+
+    Одновременные запросы ждут одно обновление, а не обновляют токен каждый сам.
+    """
+
+    def __init__(self, info: dict, scopes: Sequence[str] = SCOPES, clock: Callable[[], float] = time.time):
+        self._signer = crypt.RSASigner.from_service_account_info(info)
+        self._email = info["client_email"]
+        self._token_uri = info.get("token_uri") or TOKEN_URI
+        self._scopes = " ".join(scopes)
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+
+    @classmethod
+    def from_file(cls, path: str, scopes: Sequence[str] = SCOPES) -> "ServiceAccountToken":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), scopes)
+
+    def invalidate(self) -> None:
+        self._token = None
+
+    async def get(self, session: aiohttp.ClientSession) -> str:
+        if self._token and self._clock() < self._expires - REFRESH_MARGIN:
+            return self._token
+        async with self._lock:
+            if self._token and self._clock() < self._expires - REFRESH_MARGIN:
+                return self._token
+            await self._refresh(session)
+            return self._token
+
+    async def _refresh(self, session: aiohttp.ClientSession) -> None:
+        now = int(self._clock())
+        assertion = jwt.encode(self._signer, {
+            "iss": self._email,
+            "scope": self._scopes,
+            "aud": self._token_uri,
+            "iat": now,
+            "exp": now + 3600,
+        }).decode("ascii")
+        data = {"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion}
+        async with session.post(self._token_uri, data=data) as resp:
+            if resp.status != 200:
+                raise SheetsAPIError(resp.status, f"token refresh failed: {await resp.text()}")
+            payload = await resp.json()
+        self._token = payload["access_token"]
+        self._expires = now + float(payload.get("expires_in", 3600))
+        self.refreshes += 1
+
+
+class SheetsClient:
+    """Асинхронный клиент Google Sheets API v4 на aiohttp.
+
+    Одна сессия с пулом keep-alive соединений на всё приложение: без потоков
+    и без повторного TLS-рукопожатия на каждый запрос. Реализованы только
+    вызовы, нужные репозиториям.
+    """
+
+    def __init__(self, spreadsheet_id: str, token: ServiceAccountToken, api_url: str = SHEETS_API,
+                 pool_size: int = 10, timeout: float = 30.0, quota: Optional["SheetsQuota"] = None,
+                 drive_url: Optional[str] = None):
+        self.spreadsheet_id = spreadsheet_id
+        self.token = token
+        # Квоты, повторы и приоритеты (infrastructure/sheets_quota.py); без него — запрос как есть
+        self.quota = quota
+        self.api_url = api_url.rstrip("/")
+        # Метаданные файла (версия для проверки изменений); без него проверка не выполняется
+        self.drive_url = drive_url.rstrip("/") if drive_url else None
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+
+    @classmethod
+    def from_service_account(cls, creds_path: str, sheet_url: str, **kwargs) -> "SheetsClient":
+        kwargs.setdefault("drive_url", DRIVE_API)
+        return cls(spreadsheet_id_from_url(sheet_url), ServiceAccountToken.from_file(creds_path), **kwargs)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся внутри работающего event loop (при первом запросе)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method: str, path: str = "", params=None, body: Optional[dict] = None) -> dict:
+        url = f"{self.api_url}/spreadsheets/{self.spreadsheet_id}{path}"
+        if self.quota is None:
+            return await self._send(method, url, params, body)
+        kind = "read" if method == "GET" else "write"
+        return await self.quota.run(kind, lambda: self._send(method, url, params, body))
+
+    async def _send(self, method: str, url: str, params, body: Optional[dict]) -> dict:
+        session = self._get_session()
+        for attempt in range(2):
+            token = await self.token.get(session)
+            self.requests += 1
+            async with session.request(method, url, params=params, json=body,
+                                       headers={"Authorization": f"Bearer {token}"}) as resp:
+                if resp.status == 401 and attempt == 0:
+                    # Токен отозван раньше срока — обновляем и повторяем один раз
+                    self.token.invalidate()
+                    continue
+                if resp.status >= 400:
+                    retry_after = resp.headers.get("Retry-After")
+                    raise SheetsAPIError(resp.status, await resp.text(),
+                                         float(retry_after) if retry_after else None)
+                return await resp.json()
+
+    async def get_values(self, range_: str) -> List[List[str]]:
+        data = await self.request("GET", f"/values/{quote(range_, safe='')}")
+        return data.get("values", [])
+
+    async def batch_get(self, ranges: Sequence[str]) -> List[List[List[str]]]:
+        """Несколько диапазонов одним запросом; порядок ответа совпадает с ranges."""
+        data = await self.request("GET", "/values:batchGet", params=[("ranges", r) for r in ranges])
+        return [vr.get("values", []) for vr in data.get("valueRanges", [])]
+
+    async def append_rows(self, range_: str, rows: List[List[str]]) -> dict:
+        params = {"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"}
+        return await self.request("POST", f"/values/{quote(range_, safe='')}:append", params=params,
+                                  body={"values": rows})
+
+    async def update_values(self, data: Dict[str, List[List[str]]]) -> dict:
+        """values:batchUpdate — несколько диапазонов одним запросом."""
+        body = {"valueInputOption": "RAW", "data": [{"range": r, "values": v} for r, v in data.items()]}
+        return await self.request("POST", "/values:batchUpdate", body=body)
+
+    async def batch_update(self, requests: List[dict]) -> dict:
+        """spreadsheets:batchUpdate — применяется атомарно целиком."""
+        return await self.request("POST", ":batchUpdate", body={"requests": requests})
+
+    async def revision(self) -> Optional[str]:
+        """Версия файла таблицы (Drive API): растёт на каждую правку. None — проверка не настроена.
+
+        Запрос к Drive не расходует квоту чтений Sheets, поэтому идёт мимо неё.
+        """
+        if not self.drive_url:
+            return None
+        data = await self._send("GET", f"{self.drive_url}/files/{self.spreadsheet_id}", {"fields": "version"}, None)
+        return data.get("version")
+
+    async def sheet_ids(self) -> Dict[str, int]:
+        data = await self.request("GET", params={"fields": "sheets.properties(sheetId,title)"})
+        return {s["properties"]["title"]: s["properties"]["sheetId"] for s in data.get("sheets", [])}
+
+    def metrics(self) -> dict:
+        result = {"requests": self.requests, "token_refreshes": self.token.refreshes}
+        if self.quota is not None:
+            result["quota"] = self.quota.metrics()
+        return result
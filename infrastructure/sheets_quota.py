@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+import aiohttp
+
+from infrastructure.rate_limit import TokenBucket
+from infrastructure.sheets_client import SheetsAPIError
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Чем меньше значение, тем раньше запрос получает токен."""
+    INTERACTIVE = 0  # запись, отмена и их чтения — пользователь ждёт ответа
+    BACKGROUND = 1   # периодический sync
+
+
+_current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "sheets_priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def background_sheets():
+    """Все запросы к Sheets внутри блока уступают очередь интерактивным."""
+    token = _current_priority.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def _retryable(kind: str, exc: Exception) -> bool:
+    if isinstance(exc, SheetsAPIError) and exc.status == 429:
+        return True
+    # После 5xx или обрыва запись могла примениться — повтор append задвоил бы строку
+    if kind == "write":
+        return False
+    if isinstance(exc, SheetsAPIError):
+        return exc.status >= 500
+    return isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class SheetsQuota:
+    """Планировщик запросов к Sheets API под поминутные квоты Google.
+
+    Отдельные token bucket'ы на чтение и запись (квоты у Google раздельные);
+    в очереди за токеном интерактивные запросы идут раньше фонового sync.
+    429 (и для чтений — 5xx/обрывы) повторяются с экспоненциальной задержкой
+    и полным jitter (или по Retry-After); 429 к тому же приостанавливает весь bucket.
+    """
+
+    def __init__(self, reads_per_minute: float = 60.0, writes_per_minute: float = 60.0,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 32.0,
+                 rng: random.Random = random, sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self._buckets: Dict[str, TokenBucket] = {
+            "read": TokenBucket(reads_per_minute / 60.0, reads_per_minute),
+            "write": TokenBucket(writes_per_minute / 60.0, writes_per_minute),
+        }
+        self._waiting: Dict[str, List[Tuple[int, int]]] = {kind: [] for kind in self._buckets}
+        self._changed: Dict[str, asyncio.Condition] = {}
+        self._seq = itertools.count()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng
+        self._sleep = sleep
+
+        self.stats: Dict[str, Dict[str, int]] = {
+            kind: {"requests": 0, "throttled": 0, "retries": 0, "failed": 0} for kind in self._buckets
+        }
+
+    def backoff(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _condition(self, kind: str) -> asyncio.Condition:
+        # Condition создаётся в работающем event loop
+        if kind not in self._changed:
+            self._changed[kind] = asyncio.Condition()
+        return self._changed[kind]
+
+    async def _acquire(self, kind: str) -> None:
+        bucket, queue, changed = self._buckets[kind], self._waiting[kind], self._condition(kind)
+        entry = (int(_current_priority.get()), next(self._seq))
+        async with changed:
+            heapq.heappush(queue, entry)
+            try:
+                while True:
+                    wait = None
+                    if queue[0] == entry:
+                        wait = bucket.delay()
+                        if wait <= 0:
+                            bucket.tokens -= 1
+                            return
+                    try:
+                        await asyncio.wait_for(changed.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                # Выдан токен или ожидание отменено — пропускаем следующего
+                queue.remove(entry)
+                heapq.heapify(queue)
+                changed.notify_all()
+
+    async def run(self, kind: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет запрос вида kind ("read"/"write") в пределах квоты, с повторами."""
+        stats = self.stats[kind]
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(kind)
+            stats["requests"] += 1
+            try:
+                return await call()
+            except Exception as e:
+                if not _retryable(kind, e) or attempt == self.max_retries:
+                    stats["failed"] += 1
+                    raise
+                delay = getattr(e, "retry_after", None) or self.backoff(attempt)
+                stats["retries"] += 1
+                logging.warning(f"Sheets {kind}: {e}; повтор через {delay:.1f} с (попытка {attempt + 1})")
+                if getattr(e, "status", None) == 429:
+                    # Квота исчерпана для всех — ждут все запросы этого вида
+                    stats["throttled"] += 1
+                    self._buckets[kind].block(delay)
+                else:
+                    await self._sleep(delay)
+
+    def headroom(self, kind: str = "read") -> float:
+        """Доля свободных токенов вида kind (0 — квота исчерпана или приостановлена после 429)."""
+        bucket = self._buckets[kind]
+        if bucket.delay(0) > 0:
+            return 0.0
+        return max(bucket.tokens, 0.0) / bucket.capacity
+
+    def metrics(self) -> dict:
+        result = {}
+        for kind in self._buckets:
+            result[kind] = {
+                "headroom": round(self.headroom(kind), 3),
+                "waiting": len(self._waiting[kind]),
+                **self.stats[kind],
+            }
+        return result
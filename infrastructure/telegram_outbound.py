@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from infrastructure.rate_limit import TokenBucket
+
+
+class Lane(IntEnum):
+    """Полосы очереди: чем меньше значение, тем выше приоритет."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_current_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar("outbound_lane", default=Lane.INTERACTIVE)
+
+
+@contextmanager
+def background_lane():
+    """Все запросы к Bot API внутри блока уходят в фоновую полосу (напоминания, рассылки)."""
+    token = _current_lane.set(Lane.BACKGROUND)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class OutboundStopped(RuntimeError):
+    """Диспетчер остановлен раньше, чем запрос дошёл до Bot API."""
+
+
+@dataclass
+class _Job:
+    call: Callable[[], Awaitable[Any]]
+    chat_id: Optional[int]
+    future: asyncio.Future
+    lane: Lane
+    attempts: int = 0
+
+
+class OutboundDispatcher:
+    """Исходящая очередь к Bot API.
+
+    Глобальный token bucket держит общий лимит Telegram (~30 сообщений/с),
+    отдельные bucket'ы на каждый чат — лимит на чат. Интерактивные ответы
+    обслуживаются раньше фоновых, RetryAfter приостанавливает чат (или всю
+    очередь) и запрос повторяется автоматически.
+    """
+
+    def __init__(self, global_rate: float = 30.0, per_chat_rate: float = 1.0,
+                 per_chat_burst: float = 3.0, max_retries: int = 3, max_chat_buckets: int = 4096):
+        self._global = TokenBucket(global_rate, global_rate)
+        self._per_chat_rate = per_chat_rate
+        self._per_chat_burst = per_chat_burst
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._max_chat_buckets = max_chat_buckets
+        self.max_retries = max_retries
+
+        self._lanes: Dict[Lane, Deque[_Job]] = {lane: deque() for lane in Lane}
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._in_flight = 0
+
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_hits = 0
+
+    # ── Жизненный цикл ──
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает очередь: уже отправленные запросы доходят до конца,
+        ждущие в очереди получают OutboundStopped, а не висят вечно."""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        for q in self._lanes.values():
+            while q:
+                job = q.popleft()
+                if not job.future.done():
+                    job.future.set_exception(OutboundStopped("Очередь исходящих остановлена"))
+
+    # ── Постановка в очередь ──
+    async def submit(self, call: Callable[[], Awaitable[Any]], chat_id: Optional[int] = None,
+                     lane: Optional[Lane] = None) -> Any:
+        """Выполняет call, когда позволят лимиты. Возвращает его результат."""
+        if self._worker is None:
+            # Диспетчер не запущен (тесты, скрипты) — отправляем напрямую
+            return await call()
+
+        job = _Job(call, chat_id, asyncio.get_running_loop().create_future(),
+                   _current_lane.get() if lane is None else lane)
+        self._lanes[job.lane].append(job)
+        self._wakeup.set()
+        return await job.future
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def metrics(self) -> dict:
+        data = {"queue_depth": self.queue_depth, "in_flight": self._in_flight}
+        for lane, q in self._lanes.items():
+            data[f"queue_depth_{lane.name.lower()}"] = len(q)
+        data.update(sent=self.sent, failed=self.failed, retry_after=self.retry_after_hits,
+                    chat_buckets=len(self._chat_buckets))
+        return data
+
+    # ── Планировщик ──
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self._max_chat_buckets:
+                # Полные ведра не хранят состояния — их можно выбросить
+                for cid in [c for c, b in self._chat_buckets.items() if b.is_full()]:
+                    del self._chat_buckets[cid]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._per_chat_rate, self._per_chat_burst)
+        return bucket
+
+    def _next_job(self) -> Tuple[Optional[_Job], Optional[float]]:
+        """Следующее готовое задание или время ожидания (None — очередь пуста)."""
+        now = time.monotonic()
+        global_wait = self._global.delay(now=now)
+        if global_wait > 0:
+            return None, global_wait if self.queue_depth else None
+
+        min_wait = None
+        for lane in Lane:
+            q = self._lanes[lane]
+            for i, job in enumerate(q):
+                if job.future.done():
+                    continue
+                wait = 0.0 if job.chat_id is None else self._chat_bucket(job.chat_id).delay(now=now)
+                if wait <= 0:
+                    del q[i]
+                    self._global.consume(now=now)
+                    if job.chat_id is not None:
+                        self._chat_bucket(job.chat_id).consume(now=now)
+                    return job, None
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+            # Отменённые ожидающими задания выбрасываем
+            while q and q[0].future.done():
+                q.popleft()
+        return None, min_wait
+
+    async def _run(self) -> None:
+        while True:
+            job, wait = self._next_job()
+            if job is not None:
+                self._in_flight += 1
+                task = asyncio.create_task(self._deliver(job))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, job: _Job) -> None:
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            self.retry_after_hits += 1
+            job.attempts += 1
+            if job.attempts > self.max_retries or self._worker is None:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            logging.warning(f"RetryAfter {e.retry_after}s (chat {job.chat_id}), попытка {job.attempts}")
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id).block(e.retry_after)
+            else:
+                self._global.block(e.retry_after)
+            self._lanes[job.lane].appendleft(job)
+            self._wakeup.set()
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+
+
+class OutboundRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает все запросы бота, адресованные чату, через OutboundDispatcher."""
+
+    def __init__(self, dispatcher: OutboundDispatcher):
+        self.dispatcher = dispatcher
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. лимитам на сообщения не подчиняются
+            return await make_request(bot, method)
+        return await self.dispatcher.submit(lambda: make_request(bot, method), chat_id=chat_id)
@@ -0,0 +1,155 @@
+import asyncio
+import inspect
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Union
+
+WHEEL_SLOTS = 60   # уровень 0: ячейка на тик (минуту)
+WHEEL_BLOCKS = 24  # уровень 1: ячейка на блок из WHEEL_SLOTS тиков (час)
+
+# Обработчик получает всю пачку payload'ов, наступивших в одном тике
+BatchHandler = Callable[[List[Any]], Any]
+
+
+class _Timer:
+    __slots__ = ("key", "tick", "handler", "payload", "bucket")
+
+    def __init__(self, key: Hashable, tick: int, handler: BatchHandler, payload: Any):
+        self.key = key
+        self.tick = tick
+        self.handler = handler
+        self.payload = payload
+        self.bucket: Optional[Dict[Hashable, "_Timer"]] = None
+
+
+class TimerWheel:
+    """Иерархическое колесо таймеров (по умолчанию тик = минута).
+
+    schedule/cancel — O(1) по ключу (например, (user_id, event)), без
+    обращений к хранилищу задач. Одна фоновая задача просыпается раз в тик
+    и отдаёт каждому обработчику пачку наступивших таймеров. Подходит для
+    напоминаний, удержаний слотов и TTL кэшей.
+    """
+
+    def __init__(self, tick_seconds: float = 60.0, clock: Callable[[], float] = time.time):
+        self.tick_seconds = tick_seconds
+        self._clock = clock
+        self._now_tick = self._tick_of(clock())
+        self._level0: List[Dict[Hashable, _Timer]] = [{} for _ in range(WHEEL_SLOTS)]
+        self._level1: List[Dict[Hashable, _Timer]] = [{} for _ in range(WHEEL_BLOCKS)]
+        self._overflow: Dict[Hashable, _Timer] = {}
+        self._index: Dict[Hashable, _Timer] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._handler_tasks: Set[asyncio.Task] = set()
+        self.fired = 0
+
+    def _tick_of(self, ts: float) -> int:
+        return int(ts // self.tick_seconds)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    # ── Публичный API ──
+    def schedule(self, key: Hashable, when: Union[datetime, float], handler: BatchHandler, payload: Any = None) -> None:
+        """Ставит (или переставляет) таймер key на момент when."""
+        ts = when.timestamp() if isinstance(when, datetime) else when
+        self.cancel(key)
+        timer = _Timer(key, max(self._tick_of(ts), self._now_tick + 1), handler, payload)
+        self._index[key] = timer
+        self._place(timer)
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._index.pop(key, None)
+        if timer is None:
+            return False
+        del timer.bucket[key]
+        return True
+
+    def metrics(self) -> dict:
+        return {"timers": len(self._index), "fired": self.fired, "overflow": len(self._overflow)}
+
+    # ── Раскладка по уровням ──
+    def _place(self, timer: _Timer) -> None:
+        blocks_ahead = timer.tick // WHEEL_SLOTS - self._now_tick // WHEEL_SLOTS
+        if blocks_ahead == 0:
+            bucket = self._level0[timer.tick % WHEEL_SLOTS]
+        elif blocks_ahead < WHEEL_BLOCKS:
+            bucket = self._level1[(timer.tick // WHEEL_SLOTS) % WHEEL_BLOCKS]
+        else:
+            bucket = self._overflow
+        bucket[timer.key] = timer
+        timer.bucket = bucket
+
+    def _cascade(self, bucket: Dict[Hashable, _Timer]) -> None:
+        timers = list(bucket.values())
+        bucket.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def _step(self) -> List[_Timer]:
+        """Сдвигает колесо на один тик и возвращает наступившие таймеры."""
+        self._now_tick += 1
+        if self._now_tick % WHEEL_SLOTS == 0:
+            block = self._now_tick // WHEEL_SLOTS
+            if block % WHEEL_BLOCKS == 0:
+                self._cascade(self._overflow)
+            self._cascade(self._level1[block % WHEEL_BLOCKS])
+        bucket = self._level0[self._now_tick % WHEEL_SLOTS]
+        due = list(bucket.values())
+        bucket.clear()
+        for timer in due:
+            del self._index[timer.key]
+        return due
+
+    # ── Срабатывание ──
+    def _collect(self, target: int) -> Dict[BatchHandler, List[Any]]:
+        groups: Dict[BatchHandler, List[Any]] = {}
+        while self._now_tick < target:
+            for timer in self._step():
+                groups.setdefault(timer.handler, []).append(timer.payload)
+                self.fired += 1
+        return groups
+
+    @staticmethod
+    async def _dispatch(groups: Dict[BatchHandler, List[Any]]) -> None:
+        for handler, payloads in groups.items():
+            try:
+                result = handler(payloads)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logging.exception("Ошибка обработчика таймеров")
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """Догоняет колесо до now и вызывает обработчики пачками. Возвращает число таймеров."""
+        groups = self._collect(self._tick_of(self._clock() if now is None else now))
+        await self._dispatch(groups)
+        return sum(len(p) for p in groups.values())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            next_tick_at = (self._now_tick + 1) * self.tick_seconds
+            await asyncio.sleep(max(0.0, next_tick_at - self._clock()))
+            groups = self._collect(self._tick_of(self._clock()))
+            if groups:
+                # Обработчики не должны задерживать следующий тик
+                task = asyncio.create_task(self._dispatch(groups))
+                self._handler_tasks.add(task)
+                task.add_done_callback(self._handler_tasks.discard)
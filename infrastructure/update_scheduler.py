@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+Job = Callable[[], Awaitable[Any]]
+
+
+def update_key(update: Update) -> Hashable:
+    """Ключ очереди: пользователь апдейта, иначе чат; без них — сам апдейт (порядок не важен)."""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    return ("update", update.update_id)
+
+
+class UpdateScheduler:
+    """Разные пользователи — параллельно (до workers), один пользователь — строго FIFO.
+
+    На каждый ключ своя очередь; в общую очередь готовых попадает ключ, а не
+    задача, поэтому ключ одновременно обрабатывает не больше одного воркера.
+    Опустевшая очередь удаляется сразу — память держат только активные пользователи.
+    """
+
+    def __init__(self, workers: int = 16, max_pending: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._scheduled: Set[Hashable] = set()  # ключ в _ready или у воркера
+        self._pending = 0
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: List[asyncio.Task] = []
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Дожидается уже принятых задач и останавливает воркеры."""
+        if not self._tasks:
+            return
+        await self._idle.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, key: Hashable, job: Job) -> bool:
+        """Неблокирующая постановка; False, если достигнут лимит max_pending."""
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(job)
+        self._pending += 1
+        self._idle.clear()
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+        return True
+
+    async def put(self, key: Hashable, job: Job) -> None:
+        """Постановка с ожиданием места (обратное давление для polling)."""
+        async with self._space:
+            await self._space.wait_for(lambda: self._pending < self.max_pending)
+            self.submit(key, job)
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            job = queue.popleft()
+            self.active += 1
+            try:
+                await job()
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logging.exception(f"Ошибка обработки апдейта (ключ {key})")
+            finally:
+                self.active -= 1
+                self._pending -= 1
+                if queue:
+                    # В конец общей очереди — остальные пользователи не ждут
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+                    self._scheduled.discard(key)
+                if not self._pending:
+                    self._idle.set()
+                async with self._space:
+                    self._space.notify()
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._pending - self.active,
+            "active": self.active,
+            "queues": len(self._queues),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+class UpdateSchedulingMiddleware(BaseMiddleware):
+    """Outer-middleware для dp.update в режиме polling: обработка уходит в UpdateScheduler.
+
+    Polling запускается с handle_as_tasks=False — при заполненном планировщике
+    put() приостанавливает получение апдейтов, а не копит задачи.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, handler, event: Update, data: Dict[str, Any]) -> Optional[Any]:
+        await self.scheduler.put(update_key(event), lambda: handler(event, data))
+        return None
@@ -0,0 +1,58 @@
+import logging
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from infrastructure.update_scheduler import UpdateScheduler, update_key
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramWebhook:
+    """Приём апдейтов Telegram на том же aiohttp-приложении, что и health-сервер.
+
+    Апдейт сразу подтверждается (200), а обработка идёт в UpdateScheduler:
+    параллельно по пользователям, по порядку внутри пользователя. При
+    переполнении отвечаем 503 — Telegram повторит доставку позже.
+    kwargs попадают в хэндлеры так же, как в dp.start_polling(bot, **kwargs).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str, secret_token: Optional[str] = None,
+                 scheduler: Optional[UpdateScheduler] = None, **kwargs: Any):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.kwargs = kwargs
+        self.scheduler = scheduler or UpdateScheduler()
+
+    async def _feed(self, update: Update) -> None:
+        await self.dp.feed_update(self.bot, update, **self.kwargs)
+
+    def register(self, app: web.Application) -> None:
+        app.router.add_post(self.path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and request.headers.get(SECRET_HEADER) != self.secret_token:
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            # Повторять битый апдейт бессмысленно — подтверждаем и пишем в лог
+            logging.warning("Некорректный апдейт в webhook")
+            return web.Response(status=200)
+        if not self.scheduler.submit(update_key(update), lambda: self._feed(update)):
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response(status=200)
+
+    async def start(self, url: str) -> None:
+        self.scheduler.start()
+        await self.bot.set_webhook(url.rstrip("/") + self.path, secret_token=self.secret_token)
+
+    async def stop(self) -> None:
+        await self.scheduler.stop()
+
+    def metrics(self) -> dict:
+        return self.scheduler.metrics()
@@ -1,13 +1,30 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from core.config import TELEGRAM_TOKEN, GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL, OPENAI_API_KEY, HEALTH_PORT
+from core.config import TELEGRAM_TOKEN, GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL, OPENAI_API_KEY, HEALTH_PORT, REMINDERS_DB_PATH
+from core.config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, UPDATE_WORKERS, CALLBACK_DEDUP_SECONDS
+from core.config import SLOT_HOLD_SECONDS, SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, SHEETS_MAX_RETRIES
+from core.config import EVENTS_CONFIG, BOOKING_STORE, EVENT_LOG_PATH, EVENT_LOG_COMPACT_EVERY, COLUMN_STORE
+from core.config import SYNC_STALE_MINUTES, SYNC_INTERVAL_SECONDS, SYNC_MIN_SECONDS, SYNC_MAX_SECONDS
+from infrastructure.adaptive_sync import AdaptiveSync
+from infrastructure.column_store import ColumnStoreRepository
+from infrastructure.event_log import EventLogRepository
 from infrastructure.google_sheets import GoogleSheetsRepository
+from infrastructure.idempotency import CallbackIdempotencyMiddleware, IdempotencyCache
 from infrastructure.openai_service import OpenAILLMService
+from infrastructure.sheets_client import SheetsClient
+from infrastructure.sheets_quota import SheetsQuota
+from infrastructure.telegram_outbound import OutboundDispatcher, OutboundRequestMiddleware, background_lane
+from infrastructure.timer_wheel import TimerWheel
+from infrastructure.update_scheduler import UpdateScheduler, UpdateSchedulingMiddleware
+from infrastructure.webhook import TelegramWebhook
 from services.booking_service import BookingService
+from services.reminder_service import ReminderService, ReminderStore
+from services.slot_holds import SlotHolds
+from presentation.callbacks import codec
 from presentation.handlers import router
+from presentation.formatters import build_reminder_text, build_waitlist_promoted_text
 from web.health import HealthServer
 
 #async def run_sync_loop(repo: GoogleSheetsRepository, interval: int = 60):
@@ -25,36 +42,121 @@ async def main():
     logging.basicConfig(level=logging.INFO)
 
     # 1. Инициализация инфраструктуры (Repositories & Services)
-    repo = GoogleSheetsRepository(GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL)
+    quota = None
+    if BOOKING_STORE == "event_log":
+        repo = EventLogRepository(EVENT_LOG_PATH, compact_every=EVENT_LOG_COMPACT_EVERY)
+        repo_metrics = ("event_log", repo.metrics)
+        await repo.sync()
+        if repo.is_empty() and GOOGLE_SHEET_URL:
+            # Первый запуск на журнале: переносим текущие записи из таблицы
+            source = GoogleSheetsRepository(GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL)
+            await source.sync()
+            repo.import_records([r for ev in EVENTS_CONFIG for r in await source.get_records(ev)])
+            await source.close()
+    else:
+        # Все запросы к Sheets идут через квоты чтения/записи с повторами на 429
+        quota = SheetsQuota(SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, max_retries=SHEETS_MAX_RETRIES)
+        sheets = SheetsClient.from_service_account(GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL, quota=quota)
+        repo = GoogleSheetsRepository(GOOGLE_CREDS_PATH, GOOGLE_SHEET_URL, client=sheets)
+        repo_metrics = ("sheets", repo.metrics)
+    if COLUMN_STORE:
+        repo = ColumnStoreRepository(repo)
     llm = OpenAILLMService(OPENAI_API_KEY)
     
+    bot = Bot(token=TELEGRAM_TOKEN)
+
+    async def send_reminder(user_id: str, event: str, time_str: str):
+        with background_lane():
+            await bot.send_message(user_id, build_reminder_text(event, time_str), parse_mode="Markdown")
+
+    # Общее колесо таймеров: напоминания (и далее удержания слотов, TTL кэшей)
+    timer_wheel = TimerWheel()
+    reminders = ReminderService(ReminderStore(REMINDERS_DB_PATH), send_reminder, wheel=timer_wheel)
+
+    async def notify_promoted(record):
+        with background_lane():
+            await bot.send_message(record.user_id, build_waitlist_promoted_text(record), parse_mode="Markdown")
+
     # 2. Инициализация бизнес-логики
-    booking_service = BookingService(repo)
+    holds = SlotHolds(SLOT_HOLD_SECONDS, wheel=timer_wheel)
+    booking_service = BookingService(repo, reminders=reminders, holds=holds, notifier=notify_promoted)
 
     # 3. Первичная синхронизация и запуск фоновых задач
-    await repo.sync()
+    async def sync_all(full: bool = False):
+        # Репозиторий + индекс занятости (и лист ожидания, если места освободили в таблице);
+        # известная разница строк применяется к напоминаниям внутри sync
+        changes = await booking_service.sync()
+        if full or changes is None:
+            # Напоминания восстанавливаются из репозитория (после рестарта и правок в таблице)
+            await reminders.rebuild(repo)
+        # Разница строк — только правки в самой таблице: записи через бота уже в снимке
+        return changes
+
+    await sync_all(full=True)
 
     #asyncio.create_task(run_sync_loop(repo, interval=20)) # 60 секунд
 
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(repo.sync, "interval", minutes=2)
-    scheduler.start()
+    # Интервал sync: чаще, пока таблицу правят, реже в тишине и при нехватке квоты чтений
+    sync_loop = AdaptiveSync(sync_all, SYNC_INTERVAL_SECONDS, SYNC_MIN_SECONDS, SYNC_MAX_SECONDS,
+                             budget=SYNC_STALE_MINUTES * 60, headroom=quota.headroom if quota else None)
+    sync_loop.start()
+    timer_wheel.start()
 
-    # 4. Запуск Health Check сервера
-    health_server = HealthServer(repo, HEALTH_PORT)
-    await health_server.start()
+    # 4. Исходящая очередь Bot API (лимиты Telegram, RetryAfter)
+    outbound = OutboundDispatcher()
+    outbound.start()
 
     # 5. Настройка Telegram бота
-    bot = Bot(token=TELEGRAM_TOKEN)
+    bot.session.middleware(OutboundRequestMiddleware(outbound))
     dp = Dispatcher()
     dp.include_router(router)
+    # Двойные тапы по кнопкам не выполняют запись повторно (навигация — всегда)
+    callback_cache = IdempotencyCache(ttl=CALLBACK_DEDUP_SECONDS)
+    dp.callback_query.outer_middleware(CallbackIdempotencyMiddleware(callback_cache, mutating=codec.mutating))
+
+    # 6. Запуск Health Check сервера (в режиме webhook — он же принимает апдейты)
+    health_server = HealthServer(repo, HEALTH_PORT)
+    health_server.add_metrics("outbound", outbound.metrics)
+    health_server.add_metrics(*repo_metrics)
+    health_server.add_metrics("reminders", reminders.metrics)
+    health_server.add_metrics("sync", sync_loop.metrics)
+    health_server.add_metrics("timers", timer_wheel.metrics)
+    health_server.add_metrics("callbacks", callback_cache.metrics)
+    health_server.add_metrics("holds", holds.metrics)
+    health_server.add_metrics("waitlist", booking_service.waitlist.metrics)
+
+    # Апдейты: параллельно по пользователям, FIFO внутри пользователя
+    updates = UpdateScheduler(workers=UPDATE_WORKERS)
+    health_server.add_metrics("updates", updates.metrics)
 
     # Прокидываем зависимости в хэндлеры (Dependency Injection)
     # В Aiogram 3 все ключи из workflow_data попадают в аргументы хэндлеров
+    webhook = None
+    if WEBHOOK_URL:
+        webhook = TelegramWebhook(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET or None, scheduler=updates,
+                                  booking_service=booking_service, llm=llm)
+        webhook.register(health_server.app)
+    else:
+        dp.update.outer_middleware(UpdateSchedulingMiddleware(updates))
+    health_runner = await health_server.start()
+
     try:
-        await dp.start_polling(bot, booking_service=booking_service, llm=llm)
+        if webhook:
+            await webhook.start(WEBHOOK_URL)
+            await asyncio.Event().wait()
+        else:
+            # Иначе Telegram отклонит getUpdates, если раньше был включён webhook
+            await bot.delete_webhook()
+            updates.start()
+            await dp.start_polling(bot, handle_as_tasks=False, booking_service=booking_service, llm=llm)
     finally:
+        await updates.stop()
+        await sync_loop.stop()
+        await health_runner.cleanup()
+        await timer_wheel.stop()
+        await outbound.stop()
         await bot.session.close()
+        await repo.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import struct
+from enum import IntEnum
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG
+
+# Версия формата: при изменении раскладки старые кнопки просто перестают декодироваться
+CODEC_VERSION = 1
+
+# версия, действие (старший бит — перенос), индекс услуги, минута слота от полуночи, индекс мастера
+_LAYOUT = struct.Struct(">BBBHB")
+_ENCODED_LEN = 8  # 6 байт → 8 символов base64 без паддинга
+_NONE8 = 0xFF
+_NONE16 = 0xFFFF
+_RESCHEDULE = 0x80
+
+
+class Action(IntEnum):
+    START_BOOK = 1
+    SLOT = 2
+    MASTER = 3
+    CONFIRM_OVERLAP = 4
+    HOUR = 5
+    BACK_TO_HOURS = 6
+    BACK_TO_SERVICES = 7
+    NO_SLOTS = 8
+    BOOKING_DETAIL = 9
+    CANCEL_BOOKING = 10
+    REQUEST_RESCHEDULE = 11
+    JOIN_WAITLIST = 12
+    CANCEL_ALL = 13
+
+
+# Кнопки, меняющие записи: повторный тап в пределах TTL идемпотентности не выполняется
+MUTATING_ACTIONS = frozenset({
+    Action.SLOT, Action.MASTER, Action.CONFIRM_OVERLAP, Action.CANCEL_BOOKING, Action.JOIN_WAITLIST,
+    Action.CANCEL_ALL,
+})
+
+
+class Callback(NamedTuple):
+    action: Action
+    event: Optional[str] = None
+    time: Optional[str] = None
+    master_id: Optional[str] = None
+    reschedule: bool = False
+
+    @property
+    def mode(self) -> str:
+        """'book' или 'reschedule' — как в BookingService и клавиатурах."""
+        return "reschedule" if self.reschedule else "book"
+
+
+class CallbackCodec:
+    """Компактный callback_data: 8 ASCII-символов вместо кириллических строк.
+
+    Услуга и мастер кодируются индексами в конфиге, время — минутой от полуночи,
+    поэтому кнопка укладывается в лимит Telegram (64 байта) с большим запасом,
+    а разбор — это один struct.unpack без split и поиска по строкам.
+    """
+
+    def __init__(self, events: Iterable[str], masters: Mapping[str, List[dict]]):
+        self._events: List[str] = list(events)
+        self._event_idx: Dict[str, int] = {ev: i for i, ev in enumerate(self._events)}
+        self._masters: Dict[str, List[str]] = {ev: [m["id"] for m in ms] for ev, ms in masters.items()}
+        self._master_idx: Dict[Tuple[str, str], int] = {
+            (ev, m_id): i for ev, ids in self._masters.items() for i, m_id in enumerate(ids)
+        }
+
+    def encode(self, action: Action, event: Optional[str] = None, time_str: Optional[str] = None,
+               master_id: Optional[str] = None, mode: str = "book") -> str:
+        ev = _NONE8 if event is None else self._event_idx[event]
+        if time_str is None:
+            minute = _NONE16
+        else:
+            h, m = time_str.split(":")
+            minute = int(h) * 60 + int(m)
+        master = _NONE8 if master_id is None else self._master_idx[(event, master_id)]
+        flags = _RESCHEDULE if mode == "reschedule" else 0
+        raw = _LAYOUT.pack(CODEC_VERSION, int(action) | flags, ev, minute, master)
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode(self, data: Optional[str]) -> Optional[Callback]:
+        """Разбирает callback_data; None для чужих, устаревших и битых данных."""
+        if not data or len(data) != _ENCODED_LEN:
+            return None
+        try:
+            version, action, ev, minute, master = _LAYOUT.unpack(base64.urlsafe_b64decode(data))
+            if version != CODEC_VERSION:
+                return None
+            kind = Action(action & ~_RESCHEDULE)
+            event = None if ev == _NONE8 else self._events[ev]
+            time_str = None if minute == _NONE16 else f"{minute // 60:02d}:{minute % 60:02d}"
+            master_id = None if master == _NONE8 else self._masters[event][master]
+        except (binascii.Error, struct.error, ValueError, IndexError, KeyError):
+            return None
+        return Callback(kind, event, time_str, master_id, bool(action & _RESCHEDULE))
+
+    def mutating(self, query) -> bool:
+        """Для CallbackIdempotencyMiddleware: кнопка меняет записи (навигация — нет)."""
+        cb = self.decode(query.data)
+        return cb is not None and cb.action in MUTATING_ACTIONS
+
+    def filter(self, *actions: Action):
+        """Фильтр aiogram: пропускает нужные действия и передаёт разобранный Callback в хэндлер как cb."""
+        def check(query) -> Union[bool, dict]:
+            cb = self.decode(query.data)
+            if cb is None or (actions and cb.action not in actions):
+                return False
+            return {"cb": cb}
+        return check
+
+
+codec = CallbackCodec(EVENTS_CONFIG, MASTERS_CONFIG)
@@ -60,4 +60,40 @@ def build_program_message(bookings) -> str:
             f"  👤 Мастер: {b.master_id if b.master_id != 'Записано' else 'Любой'}\n\n"
         )
         
-    return text
\ No newline at end of file
+    return text
+
+def build_plan_message(result: dict) -> str:
+    if not result["bookings"]:
+        return "Не удалось подобрать свободное время ни для одной услуги 😔"
+    text = build_program_message(result["bookings"]).replace("Ваша программа на сегодня", "Собрали вам программу")
+    if result["unplaced"]:
+        text += "⛔ Не поместились: " + ", ".join(ef(ev) for ev in result["unplaced"]) + "\n"
+    return text
+
+def build_nearest_text(slots) -> str:
+    """Подсказка с ближайшими свободными слотами к ответу «занято»."""
+    if not slots:
+        return ""
+    return f"\n💡 Ближайшие свободные: {', '.join(slots)}"
+
+def build_availability_message(time_str: str, available) -> str:
+    """Ответ на «куда можно в HH:MM»: available — пары (услуга, свободных мест)."""
+    if not available:
+        return f"На {time_str} свободных услуг нет 😔"
+    lines = [f"🕐 **Куда можно в {time_str}:**", ""]
+    for event, places in available:
+        lines.append(f"{EVENT_ICONS.get(event, '✨')} {ef(event)} — свободно: {places}")
+    return "\n".join(lines)
+
+def build_waitlist_promoted_text(record: BookingRecord) -> str:
+    text = f"🎉 **Место освободилось!**\nВы записаны {ef(record.event, 'to')} на {record.time}."
+    if record.master_id and record.master_id != "Записано":
+        text += f"\n👤 Специалист: {record.master_id}"
+    return text
+
+def build_reminder_text(event: str, time_str: str) -> str:
+    return (
+        f"✨ **Напоминалочка!**\n"
+        f"Запись {ef(event, 'to')} начнётся через 3 минутки "
+        f"(в {time_str}). Ждём вас! 💖"
+    )
@@ -1,15 +1,18 @@
+import logging
 import re
+from typing import Awaitable, Callable, Dict
 from aiogram import Router, types, F
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, ExceptionTypeFilter
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from services.booking_service import BookingService
-from core.interfaces import ILLMService
+from core.interfaces import ILLMService, RepositoryError
 from core.config import EVENTS_CONFIG, EVENT_ALIASES
 from core.config import MASTERS_CONFIG
-from presentation.keyboards import build_services_keyboard, build_slot_keyboard, build_masters_keyboard
-from presentation.formatters import build_service_card, build_program_message, ef
+from presentation.keyboards import build_services_keyboard, build_slot_keyboard, build_masters_keyboard, build_waitlist_keyboard, build_availability_keyboard
+from presentation.formatters import build_service_card, build_program_message, build_plan_message, build_nearest_text, build_availability_message, ef
 from presentation.keyboards import build_services_keyboard, build_slot_keyboard, get_main_menu_keyboard
+from presentation.callbacks import Action, Callback, codec
 
 router = Router()
 
@@ -22,17 +25,21 @@ WELCOME_TEXT = (
     "  › _«Перенеси макияж на 11:30»_\n"
     "  › _«Отмени массаж»_\n"
     "  › _«Отмени все»_\n"
-    "  › _«Моя программа»_\n\n"
+    "  › _«Моя программа»_\n"
+    "  › _«Собери программу»_ — запишу на всё сразу\n\n"
     "Или выберите услугу из списка 👇"
 )
 
-def make_cb(prefix: str, *args) -> str:
-    # Собираем строку
-    data = f"{prefix}|{'|'.join(map(str, args))}"
-    if len(data.encode('utf-8')) > 64:
-        # Если слишком длинно, можно логировать ошибку или обрезать (но лучше сократить данные)
-        print(f"WARNING: Callback data too long ({len(data)} bytes): {data}")
-    return data
+CallbackHandler = Callable[[types.CallbackQuery, Callback, BookingService], Awaitable]
+
+# Центральная таблица: действие из callback_data → обработчик
+CALLBACK_HANDLERS: Dict[Action, CallbackHandler] = {}
+
+def on_callback(action: Action):
+    def register(handler: CallbackHandler) -> CallbackHandler:
+        CALLBACK_HANDLERS[action] = handler
+        return handler
+    return register
 
 def _resolve_event(raw: str | None) -> str | None:
     if not raw:
@@ -41,17 +48,19 @@ def _resolve_event(raw: str | None) -> str | None:
     key = EVENT_ALIASES.get(key, key)
     return key if key in EVENTS_CONFIG else None
 
-async def handle_booking_result(callback: types.CallbackQuery, res: dict, event: str, time_str: str, master_id: str, action: str):
+FULL_SLOT_ERRORS = ("Мест нет.", "Все мастера заняты на это время.", "Этот специалист уже занят.")
+
+async def handle_booking_result(callback: types.CallbackQuery, booking_service: BookingService, res: dict,
+                                event: str, time_str: str, master_id: str, action: str):
     # Если произошел конфликт по времени
     if not res.get("ok") and res.get("status") == "conflict":
         conflict_event = res["conflict_event"]
-        # Если master_id None, превращаем в строку для callback_data
-        m_id = master_id if master_id else "None"
-        
+        # Держим место, пока пользователь решает
+        await booking_service.hold_slot(str(callback.from_user.id), event, time_str, master_id)
         kb = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="✅ Записаться всё равно", 
-                                  callback_data=make_cb("c_ov", event, time_str, m_id, action))],
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="back_to_services")]
+                                  callback_data=codec.encode(Action.CONFIRM_OVERLAP, event, time_str, master_id, mode=action))],
+            [InlineKeyboardButton(text="❌ Отмена", callback_data=codec.encode(Action.BACK_TO_SERVICES))]
         ])
         return await callback.message.edit_text(
             f"⚠️ **Внимание!** У вас уже есть запись на *{conflict_event}* в {time_str}.\n\n"
@@ -59,8 +68,15 @@ async def handle_booking_result(callback: types.CallbackQuery, res: dict, event:
             reply_markup=kb, parse_mode="Markdown"
         )
     
-    # Если всё ок или другая ошибка (например, "Мест нет")
-    await callback.message.edit_text(res["text"], parse_mode="Markdown")
+    # Слот занят — предлагаем лист ожидания (при переносе у пользователя уже есть запись)
+    if not res.get("ok") and res["text"] in FULL_SLOT_ERRORS and action == "book":
+        return await callback.message.edit_text(
+            f"{res['text']}{build_nearest_text(res.get('nearest'))}\nМожно встать в лист ожидания — запишем автоматически, если место освободится.",
+            reply_markup=build_waitlist_keyboard(event, time_str, master_id), parse_mode="Markdown"
+        )
+
+    # Если всё ок или другая ошибка
+    await callback.message.edit_text(res["text"] + build_nearest_text(res.get("nearest")), parse_mode="Markdown")
 
 @router.message(CommandStart())
 async def cmd_start(message: types.Message, booking_service: BookingService):
@@ -99,6 +115,9 @@ async def handle_text(message: types.Message, llm: ILLMService, booking_service:
             await message.reply("У вас пока нет записей 😊\n\n✨ **Выберите услугу:**", reply_markup=kb, parse_mode="Markdown")
         return
     
+    if text_lower in ["собери программу", "составь программу", "собрать программу", "запиши на всё", "запиши на все"]:
+        return await _plan_program(message, message, booking_service)
+
     cancel_all_patterns = ["отмени все", "отмени всё", "отменить все", "отменить всё", "удали все", "удали всё"]
     if text_lower in cancel_all_patterns:
         res = await booking_service.cancel_all(user_id)
@@ -121,6 +140,9 @@ async def handle_text(message: types.Message, llm: ILLMService, booking_service:
         res = await booking_service.cancel_all(user_id)
         return await processing_msg.edit_text(res, parse_mode="Markdown")
 
+    if action == "plan_program":
+        return await _plan_program(message, processing_msg, booking_service)
+
     if action == "my_bookings":
         bookings = await booking_service.get_user_bookings(user_id)
         text = build_program_message(bookings)
@@ -130,6 +152,10 @@ async def handle_text(message: types.Message, llm: ILLMService, booking_service:
             return await processing_msg.edit_text(text + "\n\n✨ **Доступные услуги для записи:**", reply_markup=kb, parse_mode="Markdown")
         return await processing_msg.edit_text("У вас пока нет записей 😊\n\n✨ **Выберите услугу:**", reply_markup=kb, parse_mode="Markdown")
 
+    # «Куда можно сходить в 14:00?» — по всем услугам сразу
+    if action == "free_at" or (action == "availability" and not event and time_str):
+        return await _availability_at(processing_msg, booking_service, user_id, time_str)
+
     if not event:
         kb = await build_services_keyboard(user_id, booking_service)
         return await processing_msg.edit_text("Уточните, о какой услуге речь? ✨\n\n👇 **Выберите:**", reply_markup=kb, parse_mode="Markdown")
@@ -177,9 +203,9 @@ async def handle_text(message: types.Message, llm: ILLMService, booking_service:
             text += "\nЧто бы вы хотели сделать?"
             
             kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Перенести время", callback_data=f"request_reschedule|{event}")],
-                [InlineKeyboardButton(text="❌ Отменить запись", callback_data=f"cancel_booking|{event}")],
-                [InlineKeyboardButton(text="← Назад к услугам", callback_data="back_to_services")]
+                [InlineKeyboardButton(text="🔄 Перенести время", callback_data=codec.encode(Action.REQUEST_RESCHEDULE, event))],
+                [InlineKeyboardButton(text="❌ Отменить запись", callback_data=codec.encode(Action.CANCEL_BOOKING, event))],
+                [InlineKeyboardButton(text="← Назад к услугам", callback_data=codec.encode(Action.BACK_TO_SERVICES))]
             ])
             return await processing_msg.edit_text(text, reply_markup=kb, parse_mode="Markdown")
 
@@ -228,13 +254,36 @@ async def handle_text(message: types.Message, llm: ILLMService, booking_service:
 
         # Если другая ошибка (например, "Все мастера заняты")
     
-    await processing_msg.edit_text(res["text"], parse_mode="Markdown")
+    await processing_msg.edit_text(res["text"] + build_nearest_text(res.get("nearest")), parse_mode="Markdown")
+
+async def _availability_at(reply_to: types.Message, booking_service: BookingService, user_id: str, time_str: str | None):
+    """Услуги со свободными местами на time_str, без пересечений с записями пользователя."""
+    time_str = (time_str or "").strip()
+    if not re.match(r"^\d{1,2}:\d{2}$", time_str):
+        kb = await build_services_keyboard(user_id, booking_service)
+        return await reply_to.edit_text("Уточните время, например «куда можно в 14:00?» 🕐", reply_markup=kb, parse_mode="Markdown")
+    time_str = time_str.zfill(5)  # "9:30" → "09:30", как в сетке слотов
+    available = await booking_service.availability_at(time_str, user_id)
+    kb = build_availability_keyboard(time_str, available) if available else await build_services_keyboard(user_id, booking_service)
+    await reply_to.edit_text(build_availability_message(time_str, available), reply_markup=kb, parse_mode="Markdown")
+
+async def _plan_program(message: types.Message, reply_to: types.Message, booking_service: BookingService):
+    """Записывает сразу на все свободные услуги без пересечений по времени."""
+    res = await booking_service.plan_program(
+        str(message.from_user.id),
+        username=message.from_user.username or "",
+        full_name=message.from_user.full_name,
+    )
+    text = build_plan_message(res)
+    if reply_to is message:
+        return await message.reply(text, parse_mode="Markdown")
+    await reply_to.edit_text(text, parse_mode="Markdown")
 
 # --- Обработчики кнопок (Inline Callbacks) ---
 
-@router.callback_query(F.data.startswith("start_book|"))
-async def process_start_book(callback: types.CallbackQuery, booking_service: BookingService):
-    event = callback.data.split("|")[1]
+@on_callback(Action.START_BOOK)
+async def process_start_book(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event = cb.event
     user_id = str(callback.from_user.id)
     
     # Проверка, записан ли уже
@@ -242,7 +291,7 @@ async def process_start_book(callback: types.CallbackQuery, booking_service: Boo
     if any(b.event == event for b in bookings):
         return await callback.message.edit_text(f"Вы уже записаны на {ef(event)} ✅")
 
-    suggested = await booking_service.get_suggested_slots(event)
+    suggested = await booking_service.get_suggested_slots(event, user_id=user_id)
     if not suggested:
         kb = await build_services_keyboard(user_id, booking_service)
         return await callback.message.edit_text("К сожалению, мест больше нет 😔", reply_markup=kb)
@@ -250,29 +299,28 @@ async def process_start_book(callback: types.CallbackQuery, booking_service: Boo
     card = build_service_card(event, suggested)
     await callback.message.edit_text(card + "\n\n🕐 **Выберите время:**", reply_markup=build_slot_keyboard(event, suggested, action="book"))
 
-@router.callback_query(F.data.startswith("slot|"))
-async def process_slot(callback: types.CallbackQuery, booking_service: BookingService):
-    parts = callback.data.split("|")
-    event = parts[1]
-    time_str = parts[2]
-    action = parts[3] if len(parts) > 3 else "book"
+@on_callback(Action.SLOT)
+async def process_slot(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event, time_str, action = cb.event, cb.time, cb.mode
     
     if event == "салон предчувствий":
-        records = await booking_service.repo.get_records(event)
-        at_time = [r for r in records if r.time == time_str]
-        busy_ids = [r.master_id for r in at_time]
-        
-        # Получаем список доступных мастеров
-        available = [m for m in MASTERS_CONFIG[event] if m["id"] not in busy_ids]
-        
-        if not available:
+        user_id = str(callback.from_user.id)
+        # Удерживаем место, пока пользователь выбирает специалиста
+        held = await booking_service.hold_slot(user_id, event, time_str)
+        if not held["ok"]:
+            if action == "book" and held["text"] in FULL_SLOT_ERRORS:
+                return await callback.message.edit_text(
+                    f"Все специалисты заняты на {time_str} 😔{build_nearest_text(held.get('nearest'))}\nМожно встать в лист ожидания — запишем автоматически, если место освободится.",
+                    reply_markup=build_waitlist_keyboard(event, time_str)
+                )
             return await callback.answer("Все специалисты заняты на это время.", show_alert=True)
+
+        available = await booking_service.get_available_masters(event, time_str, user_id)
             
         kb = InlineKeyboardMarkup(inline_keyboard=[
-            # Передаем индекс i вместо длинного ID
-            [InlineKeyboardButton(text=m["name"], callback_data=f"master|{event}|{time_str}|{i}|{action}")]
-            for i, m in enumerate(available)
-        ] + [[InlineKeyboardButton(text="← Назад", callback_data="back_to_services")]])
+            [InlineKeyboardButton(text=m["name"], callback_data=codec.encode(Action.MASTER, event, time_str, m["id"], mode=action))]
+            for m in available
+        ] + [[InlineKeyboardButton(text="← Назад", callback_data=codec.encode(Action.BACK_TO_SERVICES))]])
         
         return await callback.message.edit_text(f"🔮 **Выберите специалиста на {time_str}:**", reply_markup=kb)
 
@@ -286,21 +334,21 @@ async def process_slot(callback: types.CallbackQuery, booking_service: BookingSe
         time_str=time_str,
         is_reschedule=(action == "reschedule")
     )
-    await handle_booking_result(callback, res, event, time_str, None, action)
+    await handle_booking_result(callback, booking_service, res, event, time_str, None, action)
     
-@router.callback_query(F.data == "back_to_services")
-async def process_back_to_services(callback: types.CallbackQuery, booking_service: BookingService):
+@on_callback(Action.BACK_TO_SERVICES)
+async def process_back_to_services(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
     user_id = str(callback.from_user.id)
     kb = await build_services_keyboard(user_id, booking_service)
     await callback.message.edit_text("✨ **Выберите услугу:**", reply_markup=kb, parse_mode="Markdown")
 
-@router.callback_query(F.data.startswith("no_slots|"))
-async def process_no_slots(callback: types.CallbackQuery):
+@on_callback(Action.NO_SLOTS)
+async def process_no_slots(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
     await callback.answer("К сожалению, все места заняты 😔 Попробуйте позже!", show_alert=True)
     
-@router.callback_query(F.data.startswith("my_booking_detail|"))
-async def process_my_booking_detail(callback: types.CallbackQuery, booking_service: BookingService):
-    event = callback.data.split("|")[1]
+@on_callback(Action.BOOKING_DETAIL)
+async def process_my_booking_detail(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event = cb.event
     user_id = str(callback.from_user.id)
     bookings = await booking_service.get_user_bookings(user_id)
     booking = next((b for b in bookings if b.event == event), None)
@@ -323,16 +371,16 @@ async def process_my_booking_detail(callback: types.CallbackQuery, booking_servi
         text += f"👤 **Специалист:** {booking.master_id}\n"
         
     kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔄 Перенести время", callback_data=f"request_reschedule|{event}")],
-        [InlineKeyboardButton(text="❌ Отменить запись", callback_data=f"cancel_booking|{event}")],
-        [InlineKeyboardButton(text="← Назад к услугам", callback_data="back_to_services")]
+        [InlineKeyboardButton(text="🔄 Перенести время", callback_data=codec.encode(Action.REQUEST_RESCHEDULE, event))],
+        [InlineKeyboardButton(text="❌ Отменить запись", callback_data=codec.encode(Action.CANCEL_BOOKING, event))],
+        [InlineKeyboardButton(text="← Назад к услугам", callback_data=codec.encode(Action.BACK_TO_SERVICES))]
     ])
     await callback.message.edit_text(text, reply_markup=kb, parse_mode="Markdown")
 
 
-@router.callback_query(F.data.startswith("cancel_booking|"))
-async def process_cancel_booking_inline(callback: types.CallbackQuery, booking_service: BookingService):
-    event = callback.data.split("|")[1]
+@on_callback(Action.CANCEL_BOOKING)
+async def process_cancel_booking_inline(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event = cb.event
     user_id = str(callback.from_user.id)
     
     # Отменяем запись
@@ -340,11 +388,16 @@ async def process_cancel_booking_inline(callback: types.CallbackQuery, booking_s
     
     # Возвращаем главное меню с обновленными статусами
     kb = await build_services_keyboard(user_id, booking_service)
-    await callback.message.edit_text(f"{res}\n\n✨ **Выберите услугу:**", reply_markup=kb, parse_mode="Markdown")    
-    
-@router.callback_query(F.data.startswith("request_reschedule|"))
-async def process_request_reschedule(callback: types.CallbackQuery, booking_service: BookingService):
-    event = callback.data.split("|")[1]
+    await callback.message.edit_text(f"{res}\n\n✨ **Выберите услугу:**", reply_markup=kb, parse_mode="Markdown")
+
+@on_callback(Action.CANCEL_ALL)
+async def process_cancel_all_inline(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    res = await booking_service.cancel_all(str(callback.from_user.id))
+    await callback.message.edit_text(res, parse_mode="Markdown")
+
+@on_callback(Action.REQUEST_RESCHEDULE)
+async def process_request_reschedule(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event = cb.event
     
     # Получаем свободные слоты
     suggested = await booking_service.get_suggested_slots(event)
@@ -363,13 +416,9 @@ async def process_request_reschedule(callback: types.CallbackQuery, booking_serv
         parse_mode="Markdown"
     )
     
-@router.callback_query(F.data.startswith("master|"))
-async def process_master_selection(callback: types.CallbackQuery, booking_service: BookingService):
-    _, event, time_str, master_idx, action = callback.data.split("|")
-    
-    # Получаем мастера из конфига по индексу
-    master = MASTERS_CONFIG[event][int(master_idx)]
-    master_id = master["id"]
+@on_callback(Action.MASTER)
+async def process_master_selection(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event, time_str, master_id, action = cb.event, cb.time, cb.master_id, cb.mode
     
     res = await booking_service.execute_booking(
         user_id=str(callback.from_user.id),
@@ -380,12 +429,11 @@ async def process_master_selection(callback: types.CallbackQuery, booking_servic
         is_reschedule=(action == "reschedule"),
         master_id=master_id
     )
-    await handle_booking_result(callback, res, event, time_str, master_id, action)
+    await handle_booking_result(callback, booking_service, res, event, time_str, master_id, action)
     
-@router.callback_query(F.data.startswith("c_ov|"))
-async def process_confirm_overlap(callback: types.CallbackQuery, booking_service: BookingService):
-    # Данные: confirm_overlap|event|time|master_id|action
-    _, event, time_str, master_id, action = callback.data.split("|")
+@on_callback(Action.CONFIRM_OVERLAP)
+async def process_confirm_overlap(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event, time_str, master_id, action = cb.event, cb.time, cb.master_id, cb.mode
     
     # Вызываем запись с force=True
     res = await booking_service.execute_booking(
@@ -395,14 +443,14 @@ async def process_confirm_overlap(callback: types.CallbackQuery, booking_service
         event=event,
         time_str=time_str,
         is_reschedule=(action == "reschedule"),
-        master_id=master_id if master_id != "None" else None,
+        master_id=master_id,
         force=True
     )
     await callback.message.edit_text(res["text"], parse_mode="Markdown")
     
-@router.callback_query(F.data.startswith("hour|"))
-async def process_hour_selection(callback: types.CallbackQuery, booking_service: BookingService):
-    _, event, hour, action = callback.data.split("|")
+@on_callback(Action.HOUR)
+async def process_hour_selection(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event, hour, action = cb.event, cb.time, cb.mode
     
     # Получаем все доступные слоты заново
     slots = await booking_service.get_suggested_slots(event, top_n=100)
@@ -420,9 +468,9 @@ async def process_hour_selection(callback: types.CallbackQuery, booking_service:
     )
 
 # 2. Обработка кнопки "Назад"
-@router.callback_query(F.data.startswith("back_to_hours|"))
-async def process_back_to_hours(callback: types.CallbackQuery, booking_service: BookingService):
-    _, event, action = callback.data.split("|")
+@on_callback(Action.BACK_TO_HOURS)
+async def process_back_to_hours(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    event, action = cb.event, cb.mode
     
     slots = await booking_service.get_suggested_slots(event, top_n=100)
     kb = build_slot_keyboard(event, slots, action)
@@ -431,4 +479,47 @@ async def process_back_to_hours(callback: types.CallbackQuery, booking_service:
         f"🕐 Выберите час для услуги **{event}**:", 
         reply_markup=kb, 
         parse_mode="Markdown"
-    )
\ No newline at end of file
+    )
+
+@on_callback(Action.JOIN_WAITLIST)
+async def process_join_waitlist(callback: types.CallbackQuery, cb: Callback, booking_service: BookingService):
+    res = await booking_service.join_waitlist(
+        user_id=str(callback.from_user.id),
+        username=callback.from_user.username or "",
+        full_name=callback.from_user.full_name,
+        event=cb.event,
+        time_str=cb.time,
+        master_id=cb.master_id
+    )
+    if res.get("status") == "free":
+        # Пока пользователь думал, место освободилось — записываем сразу
+        res = await booking_service.execute_booking(
+            user_id=str(callback.from_user.id),
+            username=callback.from_user.username or "",
+            full_name=callback.from_user.full_name,
+            event=cb.event,
+            time_str=cb.time,
+            master_id=cb.master_id
+        )
+        return await handle_booking_result(callback, booking_service, res, cb.event, cb.time, cb.master_id, "book")
+    await callback.message.edit_text(res["text"], parse_mode="Markdown")
+
+@router.callback_query()
+async def dispatch_callback(callback: types.CallbackQuery, booking_service: BookingService):
+    """Единая точка входа для inline-кнопок: один decode и поиск по таблице."""
+    cb = codec.decode(callback.data)
+    if cb is None:
+        # Кнопки из старых сообщений (до смены формата callback_data)
+        return await callback.answer("Это меню устарело — откройте список услуг заново 🙏", show_alert=True)
+    await CALLBACK_HANDLERS[cb.action](callback, cb, booking_service)
+
+@router.errors(ExceptionTypeFilter(RepositoryError))
+async def handle_repository_error(event: types.ErrorEvent):
+    """Таблица недоступна даже после повторов — отвечаем пользователю, а не молчим."""
+    logging.warning(f"Хранилище недоступно: {event.exception}")
+    text = "Сервис записи сейчас перегружен 🙏 Попробуйте ещё раз через минуту."
+    update = event.update
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    elif update.message:
+        await update.message.answer(text)
@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from core.config import EVENTS_CONFIG, EVENT_ICONS, EVENT_FORMS
 from services.booking_service import BookingService
+from presentation.callbacks import Action, codec
 from collections import defaultdict
 
 def group_slots_by_hour(slots):
@@ -26,13 +27,13 @@ async def build_services_keyboard(user_id: str, booking_service: BookingService)
         title = EVENT_FORMS.get(ev, {}).get("title", ev.capitalize())
         
         if ev in booked_events:
-            buttons.append([InlineKeyboardButton(text=f"✅ {title} — вы записаны", callback_data=f"my_booking_detail|{ev}")])
+            buttons.append([InlineKeyboardButton(text=f"✅ {title} — вы записаны", callback_data=codec.encode(Action.BOOKING_DETAIL, ev))])
         else:
-            suggested = await booking_service.get_suggested_slots(ev, top_n=1)
+            suggested = await booking_service.get_suggested_slots(ev, top_n=1, user_id=user_id)
             if suggested:
-                buttons.append([InlineKeyboardButton(text=f"{icon} {title}", callback_data=f"start_book|{ev}")])
+                buttons.append([InlineKeyboardButton(text=f"{icon} {title}", callback_data=codec.encode(Action.START_BOOK, ev))])
             else:
-                buttons.append([InlineKeyboardButton(text=f"⛔ {title} — мест нет", callback_data=f"no_slots|{ev}")])
+                buttons.append([InlineKeyboardButton(text=f"⛔ {title} — мест нет", callback_data=codec.encode(Action.NO_SLOTS, ev))])
                 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -50,19 +51,19 @@ def build_slot_keyboard(event, slots, action="book", selected_hour=None):
         row = []
         for s in hour_slots:
             time_str = s[0] if isinstance(s, (tuple, list)) else s
-            row.append(InlineKeyboardButton(text=time_str, callback_data=f"slot|{event}|{time_str}|{action}"))
+            row.append(InlineKeyboardButton(text=time_str, callback_data=codec.encode(Action.SLOT, event, time_str, mode=action)))
             if len(row) == 2:
                 kb.append(row)
                 row = []
         if row: kb.append(row)
         
-        kb.append([InlineKeyboardButton(text="⬅️ Назад к часам", callback_data=f"back_to_hours|{event}|{action}")])
+        kb.append([InlineKeyboardButton(text="⬅️ Назад к часам", callback_data=codec.encode(Action.BACK_TO_HOURS, event, mode=action))])
         
     # НОВАЯ ЛОГИКА: Если часов больше одного - показываем часы
     elif len(grouped) > 1:
         row = []
         for hour in grouped.keys():
-            row.append(InlineKeyboardButton(text=hour, callback_data=f"hour|{event}|{hour}|{action}"))
+            row.append(InlineKeyboardButton(text=hour, callback_data=codec.encode(Action.HOUR, event, hour, mode=action)))
             if len(row) == 2:
                 kb.append(row)
                 row = []
@@ -73,7 +74,7 @@ def build_slot_keyboard(event, slots, action="book", selected_hour=None):
         row = []
         for s in slots:
             time_str = s[0] if isinstance(s, (tuple, list)) else s
-            row.append(InlineKeyboardButton(text=time_str, callback_data=f"slot|{event}|{time_str}|{action}"))
+            row.append(InlineKeyboardButton(text=time_str, callback_data=codec.encode(Action.SLOT, event, time_str, mode=action)))
             if len(row) == 2:
                 kb.append(row)
                 row = []
@@ -81,15 +82,30 @@ def build_slot_keyboard(event, slots, action="book", selected_hour=None):
 
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+def build_availability_keyboard(time_str: str, available):
+    """Кнопка на каждую услугу, свободную в time_str, — сразу к записи на это время."""
+    kb = [
+        [InlineKeyboardButton(text=f"{EVENT_ICONS.get(ev, '✨')} {EVENT_FORMS.get(ev, {}).get('title', ev.capitalize())}",
+                              callback_data=codec.encode(Action.SLOT, ev, time_str, mode="book"))]
+        for ev, _ in available
+    ]
+    kb.append([InlineKeyboardButton(text="← Все услуги", callback_data=codec.encode(Action.BACK_TO_SERVICES))])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
 def build_masters_keyboard(event: str, time_str: str, masters: list, action: str = "book"):
     kb = []
     for m in masters:
-        # callback_data: master|event|time|master_id|action
-        data = f"master|{event}|{time_str}|{m['id']}|{action}"
+        data = codec.encode(Action.MASTER, event, time_str, m["id"], mode=action)
         kb.append([InlineKeyboardButton(text=m['name'], callback_data=data)])
-    kb.append([InlineKeyboardButton(text="← Назад", callback_data="back_to_services")])
+    kb.append([InlineKeyboardButton(text="← Назад", callback_data=codec.encode(Action.BACK_TO_SERVICES))])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+def build_waitlist_keyboard(event: str, time_str: str, master_id: str = None):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📝 Встать в лист ожидания", callback_data=codec.encode(Action.JOIN_WAITLIST, event, time_str, master_id))],
+        [InlineKeyboardButton(text="← Назад к услугам", callback_data=codec.encode(Action.BACK_TO_SERVICES))]
+    ])
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 def get_main_menu_keyboard():
@@ -1,14 +1,51 @@
 import asyncio
-import random
-from datetime import datetime, timedelta
-from typing import List, Tuple, Optional, Dict
+import logging
+from dataclasses import replace
+from itertools import islice
+from typing import Awaitable, Callable, Iterable, List, NamedTuple, Tuple, Optional, Dict, Set
 from core.interfaces import IBookingRepository
 from core.models import BookingRecord
-from core.config import EVENTS_CONFIG, MASTERS_CONFIG
+from core.snapshot import RowDiff
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG, MASTER_ASSIGNMENT
+from core.masters import MASTER_MASKS
+from core.slots import slot_grid, to_minutes
+from services.master_assignment import AssignmentStrategy, get_strategy
+from services.occupancy import OccupancyIndex
+from services.reminder_service import ReminderService
+from services.slot_holds import SlotHolds
+from services.waitlist import Waiter, Waitlist
+
+Notifier = Callable[[BookingRecord], Awaitable[None]]
+
+# Предел шагов перебора plan_program: при полной занятости кандидатов мало,
+# а в пустом дне решение находится жадно с первой попытки
+PLAN_SEARCH_LIMIT = 20_000
+
+# Сколько ближайших свободных слотов предлагать, когда выбранный занят
+NEAREST_FREE = 3
+
+
+class PlanOption(NamedTuple):
+    start: int
+    end: int
+    event: str
+    time: str
+    master_id: str
 
 class BookingService:
-    def __init__(self, repo: IBookingRepository):
+    def __init__(self, repo: IBookingRepository, reminders: Optional[ReminderService] = None,
+                 holds: Optional[SlotHolds] = None, waitlist: Optional[Waitlist] = None,
+                 notifier: Optional[Notifier] = None, assignment: Optional[AssignmentStrategy] = None):
         self.repo = repo
+        self.reminders = reminders
+        self.holds = holds or SlotHolds()
+        self.waitlist = waitlist or Waitlist()
+        # Уведомление пользователя, которого записали из листа ожидания
+        self.notifier = notifier
+        self.assignment = assignment or get_strategy(MASTER_ASSIGNMENT)
+        self._index: Optional[OccupancyIndex] = None
+        self._notifications: Set[asyncio.Task] = set()
+        self._notifying: Set[Tuple[str, str]] = set()
         self._user_locks: Dict[str, asyncio.Lock] = {}
         self.global_lock = asyncio.Lock() # Глобальная блокировка
 
@@ -18,59 +55,142 @@ class BookingService:
         return self._user_locks[user_id]
 
     def get_slot_list(self, event: str) -> List[str]:
-        cfg = EVENTS_CONFIG[event]
-        if "fixed_time" in cfg: return [cfg["fixed_time"]]
-        if "custom_slots" in cfg: return list(cfg["custom_slots"])
-        
-        start_dt = datetime.strptime(cfg["start"], "%H:%M")
-        end_dt = datetime.strptime(cfg["end"], "%H:%M")
-        delta = timedelta(minutes=cfg["duration"])
-        
-        slots, cur = [], start_dt
-        while cur < end_dt:
-            slots.append(cur.strftime("%H:%M"))
-            cur += delta
-        return slots
-
-    async def get_user_bookings(self, user_id: str) -> List[BookingRecord]:
-        bookings = []
-        for ev in EVENTS_CONFIG:
-            records = await self.repo.get_records(ev)
-            bookings.extend([r for r in records if r.user_id == user_id])
-        return bookings
-
-    async def get_suggested_slots(self, event: str, top_n: int = 100) -> List[Tuple[str, int]]:
-        records = await self.repo.get_records(event)
+        return list(slot_grid(event))
+
+    def _slots(self, event: str) -> Tuple[str, ...]:
+        return slot_grid(event)
+
+    async def _occupancy(self) -> OccupancyIndex:
+        """Индекс занятости; строится из кэша репозитория при первом обращении."""
+        if self._index is None:
+            records = []
+            for ev in EVENTS_CONFIG:
+                records.extend(await self.repo.get_records(ev))
+            # Пока читали, индекс мог построить пишущий под global_lock — он главнее
+            if self._index is None:
+                self._index = OccupancyIndex.build(records)
+        return self._index
+
+    async def sync(self) -> Optional[Dict[str, RowDiff]]:
+        """Синхронизация репозитория, обновление индекса и продвижение листа ожидания.
+
+        Если репозиторий сообщает разницу строк, она применяется к индексу и
+        напоминаниям на месте; иначе индекс пересобирается целиком. Возвращает
+        эту разницу (None — неизвестна, напоминания нужно пересобрать вызывающему).
+        """
+        await self.repo.sync()
+        changes = self.repo.sync_changes()
+        async with self.global_lock:
+            if changes is None or self._index is None:
+                self._index = None
+                index = await self._occupancy()
+            else:
+                index = self._index
+                for diff in changes.values():
+                    self._apply(index, diff)
+            # Уведомления, не дошедшие в прошлый раз (сбой отправки, рестарт)
+            promoted = self._unsent_notices(index)
+            # В таблице могли освободить места вручную
+            for event, time_str in self.waitlist.slots():
+                promoted.extend(await self._promote(index, event, time_str))
+        self._notify(promoted)
+        return changes
+
+    def _apply(self, index: OccupancyIndex, diff: RowDiff) -> None:
+        """Правки таблицы вручную: убранные строки, затем новые (изменённая строка — в обоих)."""
+        for record in diff.removed:
+            current = index.booking(record.user_id, record.event)
+            if current != record:  # бот успел отменить или перенести её до применения
+                continue
+            index.remove(current)
+            if self.reminders:
+                self.reminders.cancel(record.user_id, record.event)
+        for record in diff.added:
+            index.add(record)
+            if self.reminders:
+                self.reminders.schedule(record.user_id, record.event, record.time)
+
+    async def get_user_bookings(self, user_id: str) -> Tuple[BookingRecord, ...]:
+        """Неизменяемый кортеж записей: читать можно без блокировки и без копии."""
+        return (await self._occupancy()).user_bookings(user_id)
+
+    def _free_mask(self, index: OccupancyIndex, event: str, time_str: str,
+                   user_id: Optional[str] = None) -> Tuple[int, int]:
+        """Маска мастеров без перерыва, записи и чужого поимённого удержания + число удержаний без мастера."""
+        held_ids, anonymous = self.holds.split(event, time_str, user_id)
+        masks = MASTER_MASKS[event]
+        return masks.free(time_str, index.busy_mask(event, time_str) | masks.mask(held_ids)), anonymous
+
+    def _free_masters(self, index: OccupancyIndex, event: str, time_str: str,
+                      user_id: Optional[str] = None) -> Tuple[List[dict], int]:
+        free, anonymous = self._free_mask(index, event, time_str, user_id)
+        return MASTER_MASKS[event].members(free), anonymous
+
+    def _assign(self, index: OccupancyIndex, event: str, time_str: str, free: List[dict]) -> dict:
+        return self.assignment.choose(index, event, time_str, free, self._slots(event))
+
+    def _free_places(self, index: OccupancyIndex, event: str, time_str: str,
+                     user_id: Optional[str] = None) -> int:
+        """Свободные места с учётом записей и чужих удержаний."""
+        if event in MASTERS_CONFIG:
+            free, anonymous = self._free_mask(index, event, time_str, user_id)
+            return free.bit_count() - anonymous
+        taken = index.count(event, time_str) + len(self.holds.active(event, time_str, user_id))
+        return EVENTS_CONFIG[event]["capacity"] - taken
+
+    async def get_suggested_slots(self, event: str, top_n: int = 100,
+                                  user_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        index = await self._occupancy()
         slots = []
         for s in self.get_slot_list(event):
-            at_slot = [r for r in records if r.time == s]
-            if event in MASTERS_CONFIG:
-                busy_ids = [r.master_id for r in at_slot]
-                avail = sum(1 for m in MASTERS_CONFIG[event] if s not in m.get("breaks", []) and m["id"] not in busy_ids)
-            else:
-                avail = EVENTS_CONFIG[event]["capacity"] - len(at_slot)
-            
+            avail = self._free_places(index, event, s, user_id)
             if avail > 0:
                 slots.append((s, avail))
         return sorted(slots, key=lambda x: x[0])[:top_n]
 
-    def get_available_masters(self, event: str, time_str: str) -> List[dict]:
-        """Возвращает список свободных мастеров на конкретное время."""
+    def _nearest_free(self, index: OccupancyIndex, event: str, time_str: str,
+                      user_id: Optional[str] = None, k: int = NEAREST_FREE) -> List[str]:
+        """k ближайших к time_str слотов с местом; удержания проверяются только у кандидатов."""
+        candidates = (s for s in index.nearest_free(event, time_str)
+                      if s != time_str and self._free_places(index, event, s, user_id) > 0)
+        return list(islice(candidates, k))
+
+    async def availability_at(self, time_str: str, user_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Куда можно записаться на time_str: (услуга, свободных мест) в порядке конфига.
+
+        Ответ из обратного индекса занятости — O(услуг), без обхода слотов.
+        Для user_id отбрасываются услуги, на которые он уже записан, и те,
+        что пересекаются по времени с его записями.
+        """
+        index = await self._occupancy()
+        start = to_minutes(time_str)
+        mine = index.user_bookings(user_id) if user_id else ()
+        taken = [(to_minutes(b.time), to_minutes(b.time) + EVENTS_CONFIG[b.event]["duration"]) for b in mine]
+        booked = {b.event for b in mine}
+        result = []
+        for event, places in index.free_at(time_str).items():
+            end = start + EVENTS_CONFIG[event]["duration"]
+            if event in booked or any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            if self.holds.active(event, time_str, user_id):
+                places = self._free_places(index, event, time_str, user_id)
+            if places > 0:
+                result.append((event, places))
+        return result
+
+    async def occupancy(self, event: str) -> Dict[str, int]:
+        """Записей на каждый слот сетки (для аналитики); подсчёт — на стороне репозитория.
+
+        Только отчёт: доступность слотов везде считается по OccupancyIndex.
+        """
+        counts = await self.repo.slot_counts(event)
+        return {s: counts.get(s, 0) for s in slot_grid(event)}
+
+    async def get_available_masters(self, event: str, time_str: str, user_id: Optional[str] = None) -> List[dict]:
+        """Возвращает список свободных мастеров на конкретное время (с учётом чужих удержаний)."""
         if event not in MASTERS_CONFIG:
             return []
-        
-        # Получаем записи на это время
-        records = self.repo.get_records(event) # Предполагаем, что метод синхронный или await
-        # Если get_records асинхронный, нужно сделать await
-        
-        # Для простоты, если get_records возвращает список:
-        at_time = [r for r in records if r.time == time_str]
-        busy_ids = [r.master_id for r in at_time]
-        
-        available = [
-            m for m in MASTERS_CONFIG[event] 
-            if time_str not in m.get("breaks", []) and m["id"] not in busy_ids
-        ]
+        available, _ = self._free_masters(await self._occupancy(), event, time_str, user_id)
         return available
 
     async def execute_booking(self, user_id: str, username: str, full_name: str, event: str, time_str: str, 
@@ -82,74 +202,347 @@ class BookingService:
         
         async with self.global_lock:
             async with self._get_user_lock(user_id):
+                index = await self._occupancy()
             
                 # 2. НОВАЯ ПРОВЕРКА: Проверка на пересечение времени с другими активностями
                 # Проверка на пересечение (только если не принудительное подтверждение)
+                # Если это перенос, старую запись на ту же услугу игнорируем
                 if not force:
-                    all_user_bookings = await self.get_user_bookings(user_id)
-                    for b in all_user_bookings:
-                        if b.time == time_str:
-                            # Если это перенос, игнорируем старую запись
-                            if is_reschedule and b.event == event:
-                                continue
-                            # Возвращаем статус конфликта
-                            return {
-                            "ok": False, 
-                            "status": "conflict", 
-                            "conflict_event": b.event,
-                            "text": f"Конфликт времени с {b.event}" 
-                            }
-            
-                records = await self.repo.get_records(event)
-            
-                if is_reschedule:
-                    await self.repo.delete_record(event, user_id)
-                elif any(r.user_id == user_id for r in records):
+                    b = index.user_at(user_id, time_str, exclude_event=event if is_reschedule else None)
+                    if b is not None:
+                        # Возвращаем статус конфликта
+                        return {
+                        "ok": False, 
+                        "status": "conflict", 
+                        "conflict_event": b.event,
+                        "text": f"Конфликт времени с {b.event}" 
+                        }
+
+                old = index.booking(user_id, event)
+                if old is not None and not is_reschedule:
                     return {"ok": False, "text": "Вы уже записаны на эту услугу."}
+                # При переносе собственное место не мешает новому слоту
+                if old is not None:
+                    index.remove(old)
 
             # Логика выбора мастера
                 final_master_id = "Записано"
-            
+                error = None
                 if event in MASTERS_CONFIG:
-                    at_time = [r for r in records if r.time == time_str]
-                    busy_ids = [r.master_id for r in at_time]
-                    available_masters = [
-                        m for m in MASTERS_CONFIG[event] 
-                        if time_str not in m.get("breaks", []) and m["id"] not in busy_ids
-                    ]
+                    # Чужие удержания занимают мастеров наравне с записями
+                    available_masters, anonymous_holds = self._free_masters(index, event, time_str, user_id)
                 
-                    if not available_masters:
-                        return {"ok": False, "text": "Все мастера заняты на это время."}
+                    if len(available_masters) <= anonymous_holds:
+                        error = "Все мастера заняты на это время."
 
                     # Если передан конкретный мастер (для гадалок)
-                    if master_id:
+                    elif master_id:
                         selected_master = next((m for m in available_masters if m["id"] == master_id), None)
                         if not selected_master:
-                            return {"ok": False, "text": "Этот специалист уже занят."}
-                        final_master_id = selected_master["id"]
+                            error = "Этот специалист уже занят."
+                        else:
+                            final_master_id = selected_master["id"]
                     else:
-                        # Случайный выбор для остальных
-                        final_master_id = random.choice(available_masters)["id"]
+                        # Для остальных — по стратегии распределения нагрузки
+                        final_master_id = self._assign(index, event, time_str, available_masters)["id"]
 
-                elif event in EVENTS_CONFIG and len([r for r in records if r.time == time_str]) >= EVENTS_CONFIG[event]["capacity"]:
-                    return {"ok": False, "text": "Мест нет."}
+                elif self._free_places(index, event, time_str, user_id) <= 0:
+                    error = "Мест нет."
+
+                if error:
+                    if old is not None:
+                        index.add(old)
+                    return {"ok": False, "text": error, "nearest": self._nearest_free(index, event, time_str, user_id)}
+
+                promoted = []
+                if old is not None:
+                    # Перенос — одна правка строки в хранилище, а не удаление и добавление
+                    record = replace(old, time=time_str, master_id=final_master_id)
+                    try:
+                        await self.repo.move_record(event, user_id, time_str, final_master_id)
+                    except Exception:
+                        index.add(old)
+                        raise
+                    index.add(record)
+                    self.holds.release(user_id, event)
+                    if self.reminders:
+                        self.reminders.cancel(user_id, event)
+                        self.reminders.schedule(user_id, event, time_str)
+                else:
+                    record = BookingRecord(user_id, username, full_name, event, time_str, final_master_id)
+                    await self._commit(index, record)
+                self.waitlist.remove(user_id, event)
+                if old is not None and old.time != time_str:
+                    promoted = await self._promote(index, event, old.time)
+        self._notify(promoted)
+        return {"ok": True, "text": f"✅ Записано! {'Специалист: ' + final_master_id if final_master_id != 'Записано' else ''}"}
+
+    async def _commit(self, index: OccupancyIndex, record: BookingRecord) -> None:
+        """Запись в репозиторий и все производные структуры (вызывается под global_lock)."""
+        await self.repo.add_record(record)
+        index.add(record)
+        self.holds.release(record.user_id, record.event)
+        if self.reminders:
+            self.reminders.schedule(record.user_id, record.event, record.time)
+
+    async def _remove(self, index: OccupancyIndex, record: BookingRecord) -> None:
+        await self.repo.delete_record(record.event, record.user_id)
+        index.remove(record)
+        if self.reminders:
+            self.reminders.cancel(record.user_id, record.event)
+
+    async def _promote(self, index: OccupancyIndex, event: str, time_str: str) -> List[BookingRecord]:
+        """Записывает ожидающих слота по очереди, пока есть места (под global_lock)."""
+        promoted = []
+        for waiter in self.waitlist.waiting(event, time_str):
+            if index.booking(waiter.user_id, event) is not None:
+                # Уже записан на услугу другим путём
+                self.waitlist.remove(waiter.user_id, event)
+                continue
+            if self._free_places(index, event, time_str, waiter.user_id) <= 0:
+                break
+            if index.user_at(waiter.user_id, time_str) is not None:
+                continue  # Конфликт по времени — остаётся в очереди
+            master = "Записано"
+            if event in MASTERS_CONFIG:
+                free, _ = self._free_masters(index, event, time_str, waiter.user_id)
+                if waiter.master_id:
+                    if all(m["id"] != waiter.master_id for m in free):
+                        continue  # Ждёт конкретного специалиста
+                    master = waiter.master_id
+                else:
+                    master = self._assign(index, event, time_str, free)["id"]
+            record = BookingRecord(waiter.user_id, waiter.username, waiter.full_name, event, time_str, master)
+            await self._commit(index, record)
+            self.waitlist.remove(waiter.user_id, event)
+            self.waitlist.promoted += 1
+            promoted.append(record)
+        if promoted and self.notifier and self.reminders:
+            # В той же критической секции, что и запись: уведомление не теряется,
+            # даже если отправка ниже упадёт или процесс остановится раньше
+            self.reminders.remember_promoted(promoted)
+        return promoted
+
+    async def plan_program(self, user_id: str, events: Optional[Iterable[str]] = None,
+                           preferences: Optional[dict] = None, username: str = "", full_name: str = "") -> dict:
+        """Составляет программу из нескольких услуг без пересечений и записывает её одним пакетом.
+
+        preferences: "after"/"before" — окно дня (HH:MM), "gap" — минут между услугами,
+        "masters" — {услуга: id мастера}. Уже существующие записи пользователя остаются
+        на месте и учитываются как занятое время. Если все услуги не помещаются,
+        записываются те, что помещаются (максимум по числу), остальные — в "unplaced".
+        """
+        events = list(EVENTS_CONFIG if events is None else events)
+        async with self.global_lock:
+            index = await self._occupancy()
+            already = [ev for ev in events if index.booking(user_id, ev) is not None]
+            plan = self._plan(index, user_id, [ev for ev in events if ev not in already], preferences or {})
+            records = [BookingRecord(user_id, username, full_name, o.event, o.time, o.master_id) for o in plan]
+            if records:
+                await self.repo.add_records(records)
+                for record in records:
+                    index.add(record)
+                    self.holds.release(user_id, record.event)
+                    self.waitlist.remove(user_id, record.event)
+                    if self.reminders:
+                        self.reminders.schedule(user_id, record.event, record.time)
+        planned = {r.event for r in records}
+        return {
+            "ok": bool(records),
+            "bookings": sorted(records, key=lambda r: r.time),
+            "already": already,
+            "unplaced": [ev for ev in events if ev not in planned and ev not in already],
+        }
+
+    def _plan(self, index: OccupancyIndex, user_id: str, events: List[str], preferences: dict) -> List[PlanOption]:
+        """Перебор с возвратом: услуги с наименьшим числом вариантов — первыми, ранние слоты — раньше."""
+        after = to_minutes(preferences["after"]) if preferences.get("after") else 0
+        before = to_minutes(preferences["before"]) if preferences.get("before") else 24 * 60
+        gap = preferences.get("gap", 0)
+        masters = preferences.get("masters", {})
+
+        options: Dict[str, List[PlanOption]] = {}
+        for ev in events:
+            duration = EVENTS_CONFIG[ev]["duration"]
+            options[ev] = []
+            for time_str in self.get_slot_list(ev):
+                start = to_minutes(time_str)
+                if start < after or start + duration > before:
+                    continue
+                if ev in MASTERS_CONFIG:
+                    free, anonymous = self._free_masters(index, ev, time_str, user_id)
+                    if len(free) <= anonymous:
+                        continue
+                    wanted = masters.get(ev)
+                    if wanted:
+                        if all(m["id"] != wanted for m in free):
+                            continue
+                        master = wanted
+                    else:
+                        master = self._assign(index, ev, time_str, free)["id"]
+                elif self._free_places(index, ev, time_str, user_id) > 0:
+                    master = "Записано"
+                else:
+                    continue
+                options[ev].append(PlanOption(start, start + duration, ev, time_str, master))
+        order = sorted(events, key=lambda ev: len(options[ev]))
+
+        taken = [
+            (to_minutes(b.time), to_minutes(b.time) + EVENTS_CONFIG[b.event]["duration"])
+            for b in index.user_bookings(user_id)
+        ]
+        chosen: List[PlanOption] = []
+        best: List[PlanOption] = []
+        steps = 0
+
+        def fits(o: PlanOption) -> bool:
+            return all(o.start >= end + gap or start >= o.end + gap for start, end in taken)
+
+        def search(i: int) -> bool:
+            nonlocal best, steps
+            if len(chosen) > len(best):
+                best = list(chosen)
+            if i == len(order):
+                return len(chosen) == len(order)
+            # Даже разместив все оставшиеся, лучший вариант не превзойти
+            if len(chosen) + len(order) - i <= len(best) or steps >= PLAN_SEARCH_LIMIT:
+                return False
+            for o in options[order[i]]:
+                steps += 1
+                if fits(o):
+                    chosen.append(o)
+                    taken.append((o.start, o.end))
+                    if search(i + 1):
+                        return True
+                    chosen.pop()
+                    taken.pop()
+            # Услугу не удалось разместить — пробуем без неё
+            return search(i + 1)
+
+        return chosen if search(0) else best
+
+    async def hold_slot(self, user_id: str, event: str, time_str: str, master_id: Optional[str] = None) -> dict:
+        """Удерживает место на holds.ttl секунд, пока пользователь выбирает мастера или подтверждает запись."""
+        if time_str not in self.get_slot_list(event):
+            return {"ok": False, "text": "invalid_time"}
+        async with self.global_lock:
+            index = await self._occupancy()
+            # Собственная запись (перенос в тот же слот) место не занимает
+            own = index.booking(user_id, event)
+            if own is not None:
+                index.remove(own)
+            try:
+                error = self._slot_error(index, event, time_str, user_id, master_id)
+            finally:
+                if own is not None:
+                    index.add(own)
+            if error:
+                return {"ok": False, "text": error, "nearest": self._nearest_free(index, event, time_str, user_id)}
+            hold = self.holds.place(user_id, event, time_str, master_id)
+            self.repo.audit("hold", event=event, user_id=user_id, time=time_str, master_id=master_id)
+        return {"ok": True, "expires": hold.expires}
+
+    def _slot_error(self, index: OccupancyIndex, event: str, time_str: str, user_id: str,
+                    master_id: Optional[str] = None) -> Optional[str]:
+        if event in MASTERS_CONFIG:
+            free, anonymous = self._free_mask(index, event, time_str, user_id)
+            if free.bit_count() <= anonymous or (master_id and not free & MASTER_MASKS[event].bit(master_id)):
+                return "Все мастера заняты на это время."
+        elif self._free_places(index, event, time_str, user_id) <= 0:
+            return "Мест нет."
+        return None
+
+    def release_hold(self, user_id: str, event: str) -> None:
+        self.holds.release(user_id, event)
+
+    async def join_waitlist(self, user_id: str, username: str, full_name: str, event: str, time_str: str,
+                            master_id: Optional[str] = None) -> dict:
+        """Встаёт в очередь на занятый слот; при освобождении места запись произойдёт автоматически."""
+        if time_str not in self.get_slot_list(event):
+            return {"ok": False, "text": "invalid_time"}
+        async with self.global_lock:
+            index = await self._occupancy()
+            if index.booking(user_id, event) is not None:
+                return {"ok": False, "text": "Вы уже записаны на эту услугу."}
+            if not self._slot_error(index, event, time_str, user_id, master_id):
+                return {"ok": False, "status": "free", "text": "Место свободно — можно записаться сразу."}
+            position = self.waitlist.add(Waiter(user_id, username, full_name, event, time_str, master_id))
+        return {"ok": True, "position": position,
+                "text": f"📝 Вы в листе ожидания на {time_str} (место в очереди: {position}). Запишем автоматически, как только освободится место."}
+
+    def leave_waitlist(self, user_id: str, event: str) -> bool:
+        return self.waitlist.remove(user_id, event) is not None
 
-                record = BookingRecord(user_id, username, full_name, event, time_str, final_master_id)
-                await self.repo.add_record(record)
-                return {"ok": True, "text": f"✅ Записано! {'Специалист: ' + final_master_id if final_master_id != 'Записано' else ''}"}
-        
-        
     async def cancel_all(self, user_id: str) -> str:
-        bookings = await self.get_user_bookings(user_id)
-        if not bookings: return "У вас нет записей."
-        for b in bookings:
-            await self.repo.delete_record(b.event, user_id)
+        promoted = []
+        async with self.global_lock:
+            index = await self._occupancy()
+            bookings = index.user_bookings(user_id)
+            if not bookings: return "У вас нет записей."
+            # Одним пакетом по всем листам; индекс и напоминания — после успешной записи
+            await self.repo.delete_records([(b.event, user_id) for b in bookings])
+            for b in bookings:
+                index.remove(b)
+                if self.reminders:
+                    self.reminders.cancel(user_id, b.event)
+            for b in bookings:
+                promoted.extend(await self._promote(index, b.event, b.time))
+        self._notify(promoted)
         return "🗑 Все записи отменены."
     
     async def cancel_booking(self, user_id: str, event: str) -> str:
-        records = await self.repo.get_records(event)
-        if not any(r.user_id == user_id for r in records):
-            return f"У вас нет записи на {event} 😊"
-            
-        await self.repo.delete_record(event, user_id)
-        return f"🗑 Запись на {event} отменена."
\ No newline at end of file
+        async with self.global_lock:
+            index = await self._occupancy()
+            record = index.booking(user_id, event)
+            if record is None:
+                return f"У вас нет записи на {event} 😊"
+
+            await self._remove(index, record)
+            promoted = await self._promote(index, event, record.time)
+        self._notify(promoted)
+        return f"🗑 Запись на {event} отменена."
+
+    def _unsent_notices(self, index: OccupancyIndex) -> List[BookingRecord]:
+        """Сохранённые уведомления, которые ещё не отправлены (под global_lock).
+
+        Если запись с тех пор отменили или перенесли, уведомлять не о чем —
+        такое уведомление удаляется.
+        """
+        if not (self.notifier and self.reminders):
+            return []
+        unsent = []
+        for record in self.reminders.pending_promoted():
+            current = index.booking(record.user_id, record.event)
+            if current is None or current.time != record.time:
+                self.reminders.promoted_sent(record)
+            elif (record.user_id, record.event) not in self._notifying:
+                unsent.append(record)
+        return unsent
+
+    def _notify(self, records: List[BookingRecord]) -> None:
+        """Уведомления о записи из листа ожидания — фоном, вне критической секции.
+
+        С ReminderService уведомление уже сохранено в _promote и удаляется только
+        после успешной отправки; неотправленные повторяются при следующем sync.
+        """
+        if not self.notifier:
+            return
+        for record in records:
+            key = (record.user_id, record.event)
+            if key in self._notifying:
+                continue
+            self._notifying.add(key)
+            task = asyncio.create_task(self._send_notification(record))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _send_notification(self, record: BookingRecord) -> None:
+        try:
+            await self.notifier(record)
+        except Exception as e:
+            logging.error(f"Не удалось уведомить о записи из листа ожидания {record}: {e}")
+        else:
+            if self.reminders:
+                self.reminders.promoted_sent(record)
+        finally:
+            self._notifying.discard((record.user_id, record.event))
@@ -0,0 +1,98 @@
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Type
+
+from core.masters import MASTER_MASKS
+from services.occupancy import OccupancyIndex
+
+
+class AssignmentStrategy(ABC):
+    """Выбор мастера среди свободных, когда пользователь не назвал конкретного.
+
+    При слотах, равных длительности услуги, вместимость соседних слотов от выбора
+    не зависит; выбор важен для тех, кто потом попросит конкретного специалиста
+    (гадалки, «к Ольге»): чем больше у каждого мастера остаётся свободных окон,
+    тем реже такой запрос упирается в «уже занят».
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def choose(self, index: OccupancyIndex, event: str, time_str: str, free: List[dict],
+               slots: Sequence[str]) -> dict: pass
+
+
+class RandomStrategy(AssignmentStrategy):
+    """Прежнее поведение BookingService."""
+
+    name = "random"
+
+    def choose(self, index, event, time_str, free, slots):
+        return random.choice(free)
+
+
+class FirstFreeStrategy(AssignmentStrategy):
+    """Прежнее поведение bot.py: первый свободный по конфигу."""
+
+    name = "first_free"
+
+    def choose(self, index, event, time_str, free, slots):
+        return free[0]
+
+
+class LeastLoadedStrategy(AssignmentStrategy):
+    """Мастер с наименьшим числом записей за день (при равенстве — по конфигу)."""
+
+    name = "least_loaded"
+
+    def choose(self, index, event, time_str, free, slots):
+        return min(free, key=lambda m: index.master_load(event, m["id"]))
+
+
+class BreakAwareStrategy(AssignmentStrategy):
+    """Мастер, у которого соседние слоты — перерыв или запись: работа идёт блоками,
+    а свободное время остальных остаётся непрерывным."""
+
+    name = "break_aware"
+
+    def choose(self, index, event, time_str, free, slots):
+        masks = MASTER_MASKS[event]
+        pos = slots.index(time_str)
+        neighbours = [slots[i] for i in (pos - 1, pos + 1) if 0 <= i < len(slots)]
+        # Маска «перерыв или запись» у соседей — по одной на слот, а не на мастера
+        taken = [masks.on_break(s) | index.busy_mask(event, s) for s in neighbours]
+
+        def blocked(m: dict) -> int:
+            bit = masks.bit(m["id"])
+            return sum(1 for mask in taken if mask & bit)
+
+        return max(free, key=lambda m: (blocked(m), -index.master_load(event, m["id"])))
+
+
+class MostFreeSlotsStrategy(AssignmentStrategy):
+    """Мастер, у которого после записи останется больше всего свободных окон за день
+    (учитывает перерывы, в отличие от least_loaded)."""
+
+    name = "most_free"
+
+    def choose(self, index, event, time_str, free, slots):
+        masks = MASTER_MASKS[event]
+        open_masks = [masks.free(s, index.busy_mask(event, s)) for s in slots]
+
+        def open_slots(m: dict) -> int:
+            bit = masks.bit(m["id"])
+            return sum(1 for mask in open_masks if mask & bit)
+
+        return max(free, key=open_slots)
+
+
+STRATEGIES: Dict[str, Type[AssignmentStrategy]] = {
+    cls.name: cls
+    for cls in (RandomStrategy, FirstFreeStrategy, LeastLoadedStrategy, BreakAwareStrategy, MostFreeSlotsStrategy)
+}
+
+
+def get_strategy(name: str) -> AssignmentStrategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия назначения мастера: {name} (есть: {', '.join(STRATEGIES)})")
+    return STRATEGIES[name]()
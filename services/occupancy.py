@@ -0,0 +1,171 @@
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from core.config import EVENTS_CONFIG
+from core.masters import MASTER_MASKS
+from core.models import BookingRecord
+from core.slots import slot_grid, slot_index, slot_minutes, slot_position, to_minutes
+
+SlotKey = Tuple[str, str]  # (event, time_str)
+
+
+def _capacity(event: str, time_str: str, busy: int = 0, count: int = 0) -> int:
+    """Свободных мест в слоте при данных маске занятых мастеров и числе записей."""
+    masks = MASTER_MASKS.get(event)
+    if masks is not None:
+        return masks.free(time_str, busy).bit_count()
+    return EVENTS_CONFIG[event]["capacity"] - count
+
+
+@lru_cache(maxsize=None)
+def _open_at() -> Dict[str, Dict[str, int]]:
+    """Время → {услуга → мест} для пустого дня; услуги в порядке конфига."""
+    open_at: Dict[str, Dict[str, int]] = {}
+    for event in EVENTS_CONFIG:
+        for time_str in slot_grid(event):
+            places = _capacity(event, time_str)
+            if places > 0:
+                open_at.setdefault(time_str, {})[event] = places
+    return open_at
+
+
+@lru_cache(maxsize=None)
+def _closed(event: str) -> int:
+    """Слоты, закрытые без всяких записей: все мастера на перерыве или нет мест."""
+    closed = 0
+    for i, time_str in enumerate(slot_grid(event)):
+        if _capacity(event, time_str) <= 0:
+            closed |= 1 << i
+    return closed
+
+
+class OccupancyIndex:
+    """Занятость слотов и записи пользователей без сканирования таблиц.
+
+    Строится из кэша репозитория после sync и дальше обновляется BookingService
+    на каждой записи/отмене. Все запросы — O(1) по словарям. Заполненные
+    слоты услуги — биты одного целого (бит i — i-й слот сетки): ближайший
+    свободный слева и справа находится битовыми операциями, без обхода сетки.
+    Обратный индекс время → {услуга → свободных мест} отвечает на «куда можно
+    в 14:00» без обхода услуг и их слотов.
+    Записи пользователя хранятся неизменяемым кортежем, который заменяется
+    целиком: user_bookings отдаёт его без копии, а удерживающий его читатель
+    не увидит чужих правок.
+    """
+
+    def __init__(self):
+        self._count: Dict[SlotKey, int] = {}
+        self._busy: Dict[SlotKey, int] = {}  # маска занятых мастеров (core/masters.py)
+        self._load: Dict[Tuple[str, str], int] = {}  # (event, master_id) → записей за день
+        self._by_user: Dict[str, Tuple[BookingRecord, ...]] = {}
+        self._full: Dict[str, int] = {}  # event → маска заполненных слотов сетки
+        self._free_at: Dict[str, Dict[str, int]] = {t: dict(evs) for t, evs in _open_at().items()}
+
+    @classmethod
+    def build(cls, records: Iterable[BookingRecord]) -> "OccupancyIndex":
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    def add(self, record: BookingRecord) -> None:
+        key = (record.event, record.time)
+        self._count[key] = self._count.get(key, 0) + 1
+        masks = MASTER_MASKS.get(record.event)
+        if masks is not None:
+            self._busy[key] = self._busy.get(key, 0) | masks.bit(record.master_id)
+            load_key = (record.event, record.master_id)
+            self._load[load_key] = self._load.get(load_key, 0) + 1
+        mine = self._by_user.get(record.user_id, ())
+        self._by_user[record.user_id] = tuple(r for r in mine if r.event != record.event) + (record,)
+        self._mark(record.event, record.time)
+
+    def remove(self, record: BookingRecord) -> None:
+        key = (record.event, record.time)
+        left = self._count.get(key, 0) - 1
+        if left > 0:
+            self._count[key] = left
+        else:
+            self._count.pop(key, None)
+        masks = MASTER_MASKS.get(record.event)
+        if masks is not None:
+            busy = self._busy.get(key, 0) & ~masks.bit(record.master_id)
+            if busy:
+                self._busy[key] = busy
+            else:
+                self._busy.pop(key, None)
+            load_key = (record.event, record.master_id)
+            if self._load.get(load_key, 0) > 1:
+                self._load[load_key] -= 1
+            else:
+                self._load.pop(load_key, None)
+        mine = self._by_user.get(record.user_id, ())
+        if any(r is record for r in mine):
+            rest = tuple(r for r in mine if r is not record)
+            if rest:
+                self._by_user[record.user_id] = rest
+            else:
+                del self._by_user[record.user_id]
+        self._mark(record.event, record.time)
+
+    def _mark(self, event: str, time_str: str) -> None:
+        """Пересчитывает бит заполненности и обратный индекс после записи или отмены."""
+        i = slot_index(event).get(time_str) if event in EVENTS_CONFIG else None
+        if i is None:  # время вне сетки (ручные правки в таблице)
+            return
+        key = (event, time_str)
+        places = _capacity(event, time_str, self._busy.get(key, 0), self._count.get(key, 0))
+        mask = self.full_mask(event)
+        self._full[event] = mask & ~(1 << i) if places > 0 else mask | 1 << i
+        # Нули не удаляем: порядок услуг в словаре остаётся порядком конфига
+        self._free_at.setdefault(time_str, {})[event] = max(places, 0)
+
+    def count(self, event: str, time_str: str) -> int:
+        return self._count.get((event, time_str), 0)
+
+    def busy_mask(self, event: str, time_str: str) -> int:
+        return self._busy.get((event, time_str), 0)
+
+    def master_load(self, event: str, master_id: str) -> int:
+        return self._load.get((event, master_id), 0)
+
+    def booking(self, user_id: str, event: str) -> Optional[BookingRecord]:
+        return next((r for r in self._by_user.get(user_id, ()) if r.event == event), None)
+
+    def user_bookings(self, user_id: str) -> Tuple[BookingRecord, ...]:
+        return self._by_user.get(user_id, ())
+
+    def user_at(self, user_id: str, time_str: str, exclude_event: Optional[str] = None) -> Optional[BookingRecord]:
+        """Запись пользователя, начинающаяся в time_str (для проверки пересечений)."""
+        for record in self._by_user.get(user_id, ()):
+            if record.time == time_str and record.event != exclude_event:
+                return record
+        return None
+
+    def free_at(self, time_str: str) -> Dict[str, int]:
+        """Услуги со слотом в time_str → свободных мест (без учёта удержаний); только для чтения."""
+        return self._free_at.get(time_str, {})
+
+    def full_mask(self, event: str) -> int:
+        return self._full.get(event, _closed(event))
+
+    def nearest_free(self, event: str, time_str: str) -> Iterator[str]:
+        """Незаполненные слоты по удалённости от time_str; при равенстве — более ранний.
+
+        Каждый следующий слот — младший бит справа или старший слева, поэтому
+        k ближайших стоят O(k) независимо от размера сетки. Удержания не учтены.
+        """
+        grid, minutes = slot_grid(event), slot_minutes(event)
+        target = to_minutes(time_str)
+        pivot = slot_position(event, target)
+        free = ((1 << len(grid)) - 1) & ~self.full_mask(event)
+        below, above = free & ((1 << pivot) - 1), free >> pivot << pivot
+        while below or above:
+            lo = below.bit_length() - 1
+            hi = (above & -above).bit_length() - 1
+            if hi >= 0 and (lo < 0 or minutes[hi] - target < target - minutes[lo]):
+                above ^= 1 << hi
+                yield grid[hi]
+            else:
+                below ^= 1 << lo
+                yield grid[lo]
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+from core.interfaces import IBookingRepository
+from core.config import EVENTS_CONFIG
+from core.models import BookingRecord
+from infrastructure.timer_wheel import TimerWheel
+
+MINUTE_FMT = "%Y-%m-%dT%H:%M"
+
+# (user_id, event, time_str)
+Reminder = Tuple[str, str, str]
+ReminderSender = Callable[[str, str, str], Awaitable[None]]
+
+
+class ReminderStore:
+    """Напоминания в SQLite: одна строка на (user_id, event), индекс по минуте срабатывания."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reminders ("
+            " user_id TEXT NOT NULL, event TEXT NOT NULL, time TEXT NOT NULL,"
+            " due TEXT NOT NULL, sent INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (user_id, event))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS reminders_due ON reminders (sent, due)")
+        # Неотправленные уведомления о записи из листа ожидания: переживают сбой отправки и рестарт
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS notices ("
+            " user_id TEXT NOT NULL, username TEXT NOT NULL, full_name TEXT NOT NULL,"
+            " event TEXT NOT NULL, time TEXT NOT NULL, master_id TEXT NOT NULL,"
+            " PRIMARY KEY (user_id, event))"
+        )
+        self._db.commit()
+
+    def upsert(self, user_id: str, event: str, time_str: str, due: str) -> None:
+        # Отметка sent сохраняется, только если время записи не поменялось
+        self._db.execute(
+            "INSERT INTO reminders (user_id, event, time, due) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, event) DO UPDATE SET "
+            " sent = CASE WHEN time = excluded.time THEN sent ELSE 0 END,"
+            " time = excluded.time, due = excluded.due",
+            (user_id, event, time_str, due),
+        )
+        self._db.commit()
+
+    def delete(self, user_id: str, event: str) -> None:
+        self._db.execute("DELETE FROM reminders WHERE user_id = ? AND event = ?", (user_id, event))
+        self._db.commit()
+
+    def replace_all(self, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Пересобирает таблицу целиком, сохраняя отметки об уже отправленных."""
+        with self._db:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS fresh (user_id TEXT, event TEXT, time TEXT, due TEXT)")
+            self._db.execute("DELETE FROM fresh")
+            self._db.executemany("INSERT INTO fresh VALUES (?, ?, ?, ?)", rows)
+            self._db.execute(
+                "DELETE FROM reminders WHERE NOT EXISTS ("
+                " SELECT 1 FROM fresh f WHERE f.user_id = reminders.user_id"
+                " AND f.event = reminders.event AND f.time = reminders.time)"
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO reminders (user_id, event, time, due) "
+                "SELECT user_id, event, time, due FROM fresh"
+            )
+
+    def take_due(self, minute: str) -> List[Reminder]:
+        """Все неотправленные напоминания с due <= minute; помечает их отправленными."""
+        with self._db:
+            rows = self._db.execute(
+                "SELECT user_id, event, time FROM reminders WHERE sent = 0 AND due <= ? ORDER BY due",
+                (minute,),
+            ).fetchall()
+            self._db.execute("UPDATE reminders SET sent = 1 WHERE sent = 0 AND due <= ?", (minute,))
+        return rows
+
+    def mark_sent(self, reminders: Iterable[Reminder]) -> None:
+        with self._db:
+            self._db.executemany(
+                "UPDATE reminders SET sent = 1 WHERE user_id = ? AND event = ? AND time = ?",
+                reminders,
+            )
+
+    def pending_rows(self) -> List[Tuple[str, str, str, str]]:
+        return self._db.execute("SELECT user_id, event, time, due FROM reminders WHERE sent = 0").fetchall()
+
+    def pending(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM reminders WHERE sent = 0").fetchone()[0]
+
+    def add_notices(self, rows: Iterable[Tuple[str, str, str, str, str, str]]) -> None:
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO notices VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_notice(self, user_id: str, event: str, time_str: str) -> None:
+        # Время в условии: уведомление о более новой записи на ту же услугу не трогаем
+        with self._db:
+            self._db.execute("DELETE FROM notices WHERE user_id = ? AND event = ? AND time = ?",
+                             (user_id, event, time_str))
+
+    def notices(self) -> List[Tuple[str, str, str, str, str, str]]:
+        return self._db.execute(
+            "SELECT user_id, username, full_name, event, time, master_id FROM notices"
+        ).fetchall()
+
+
+class ReminderService:
+    """Напоминания за lead_minutes до начала записи.
+
+    Вместо отдельной задачи планировщика на каждую запись: напоминания лежат
+    в ReminderStore, раз в минуту fire_due() забирает всю пачку наступившей
+    минуты и рассылает её с ограничением параллельности.
+
+    Если передан wheel, напоминания дублируются в TimerWheel по ключу
+    ("reminder", user_id, event), и пачки приходят из колеса — отдельная
+    минутная задача планировщика не нужна.
+    """
+
+    def __init__(self, store: ReminderStore, sender: ReminderSender,
+                 lead_minutes: int = 3, concurrency: int = 10, wheel: Optional[TimerWheel] = None):
+        self.store = store
+        self.sender = sender
+        self.lead = timedelta(minutes=lead_minutes)
+        self.wheel = wheel
+        self._wheel_keys = set()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.sent = 0
+        self.failed = 0
+
+    def _due(self, time_str: str, now: datetime) -> Optional[datetime]:
+        """Минута срабатывания; None, если запись уже началась."""
+        try:
+            start = datetime.strptime(time_str, "%H:%M").replace(year=now.year, month=now.month, day=now.day)
+        except ValueError:
+            return None
+        if start <= now:
+            return None
+        return start - self.lead
+
+    def schedule(self, user_id: str, event: str, time_str: str) -> None:
+        due = self._due(time_str, datetime.now())
+        if due is None:
+            self.cancel(user_id, event)
+            return
+        self.store.upsert(str(user_id), event, time_str, due.strftime(MINUTE_FMT))
+        self._arm((str(user_id), event, time_str), due)
+
+    def cancel(self, user_id: str, event: str) -> None:
+        self.store.delete(str(user_id), event)
+        if self.wheel is not None:
+            key = ("reminder", str(user_id), event)
+            self.wheel.cancel(key)
+            self._wheel_keys.discard(key)
+
+    def _arm(self, reminder: Reminder, due: datetime) -> None:
+        if self.wheel is not None:
+            key = ("reminder", reminder[0], reminder[1])
+            self.wheel.schedule(key, due, self._on_wheel, reminder)
+            self._wheel_keys.add(key)
+
+    def rebuild_from(self, bookings: Iterable[Reminder]) -> int:
+        """Приводит хранилище в соответствие с текущими записями (после рестарта или sync)."""
+        now = datetime.now()
+        rows = []
+        for user_id, event, time_str in bookings:
+            due = self._due(time_str, now)
+            if due is not None:
+                rows.append((str(user_id), event, time_str, due.strftime(MINUTE_FMT)))
+        self.store.replace_all(rows)
+        if self.wheel is not None:
+            pending = {}
+            for user_id, event, time_str, due in self.store.pending_rows():
+                pending[("reminder", user_id, event)] = ((user_id, event, time_str), due)
+            for key in self._wheel_keys - pending.keys():
+                self.wheel.cancel(key)
+            self._wheel_keys.clear()
+            for reminder, due in pending.values():
+                self._arm(reminder, datetime.strptime(due, MINUTE_FMT))
+        return len(rows)
+
+    async def rebuild(self, repo: IBookingRepository) -> int:
+        bookings = []
+        for ev in EVENTS_CONFIG:
+            bookings.extend((r.user_id, r.event, r.time) for r in await repo.get_records(ev))
+        return self.rebuild_from(bookings)
+
+    def remember_promoted(self, records: Iterable[BookingRecord]) -> None:
+        """Сохраняет уведомления о записи из листа ожидания до подтверждённой отправки."""
+        self.store.add_notices(
+            (r.user_id, r.username, r.full_name, r.event, r.time, r.master_id) for r in records
+        )
+
+    def promoted_sent(self, record: BookingRecord) -> None:
+        self.store.delete_notice(record.user_id, record.event, record.time)
+
+    def pending_promoted(self) -> List[BookingRecord]:
+        return [BookingRecord(*row) for row in self.store.notices()]
+
+    async def _send(self, reminder: Reminder) -> None:
+        async with self._semaphore:
+            try:
+                await self.sender(*reminder)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Не удалось отправить напоминание {reminder}: {e}")
+
+    async def _send_batch(self, batch: List[Reminder]) -> None:
+        await asyncio.gather(*(self._send(r) for r in batch))
+
+    async def _on_wheel(self, batch: List[Reminder]) -> None:
+        for reminder in batch:
+            self._wheel_keys.discard(("reminder", reminder[0], reminder[1]))
+        self.store.mark_sent(batch)
+        await self._send_batch(batch)
+
+    async def fire_due(self, now: Optional[datetime] = None) -> int:
+        """Рассылает одной пачкой все напоминания, чья минута наступила."""
+        now = now or datetime.now()
+        batch = self.store.take_due(now.strftime(MINUTE_FMT))
+        if batch:
+            await self._send_batch(batch)
+        return len(batch)
+
+    def metrics(self) -> dict:
+        return {"pending": self.store.pending(), "sent": self.sent, "failed": self.failed,
+                "notices": len(self.store.notices())}
@@ -0,0 +1,102 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from infrastructure.timer_wheel import TimerWheel
+
+SlotKey = Tuple[str, str]  # (event, time_str)
+
+
+@dataclass
+class Hold:
+    user_id: str
+    event: str
+    time: str
+    master_id: Optional[str]
+    expires: float
+
+
+class SlotHolds:
+    """Временные удержания слотов (пока пользователь выбирает мастера или подтверждает).
+
+    Удержание занимает место в слоте наравне с записью, но только ttl секунд.
+    Истечение ленивое и точное: просроченное удержание не учитывается при чтении;
+    память освобождает колесо таймеров (если передано) или то же чтение.
+    На пользователя — одно удержание на услугу.
+    """
+
+    def __init__(self, ttl: float = 120.0, wheel: Optional[TimerWheel] = None,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.wheel = wheel
+        self._clock = clock
+        self._by_slot: Dict[SlotKey, Dict[str, Hold]] = {}
+        self._by_user: Dict[Tuple[str, str], Hold] = {}
+        self.placed = 0
+        self.expired = 0
+
+    def place(self, user_id: str, event: str, time_str: str, master_id: Optional[str] = None) -> Hold:
+        self.release(user_id, event)
+        hold = Hold(user_id, event, time_str, master_id, self._clock() + self.ttl)
+        self._by_slot.setdefault((event, time_str), {})[user_id] = hold
+        self._by_user[(user_id, event)] = hold
+        if self.wheel is not None:
+            self.wheel.schedule(("hold", user_id, event), hold.expires, self._expire_batch, hold)
+        self.placed += 1
+        return hold
+
+    def release(self, user_id: str, event: str) -> Optional[Hold]:
+        hold = self._by_user.pop((user_id, event), None)
+        if hold is None:
+            return None
+        slot = self._by_slot.get((event, hold.time))
+        if slot is not None:
+            slot.pop(user_id, None)
+            if not slot:
+                del self._by_slot[(event, hold.time)]
+        if self.wheel is not None:
+            self.wheel.cancel(("hold", user_id, event))
+        return hold
+
+    def get(self, user_id: str, event: str) -> Optional[Hold]:
+        hold = self._by_user.get((user_id, event))
+        if hold is not None and hold.expires <= self._clock():
+            self._expire(hold)
+            return None
+        return hold
+
+    def _expire(self, hold: Hold) -> None:
+        if self._by_user.get((hold.user_id, hold.event)) is hold:
+            self.release(hold.user_id, hold.event)
+            self.expired += 1
+
+    def _expire_batch(self, holds: List[Hold]) -> None:
+        for hold in holds:
+            self._expire(hold)
+
+    def active(self, event: str, time_str: str, exclude_user: Optional[str] = None) -> List[Hold]:
+        """Действующие удержания слота, кроме удержания самого пользователя."""
+        slot = self._by_slot.get((event, time_str))
+        if not slot:
+            return []
+        now = self._clock()
+        result = []
+        for hold in list(slot.values()):
+            if hold.expires <= now:
+                self._expire(hold)
+            elif hold.user_id != exclude_user:
+                result.append(hold)
+        return result
+
+    def split(self, event: str, time_str: str, exclude_user: Optional[str] = None) -> Tuple[Set[str], int]:
+        """(мастера, удержанные поимённо; число удержаний без мастера)."""
+        masters, anonymous = set(), 0
+        for hold in self.active(event, time_str, exclude_user):
+            if hold.master_id:
+                masters.add(hold.master_id)
+            else:
+                anonymous += 1
+        return masters, anonymous
+
+    def metrics(self) -> dict:
+        return {"active": len(self._by_user), "placed": self.placed, "expired": self.expired}
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SlotKey = Tuple[str, str]  # (event, time_str)
+
+
+@dataclass
+class Waiter:
+    user_id: str
+    username: str
+    full_name: str
+    event: str
+    time: str
+    master_id: Optional[str] = None
+
+
+class Waitlist:
+    """Очередь ожидания на каждый (event, time): FIFO с удалением по пользователю за O(1).
+
+    Пользователь стоит не более чем в одной очереди на услугу.
+    """
+
+    def __init__(self):
+        self._queues: Dict[SlotKey, "OrderedDict[str, Waiter]"] = {}
+        self._by_user: Dict[Tuple[str, str], SlotKey] = {}
+        self.promoted = 0
+
+    def add(self, waiter: Waiter) -> int:
+        """Ставит в очередь (переставляя из другой очереди той же услуги); возвращает позицию с 1."""
+        self.remove(waiter.user_id, waiter.event)
+        key = (waiter.event, waiter.time)
+        queue = self._queues.setdefault(key, OrderedDict())
+        queue[waiter.user_id] = waiter
+        self._by_user[(waiter.user_id, waiter.event)] = key
+        return len(queue)
+
+    def remove(self, user_id: str, event: str) -> Optional[Waiter]:
+        key = self._by_user.pop((user_id, event), None)
+        if key is None:
+            return None
+        queue = self._queues[key]
+        waiter = queue.pop(user_id)
+        if not queue:
+            del self._queues[key]
+        return waiter
+
+    def waiting(self, event: str, time_str: str) -> Iterator[Waiter]:
+        """Ожидающие слота в порядке очереди (копия — можно удалять во время обхода)."""
+        queue = self._queues.get((event, time_str))
+        return iter(list(queue.values())) if queue else iter(())
+
+    def slots(self) -> List[SlotKey]:
+        """Слоты, на которые кто-то ждёт."""
+        return list(self._queues)
+
+    def position(self, user_id: str, event: str) -> Optional[int]:
+        key = self._by_user.get((user_id, event))
+        if key is None:
+            return None
+        for i, uid in enumerate(self._queues[key], 1):
+            if uid == user_id:
+                return i
+        return None
+
+    def metrics(self) -> dict:
+        return {"waiting": len(self._by_user), "slots": len(self._queues), "promoted": self.promoted}
@@ -1,9 +1,18 @@
 # tests/conftest.py
+import asyncio
 import sys
 import os
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import pytest_asyncio
+from urllib.parse import parse_qs
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import jwt
+
 
 # Добавляем корень проекта в sys.path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -13,6 +22,7 @@ os.environ["TELEGRAM_TOKEN"] = "1234567890:ABCdefGHIjklMNOpqrsTUVwxyz123456789"
 os.environ["OPENAI_API_KEY"] = "fake-key"
 os.environ["GOOGLE_SHEET_URL"] = "https://docs.google.com/spreadsheets/d/fake"
 os.environ["GOOGLE_CREDS_PATH"] = "fake_creds.json"
+os.environ["REMINDERS_DB_PATH"] = ":memory:"
 
 # Мокаем Google credentials и gspread ДО импорта bot.py
 mock_worksheet = MagicMock()
@@ -31,4 +41,157 @@ patch("gspread.authorize", return_value=mock_gs_client).start()
 patch(
     "oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_name",
     return_value=MagicMock(),
-).start()
\ No newline at end of file
+).start()
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  ФЕЙКОВЫЙ SHEETS API                         ║
+# ╚══════════════════════════════════════════════╝
+# Общие фикстуры fake / client / drive_client для test_sheets_client и test_sheets_quota
+
+from core.config import EVENTS_CONFIG  # noqa: E402
+from infrastructure.sheets_client import ServiceAccountToken, SheetsClient  # noqa: E402
+
+HEADER = ["ID", "Username", "ФИО", "Время", "Мастер/Детали"]
+
+
+def _service_account(token_uri: str) -> dict:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return {"client_email": "bot@test.iam", "private_key": pem, "private_key_id": "k1",
+            "token_uri": token_uri, "_public": public}
+
+
+class FakeSheets:
+    """Мини-эмулятор Sheets API v4 и OAuth-эндпоинта на aiohttp."""
+
+    def __init__(self):
+        self.sheets = {cfg["sheet"]: {"id": i, "rows": [list(HEADER)]} for i, cfg in enumerate(EVENTS_CONFIG.values())}
+        self.public_key = None
+        self.tokens_issued = 0
+        self.calls = []
+        self.fail_next = None
+        self.retry_after = "2"
+        self.revoke = False
+        self.version = 1
+        self.drive_calls = 0
+        # Медленное чтение: ответ batchGet собран, но отдаётся только после read_gate.set()
+        self.read_gate = None
+        self.read_started = asyncio.Event()
+        app = web.Application()
+        app.router.add_post("/token", self.token)
+        app.router.add_get("/drive/v3/files/{fid}", self.drive)
+        app.router.add_route("*", "/v4/spreadsheets/{sid:[^/:]+}{rest:.*}", self.api)
+        self.server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url(""))
+
+    async def token(self, request):
+        form = parse_qs(await request.text())
+        claims = jwt.decode(form["assertion"][0], certs=self.public_key, audience=f"{self.url}/token")
+        assert claims["iss"] == "bot@test.iam"
+        self.tokens_issued += 1
+        return web.json_response({"access_token": f"t{self.tokens_issued}", "expires_in": 3600})
+
+    async def drive(self, request):
+        self.drive_calls += 1
+        assert request.query["fields"] == "version"
+        return web.json_response({"version": str(self.version)})
+
+    def edit(self, sheet: str, rows) -> None:
+        """Правка таблицы вручную: меняет строки и версию файла."""
+        self.sheets[sheet]["rows"] = [list(HEADER)] + rows
+        self.version += 1
+
+    def _sheet(self, range_: str) -> dict:
+        name = range_.split("!")[0].strip("'").replace("''", "'")
+        return self.sheets[name]
+
+    async def api(self, request):
+        if request.headers.get("Authorization") != f"Bearer t{self.tokens_issued}" or self.revoke:
+            self.revoke = False
+            return web.json_response({"error": "unauthenticated"}, status=401)
+        if self.fail_next:
+            status, self.fail_next = self.fail_next, None
+            return web.json_response({"error": "quota"}, status=status, headers={"Retry-After": self.retry_after})
+        rest = request.match_info["rest"]
+        self.calls.append((request.method, rest))
+        body = await request.json() if request.can_read_body else None
+
+        if rest == "":
+            return web.json_response({"sheets": [
+                {"properties": {"title": t, "sheetId": s["id"]}} for t, s in self.sheets.items()
+            ]})
+        if rest == "/values:batchGet":
+            ranges = request.query.getall("ranges")
+            payload = {"valueRanges": [{"values": [list(row) for row in self._sheet(r)["rows"]]} for r in ranges]}
+            if self.read_gate is not None:
+                gate, self.read_gate = self.read_gate, None
+                self.read_started.set()
+                await gate.wait()
+            return web.json_response(payload)
+        if rest == "/values:batchUpdate":
+            for vr in body["data"]:
+                sheet, cells = vr["range"].rsplit("!", 1)
+                start, _ = cells.split(":")
+                row = self._sheet(sheet)["rows"][int(start[1:]) - 1]
+                col = ord(start[0]) - ord("A")
+                row.extend([""] * (col + len(vr["values"][0]) - len(row)))
+                row[col:col + len(vr["values"][0])] = vr["values"][0]
+            self.version += 1
+            return web.json_response({})
+        if rest.startswith("/values/") and rest.endswith(":append"):
+            self._sheet(rest[len("/values/"):-len(":append")])["rows"].extend(body["values"])
+            self.version += 1
+            return web.json_response({})
+        if rest.startswith("/values/"):
+            rows = self._sheet(rest[len("/values/"):])["rows"]
+            return web.json_response({"values": [r[:1] for r in rows]})
+        if rest == ":batchUpdate":
+            by_id = {s["id"]: s for s in self.sheets.values()}
+            for req in body["requests"]:
+                if "appendCells" in req:
+                    cells = req["appendCells"]
+                    by_id[cells["sheetId"]]["rows"].extend(
+                        [[v["userEnteredValue"]["stringValue"] for v in row["values"]] for row in cells["rows"]]
+                    )
+                elif "deleteDimension" in req:
+                    rng = req["deleteDimension"]["range"]
+                    del by_id[rng["sheetId"]]["rows"][rng["startIndex"]:rng["endIndex"]]
+            self.version += 1
+            return web.json_response({})
+        return web.json_response({"error": "not found"}, status=404)
+
+
+@pytest_asyncio.fixture
+async def fake():
+    fake = FakeSheets()
+    await fake.server.start_server()
+    yield fake
+    await fake.server.close()
+
+
+@pytest_asyncio.fixture
+async def client(fake):
+    info = _service_account(f"{fake.url}/token")
+    fake.public_key = info.pop("_public")
+    client = SheetsClient("sheet-id", ServiceAccountToken(info), api_url=f"{fake.url}/v4")
+    yield client
+    await client.close()
+
+
+@pytest_asyncio.fixture
+async def drive_client(fake):
+    info = _service_account(f"{fake.url}/token")
+    fake.public_key = info.pop("_public")
+    client = SheetsClient("sheet-id", ServiceAccountToken(info), api_url=f"{fake.url}/v4",
+                          drive_url=f"{fake.url}/drive/v3")
+    yield client
+    await client.close()
@@ -0,0 +1,134 @@
+# tests/test_adaptive_sync.py
+
+import asyncio
+import pytest
+
+from infrastructure.adaptive_sync import AdaptiveSync, BUDGET_SHARE
+
+
+class FakeClock:
+    def __init__(self, t: float = 0.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _loop(results, clock=None, duration=0.0, **kwargs):
+    """AdaptiveSync над заранее заданными результатами sync (исключение — ошибка sync)."""
+    results = list(results)
+    clock = clock or FakeClock()
+
+    async def sync():
+        clock.t += duration
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    kwargs.setdefault("interval", 120.0)
+    return AdaptiveSync(sync, clock=clock, **kwargs)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ИНТЕРВАЛ                                 ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestInterval:
+    async def test_edits_shorten_down_to_min(self):
+        loop = _loop([{"массаж": "diff"}] * 5, min_interval=15.0)
+        intervals = []
+        for _ in range(5):
+            await loop.run_once()
+            intervals.append(loop.interval)
+        assert intervals == [60.0, 30.0, 15.0, 15.0, 15.0]
+        assert loop.stats["edits"] == 5
+
+    async def test_quiet_backs_off_up_to_max(self):
+        loop = _loop([{}] * 5, max_interval=250.0, budget=600.0)
+        for _ in range(5):
+            await loop.run_once()
+        assert loop.interval == 250.0
+        assert loop.stats["quiet"] == 5
+
+    async def test_unknown_keeps_interval(self):
+        loop = _loop([None])
+        await loop.run_once()
+        assert loop.interval == 120.0
+
+    async def test_error_backs_off(self):
+        loop = _loop([RuntimeError("sheets down")])
+        assert await loop.run_once()
+        assert loop.interval == 240.0
+        assert loop.stats["errors"] == 1
+
+    async def test_low_quota_backs_off_even_with_edits(self):
+        loop = _loop([{"массаж": "diff"}], headroom=lambda: 0.05)
+        await loop.run_once()
+        assert loop.interval == 240.0
+        assert loop.stats["throttled"] == 1
+
+    async def test_stays_within_readiness_budget(self):
+        # Пауза + длительность sync не выходят за долю бюджета готовности
+        loop = _loop([{}] * 10, duration=40.0, max_interval=1000.0, budget=300.0)
+        for _ in range(10):
+            await loop.run_once()
+        assert loop.last_duration == 40.0
+        assert loop.interval + loop.last_duration == pytest.approx(300.0 * BUDGET_SHARE)
+
+    async def test_initial_interval_clamped(self):
+        loop = _loop([], interval=900.0, budget=600.0)
+        assert loop.interval == 600.0 * BUDGET_SHARE
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. ЗАПУСК И МЕТРИКИ                         ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestRunning:
+    async def test_run_once_never_overlaps(self):
+        release = asyncio.Event()
+        calls = []
+
+        async def sync():
+            calls.append(1)
+            await release.wait()
+            return {}
+
+        loop = AdaptiveSync(sync)
+        first = asyncio.create_task(loop.run_once())
+        await asyncio.sleep(0)
+        assert await loop.run_once() is False
+        release.set()
+        assert await first is True
+        assert len(calls) == 1
+        assert loop.stats["skipped"] == 1
+
+    async def test_loop_sleeps_chosen_interval(self):
+        sleeps = []
+        done = asyncio.Event()
+
+        async def sleep(delay):
+            sleeps.append(delay)
+            if len(sleeps) == 3:
+                done.set()
+                await asyncio.Event().wait()
+
+        loop = _loop([{"массаж": "diff"}, {}], sleep=sleep)
+        loop.start()
+        await asyncio.wait_for(done.wait(), 1)
+        await loop.stop()
+        assert sleeps == [120.0, 60.0, 90.0]
+
+    async def test_metrics_export_interval_and_duration(self):
+        loop = _loop([{}], duration=2.5)
+        await loop.run_once()
+        metrics = loop.metrics()
+        assert metrics["interval"] == 180.0
+        assert metrics["last_duration"] == 2.5
+        assert metrics["syncs"] == 1
+        assert metrics["running"] is False
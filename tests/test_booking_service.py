@@ -0,0 +1,577 @@
+# tests/test_booking_service.py
+
+import asyncio
+import pytest
+from dataclasses import replace
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional
+
+from core.config import EVENTS_CONFIG, MASTERS_CONFIG
+from core.interfaces import IBookingRepository, RepositoryError
+from core.models import BookingRecord
+from core.snapshot import EventSnapshot
+from infrastructure.timer_wheel import TimerWheel
+from services.booking_service import BookingService
+from services.occupancy import OccupancyIndex
+from services.reminder_service import ReminderService, ReminderStore
+from services.slot_holds import SlotHolds
+
+
+class InMemoryRepository(IBookingRepository):
+    def __init__(self):
+        self.data: Dict[str, List[BookingRecord]] = {ev: [] for ev in EVENTS_CONFIG}
+
+    async def get_records(self, event: str) -> List[BookingRecord]:
+        return self.data[event]
+
+    async def add_record(self, record: BookingRecord) -> None:
+        self.data[record.event].append(record)
+
+    async def delete_record(self, event: str, user_id: str) -> None:
+        self.data[event] = [r for r in self.data[event] if r.user_id != user_id]
+
+    async def sync(self) -> None:
+        pass
+
+    def get_last_sync_time(self) -> Optional[datetime]:
+        return datetime.now()
+
+
+class CountingRepository(InMemoryRepository):
+    """Запоминает пакетные вызовы."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.deletions = []
+        self.moves = []
+        self.singles = 0
+
+    async def add_record(self, record):
+        self.singles += 1
+        await super().add_record(record)
+
+    async def delete_record(self, event, user_id):
+        self.singles += 1
+        await super().delete_record(event, user_id)
+
+    async def move_record(self, event, user_id, time_str, master_id):
+        self.moves.append((event, user_id, time_str, master_id))
+        records = self.data[event]
+        i = next(i for i, r in enumerate(records) if r.user_id == user_id)
+        records[i] = replace(records[i], time=time_str, master_id=master_id)
+
+    async def add_records(self, records):
+        self.batches.append(list(records))
+        await super().add_records(records)
+
+    async def delete_records(self, keys):
+        self.deletions.append(sorted(keys))
+        await super().delete_records(keys)
+
+
+class FakeClock:
+    def __init__(self, t: float = 1_700_000_000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def service(clock):
+    return BookingService(InMemoryRepository(), holds=SlotHolds(ttl=120, clock=clock))
+
+
+async def _book(service, uid, event, time_str, **kwargs):
+    return await service.execute_booking(uid, f"u{uid}", f"User {uid}", event, time_str, **kwargs)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. УДЕРЖАНИЕ СЛОТОВ                         ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestSlotHolds:
+    async def test_hold_counts_against_capacity(self, service):
+        """Аромапсихолог (вместимость 1): удержанный слот недоступен другим."""
+        assert (await service.hold_slot("1", "аромапсихолог", "14:00"))["ok"]
+        assert not (await service.hold_slot("2", "аромапсихолог", "14:00"))["ok"]
+        assert (await _book(service, "2", "аромапсихолог", "14:00"))["text"] == "Мест нет."
+        assert (await _book(service, "1", "аромапсихолог", "14:00"))["ok"]
+
+    async def test_suggested_slots_hide_foreign_holds(self, service):
+        await service.hold_slot("1", "аромапсихолог", "14:00")
+        others = dict(await service.get_suggested_slots("аромапсихолог", user_id="2"))
+        own = dict(await service.get_suggested_slots("аромапсихолог", user_id="1"))
+        assert "14:00" not in others
+        assert own["14:00"] == 1
+
+    async def test_hold_expires(self, service, clock):
+        await service.hold_slot("1", "аромапсихолог", "14:00")
+        clock.t += 121
+        assert (await _book(service, "2", "аромапсихолог", "14:00"))["ok"]
+        assert service.holds.metrics()["expired"] == 1
+
+    async def test_booking_releases_own_hold(self, service):
+        await service.hold_slot("1", "макияж", "10:00")
+        await _book(service, "1", "макияж", "10:00")
+        assert service.holds.get("1", "макияж") is None
+
+    async def test_new_hold_replaces_previous(self, service):
+        await service.hold_slot("1", "аромапсихолог", "14:00")
+        await service.hold_slot("1", "аромапсихолог", "14:10")
+        assert (await service.hold_slot("2", "аромапсихолог", "14:00"))["ok"]
+
+    async def test_named_master_hold(self, service):
+        """Удержание конкретного специалиста: его не получит другой, остальные свободны."""
+        event = "салон предчувствий"
+        first, second = (m["id"] for m in MASTERS_CONFIG[event])
+        assert (await service.hold_slot("1", event, "12:00", first))["ok"]
+        assert (await _book(service, "2", event, "12:00", master_id=first))["text"] == "Этот специалист уже занят."
+        assert (await _book(service, "2", event, "12:00", master_id=second))["ok"]
+        assert [m["id"] for m in await service.get_available_masters(event, "12:00", "1")] == [first]
+
+    async def test_anonymous_hold_takes_one_master(self, service):
+        event = "салон предчувствий"
+        await service.hold_slot("1", event, "12:00")
+        assert dict(await service.get_suggested_slots(event, user_id="2"))["12:00"] == 1
+        assert (await _book(service, "2", event, "12:00"))["ok"]
+        assert (await _book(service, "3", event, "12:00"))["text"] == "Все мастера заняты на это время."
+
+    async def test_wheel_frees_memory(self, clock):
+        wheel = TimerWheel(clock=clock)
+        holds = SlotHolds(ttl=120, wheel=wheel, clock=clock)
+        service = BookingService(InMemoryRepository(), holds=holds)
+        await service.hold_slot("1", "аромапсихолог", "14:00")
+        clock.t += 180
+        await wheel.run_due()
+        assert holds.metrics()["active"] == 0
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. ЛИСТ ОЖИДАНИЯ                            ║
+# ╚══════════════════════════════════════════════╝
+
+
+async def _join(service, uid, event, time_str, **kwargs):
+    return await service.join_waitlist(uid, f"u{uid}", f"User {uid}", event, time_str, **kwargs)
+
+
+@pytest.mark.asyncio
+class TestWaitlist:
+    async def test_join_only_when_full(self, service):
+        assert (await _join(service, "2", "аромапсихолог", "14:00"))["status"] == "free"
+        await _book(service, "1", "аромапсихолог", "14:00")
+        assert (await _join(service, "2", "аромапсихолог", "14:00"))["position"] == 1
+        assert (await _join(service, "3", "аромапсихолог", "14:00"))["position"] == 2
+        assert not (await _join(service, "1", "аромапсихолог", "14:00"))["ok"]
+
+    async def test_cancel_promotes_first_waiter(self, service):
+        notified = []
+
+        async def notifier(record):
+            notified.append(record)
+
+        service.notifier = notifier
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        await _join(service, "3", "аромапсихолог", "14:00")
+
+        await service.cancel_booking("1", "аромапсихолог")
+        await asyncio.sleep(0)
+
+        records = service.repo.data["аромапсихолог"]
+        assert [r.user_id for r in records] == ["2"]
+        assert [r.user_id for r in notified] == ["2"]
+        assert service.waitlist.position("3", "аромапсихолог") == 1
+
+    async def test_failed_notice_is_kept_and_resent(self, clock):
+        """Упавшая отправка не теряет уведомление: оно в SQLite и уходит при следующем sync."""
+        reminders = ReminderService(ReminderStore(":memory:"), sender=None)
+        attempts = []
+
+        async def notifier(record):
+            attempts.append(record.user_id)
+            if len(attempts) == 1:
+                raise ConnectionError("telegram down")
+
+        service = BookingService(InMemoryRepository(), reminders=reminders, holds=SlotHolds(clock=clock),
+                                 notifier=notifier)
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        await service.cancel_booking("1", "аромапсихолог")
+        await asyncio.sleep(0)
+
+        assert attempts == ["2"]
+        assert [r.user_id for r in reminders.pending_promoted()] == ["2"]
+
+        await service.sync()
+        await asyncio.sleep(0)
+        assert attempts == ["2", "2"]
+        assert reminders.pending_promoted() == []
+
+    async def test_stale_notice_dropped(self, clock):
+        """Запись отменили, пока уведомление ждало повтора, — сообщать не о чем."""
+        reminders = ReminderService(ReminderStore(":memory:"), sender=None)
+        attempts = []
+
+        async def notifier(record):
+            attempts.append(record.user_id)
+            raise ConnectionError("telegram down")
+
+        service = BookingService(InMemoryRepository(), reminders=reminders, holds=SlotHolds(clock=clock),
+                                 notifier=notifier)
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        await service.cancel_booking("1", "аромапсихолог")
+        await asyncio.sleep(0)
+        await service.cancel_booking("2", "аромапсихолог")
+
+        await service.sync()
+        await asyncio.sleep(0)
+        assert attempts == ["2"]
+        assert reminders.pending_promoted() == []
+
+    async def test_reschedule_frees_old_slot(self, service):
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        assert (await _book(service, "1", "аромапсихолог", "14:10", is_reschedule=True))["ok"]
+        assert {(r.user_id, r.time) for r in service.repo.data["аромапсихолог"]} == {("1", "14:10"), ("2", "14:00")}
+
+    async def test_cancel_all_is_one_batch(self, clock):
+        service = BookingService(CountingRepository(), holds=SlotHolds(clock=clock))
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _book(service, "1", "массаж", "12:00")
+        await _book(service, "2", "массаж", "12:00")
+        await service.cancel_all("1")
+        assert service.repo.deletions == [[("аромапсихолог", "1"), ("массаж", "1")]]
+        assert [r.user_id for r in await service.get_user_bookings("2")] == ["2"]
+        assert await service.get_user_bookings("1") == ()
+
+    async def test_cancel_all_promotes_every_slot(self, service):
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _book(service, "1", "массаж", "12:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        await service.cancel_all("1")
+        assert [r.user_id for r in service.repo.data["аромапсихолог"]] == ["2"]
+        assert service.waitlist.metrics()["promoted"] == 1
+
+    async def test_conflicted_waiter_is_skipped(self, service):
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _join(service, "2", "аромапсихолог", "14:00")
+        await _join(service, "3", "аромапсихолог", "14:00")
+        # У второго в это время уже другая услуга — место получает третий
+        await _book(service, "2", "массаж", "14:00")
+        await service.cancel_booking("1", "аромапсихолог")
+        assert [r.user_id for r in service.repo.data["аромапсихолог"]] == ["3"]
+        assert service.waitlist.position("2", "аромапсихолог") == 1
+
+    async def test_named_master_waiter(self, service):
+        event = "салон предчувствий"
+        first, second = (m["id"] for m in MASTERS_CONFIG[event])
+        await _book(service, "1", event, "12:00", master_id=first)
+        await _book(service, "2", event, "12:00", master_id=second)
+        await _join(service, "3", event, "12:00", master_id=first)
+        await _join(service, "4", event, "12:00")
+        await service.cancel_booking("2", event)
+        # Третий ждёт только первого специалиста, второго получает четвёртый
+        assert {(r.user_id, r.master_id) for r in service.repo.data[event]} == {("1", first), ("4", second)}
+        await service.cancel_booking("1", event)
+        assert ("3", first) in {(r.user_id, r.master_id) for r in service.repo.data[event]}
+
+    async def test_concurrent_cancels_and_joins(self, service):
+        """Гонка отмен, записей и листа ожидания: вместимость не превышена, FIFO, без двойных записей."""
+        event, time_str = "массаж", "12:00"
+        capacity = len([m for m in MASTERS_CONFIG[event] if time_str not in m.get("breaks", [])])
+        first = [str(i) for i in range(capacity)]
+        for uid in first:
+            assert (await _book(service, uid, event, time_str))["ok"]
+        waiters = [str(100 + i) for i in range(3 * capacity)]
+        for uid in waiters:
+            await _join(service, uid, event, time_str)
+
+        tasks = [service.cancel_booking(uid, event) for uid in first]
+        tasks += [_book(service, str(200 + i), event, time_str) for i in range(capacity)]
+        tasks += [_join(service, str(300 + i), event, time_str) for i in range(capacity)]
+        await asyncio.gather(*tasks)
+
+        records = [r for r in service.repo.data[event] if r.time == time_str]
+        assert len(records) == capacity
+        assert len({r.master_id for r in records}) == capacity
+        promoted = [r.user_id for r in records if r.user_id in waiters]
+        assert promoted == waiters[:len(promoted)]
+        assert all(service.waitlist.position(uid, event) is None for uid in promoted)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  3. АВТОСОСТАВЛЕНИЕ ПРОГРАММЫ                ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _overlaps(records, gap=0):
+    spans = sorted((_m(r.time), _m(r.time) + EVENTS_CONFIG[r.event]["duration"]) for r in records)
+    return any(nxt[0] < cur[1] + gap for cur, nxt in zip(spans, spans[1:]))
+
+
+def _m(time_str):
+    h, m = time_str.split(":")
+    return int(h) * 60 + int(m)
+
+
+@pytest.mark.asyncio
+class TestPlanProgram:
+    async def test_all_events_without_overlaps(self, clock):
+        service = BookingService(CountingRepository(), holds=SlotHolds(clock=clock))
+        res = await service.plan_program("1", username="u1", full_name="User 1")
+        assert res["ok"] and not res["unplaced"]
+        assert {r.event for r in res["bookings"]} == set(EVENTS_CONFIG)
+        assert not _overlaps(res["bookings"])
+        # Одна пакетная запись
+        assert len(service.repo.batches) == 1
+        assert {r.event for r in await service.get_user_bookings("1")} == set(EVENTS_CONFIG)
+
+    async def test_keeps_existing_bookings_and_preferences(self, service):
+        await _book(service, "1", "массаж", "15:00")
+        res = await service.plan_program("1", ["массаж", "аромапсихолог", "макияж"],
+                                         {"after": "12:00", "gap": 10})
+        assert res["already"] == ["массаж"]
+        assert res["unplaced"] == ["макияж"]  # макияж заканчивается в 12:00
+        assert not _overlaps(await service.get_user_bookings("1"), gap=10)
+
+    async def test_respects_occupancy_and_breaks(self, service):
+        event = "салон предчувствий"
+        for i, time_str in enumerate(service.get_slot_list(event)[:-1]):
+            for j in range(2):
+                await _book(service, f"{i}-{j}", event, time_str)
+        res = await service.plan_program("x", [event, "аромапсихолог"])
+        [booking] = [r for r in res["bookings"] if r.event == event]
+        assert booking.time == service.get_slot_list(event)[-1]
+        master = next(m for m in MASTERS_CONFIG[event] if m["id"] == booking.master_id)
+        assert booking.time not in master.get("breaks", [])
+
+    async def test_backtracks_to_fit_everything(self, service):
+        """Нутрициолог (15:00–16:30) занимает окно — аромапсихолог уходит за его пределы."""
+        res = await service.plan_program("1", ["аромапсихолог", "нутрициолог"])
+        assert not res["unplaced"] and not _overlaps(res["bookings"])
+
+    async def test_nothing_fits(self, service):
+        res = await service.plan_program("1", ["макияж"], {"after": "13:00"})
+        assert not res["ok"] and res["unplaced"] == ["макияж"]
+        assert not service.repo.data["макияж"]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  4. ПЕРЕНОС                                  ║
+# ╚══════════════════════════════════════════════╝
+
+
+class FailingMoveRepository(InMemoryRepository):
+    async def move_record(self, event, user_id, time_str, master_id):
+        raise RepositoryError("таблица недоступна")
+
+
+@pytest.mark.asyncio
+class TestReschedule:
+    async def test_single_move_instead_of_delete_and_add(self, clock):
+        service = BookingService(CountingRepository(), holds=SlotHolds(clock=clock))
+        await _book(service, "1", "массаж", "12:00")
+        service.repo.singles = 0
+
+        res = await _book(service, "1", "массаж", "13:00", is_reschedule=True)
+        assert res["ok"]
+        assert service.repo.singles == 0
+        [(event, uid, time_str, master_id)] = service.repo.moves
+        assert (event, uid, time_str) == ("массаж", "1", "13:00")
+        [record] = await service.get_user_bookings("1")
+        assert (record.time, record.master_id) == ("13:00", master_id)
+        assert await service.get_available_masters("массаж", "12:00") == MASTERS_CONFIG["массаж"]
+
+    async def test_default_move_keeps_row_data(self, service):
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _book(service, "1", "аромапсихолог", "14:10", is_reschedule=True)
+        [record] = service.repo.data["аромапсихолог"]
+        assert (record.username, record.full_name, record.time) == ("u1", "User 1", "14:10")
+
+    async def test_failed_move_keeps_old_booking(self, clock):
+        service = BookingService(FailingMoveRepository(), holds=SlotHolds(clock=clock))
+        await _book(service, "1", "аромапсихолог", "14:00")
+        with pytest.raises(RepositoryError):
+            await _book(service, "1", "аромапсихолог", "14:10", is_reschedule=True)
+        [record] = await service.get_user_bookings("1")
+        assert record.time == "14:00"
+        assert not (await _book(service, "2", "аромапсихолог", "14:00"))["ok"]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  5. БЛИЖАЙШИЕ СВОБОДНЫЕ СЛОТЫ                ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestNearestFree:
+    def test_order_by_distance_then_earlier(self):
+        index = OccupancyIndex.build(
+            BookingRecord(str(i), "", "", "аромапсихолог", t, "Записано") for i, t in enumerate(["14:20", "14:30"])
+        )
+        assert list(islice(index.nearest_free("аромапсихолог", "14:20"), 3)) == ["14:10", "14:00", "14:40"]
+        # Время вне сетки и за её краем
+        assert next(index.nearest_free("аромапсихолог", "14:27")) == "14:40"
+        assert next(index.nearest_free("аромапсихолог", "18:00")) == "16:50"
+
+    def test_cancel_frees_slot_again(self):
+        record = BookingRecord("1", "", "", "аромапсихолог", "14:10", "Записано")
+        index = OccupancyIndex.build([record])
+        assert next(index.nearest_free("аромапсихолог", "14:10")) == "14:00"
+        index.remove(record)
+        assert next(index.nearest_free("аромапсихолог", "14:10")) == "14:10"
+
+    def test_master_slot_full_only_when_all_masters_busy(self):
+        event = "массаж"
+        masters = [m["id"] for m in MASTERS_CONFIG[event]]
+        index = OccupancyIndex.build(
+            BookingRecord(str(i), "", "", event, "12:00", m) for i, m in enumerate(masters[:-1])
+        )
+        assert next(index.nearest_free(event, "12:00")) == "12:00"
+        index.add(BookingRecord("x", "", "", event, "12:00", masters[-1]))
+        assert next(index.nearest_free(event, "12:00")) == "11:50"
+
+
+@pytest.mark.asyncio
+class TestNearestFreeInReply:
+    async def test_full_slot_reply_lists_nearest(self, service):
+        for uid, time_str in (("1", "14:20"), ("2", "14:30")):
+            await _book(service, uid, "аромапсихолог", time_str)
+        res = await _book(service, "3", "аромапсихолог", "14:20")
+        assert res == {"ok": False, "text": "Мест нет.", "nearest": ["14:10", "14:00", "14:40"]}
+
+    async def test_nearest_skips_held_and_follows_cancel(self, service):
+        for uid, time_str in (("1", "14:20"), ("2", "14:30")):
+            await _book(service, uid, "аромапсихолог", time_str)
+        await service.hold_slot("9", "аромапсихолог", "14:10")
+        await service.cancel_booking("2", "аромапсихолог")
+        res = await service.hold_slot("3", "аромапсихолог", "14:20")
+        assert res["nearest"] == ["14:30", "14:00", "14:40"]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  6. СВОБОДНО НА ВРЕМЯ ПО ВСЕМ УСЛУГАМ        ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestAvailabilityAt:
+    async def test_all_events_with_slot_at_time(self, service):
+        available = dict(await service.availability_at("14:00"))
+        assert list(available) == [ev for ev in EVENTS_CONFIG if "14:00" in service.get_slot_list(ev)]
+        assert available["аромапсихолог"] == 1
+        # У Нарека перерыв в 14:00
+        assert available["массаж"] == len(MASTERS_CONFIG["массаж"]) - 1
+
+    async def test_follows_bookings_and_cancels(self, service):
+        await _book(service, "1", "аромапсихолог", "14:00")
+        await _book(service, "2", "массаж", "14:00")
+        available = dict(await service.availability_at("14:00"))
+        assert "аромапсихолог" not in available
+        assert available["массаж"] == len(MASTERS_CONFIG["массаж"]) - 2
+
+        await service.cancel_booking("1", "аромапсихолог")
+        assert dict(await service.availability_at("14:00"))["аромапсихолог"] == 1
+        # После отмены порядок остаётся порядком конфига
+        assert [ev for ev, _ in await service.availability_at("14:00")][0] == "аромапсихолог"
+
+    async def test_filtered_by_users_own_bookings(self, service):
+        await _book(service, "1", "мастерская Чехова", "14:00")
+        # Мастерская идёт час: всё, что начинается в 14:30, пересекается с ней
+        assert await service.availability_at("14:30", user_id="1") == []
+        assert ("аромапсихолог", 1) in await service.availability_at("14:30")
+        assert "мастерская Чехова" not in dict(await service.availability_at("15:00", user_id="1"))
+
+    async def test_holds_taken_into_account(self, service):
+        await service.hold_slot("9", "аромапсихолог", "14:10")
+        assert "аромапсихолог" not in dict(await service.availability_at("14:10"))
+        assert dict(await service.availability_at("14:10", user_id="9"))["аромапсихолог"] == 1
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  7. СИНХРОНИЗАЦИЯ ПО РАЗНИЦЕ СТРОК           ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _rec(uid, time_str, event="аромапсихолог"):
+    return BookingRecord(uid, f"u{uid}", f"User {uid}", event, time_str, "Записано")
+
+
+class DiffRepository(InMemoryRepository):
+    """Как Sheets с проверкой изменений: sync сообщает разницу строк."""
+
+    def __init__(self):
+        super().__init__()
+        self.sheet: Dict[str, List[BookingRecord]] = {ev: [] for ev in EVENTS_CONFIG}
+        self._changes = None
+
+    async def sync(self):
+        self._changes = {}
+        for ev, rows in self.sheet.items():
+            diff = EventSnapshot.build(ev, self.data[ev]).diff(rows)
+            if diff.removed or diff.added:
+                self.data[ev] = list(rows)
+                self._changes[ev] = diff
+
+    def sync_changes(self):
+        return self._changes
+
+
+class FakeReminders:
+    def __init__(self):
+        self.log = []
+
+    def schedule(self, user_id, event, time_str):
+        self.log.append(("schedule", user_id, event, time_str))
+
+    def cancel(self, user_id, event):
+        self.log.append(("cancel", user_id, event))
+
+
+@pytest.mark.asyncio
+class TestIncrementalSync:
+    async def test_diff_applied_to_index_and_reminders(self):
+        repo = DiffRepository()
+        repo.sheet["аромапсихолог"] = [_rec("1", "14:00"), _rec("2", "14:10")]
+        service = BookingService(repo)
+        assert set(await service.sync()) == {"аромапсихолог"}
+        index = service._index
+        service.reminders = FakeReminders()
+
+        # В таблице вручную перенесли 2 и удалили 1
+        repo.sheet["аромапсихолог"] = [_rec("2", "14:30")]
+        changes = await service.sync()
+        assert service._index is index
+        assert [r.user_id for r in changes["аромапсихолог"].removed] == ["1", "2"]
+        assert service.reminders.log == [
+            ("cancel", "1", "аромапсихолог"), ("cancel", "2", "аромапсихолог"),
+            ("schedule", "2", "аромапсихолог", "14:30"),
+        ]
+        assert (await service.get_user_bookings("2"))[0].time == "14:30"
+        assert await service.get_user_bookings("1") == ()
+        assert dict(await service.availability_at("14:00"))["аромапсихолог"] == 1
+
+    async def test_nothing_changed_keeps_index(self):
+        repo = DiffRepository()
+        service = BookingService(repo)
+        await service.sync()
+        index = service._index
+        assert await service.sync() == {}
+        assert service._index is index
+
+    async def test_unknown_changes_rebuild(self, service):
+        await service.sync()
+        index = service._index
+        assert await service.sync() is None
+        assert service._index is not index
@@ -2,6 +2,7 @@
 
 import asyncio
 import json
+import threading
 import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
@@ -26,10 +27,6 @@ def _patch_externals(monkeypatch):
     import bot as bot_module
     monkeypatch.setattr(bot_module, "sheet", mock_sheet)
 
-    mock_scheduler = MagicMock()
-    mock_scheduler.get_job.return_value = None
-    monkeypatch.setattr(bot_module, "scheduler", mock_scheduler)
-
     mock_bot = AsyncMock()
     monkeypatch.setattr(bot_module, "bot", mock_bot)
 
@@ -40,12 +37,12 @@ def _patch_externals(monkeypatch):
     yield {
         "worksheet": mock_worksheet,
         "sheet": mock_sheet,
-        "scheduler": mock_scheduler,
         "bot": mock_bot,
     }
 
 
 import bot as bot_module
+from presentation.callbacks import Action, Callback
 from bot import (
     ef,
     plural_masters,
@@ -65,6 +62,7 @@ from bot import (
     build_services_keyboard,
     build_service_card,
     execute_booking,
+    cancel_all_bookings,
     send_program,
     EVENTS_CONFIG,
     MASTERS_CONFIG,
@@ -330,6 +328,12 @@ class TestFindAvailableMaster:
         master, err = find_available_master("макияж", "10:00", busy)
         assert master is None
 
+    def test_least_loaded_with_event_records(self):
+        """С записями за день выбирается наименее загруженный мастер."""
+        day = [{"Мастер/Детали": "Мастер №1 Виктор"}, {"Мастер/Детали": "Мастер №2 Нарек"}]
+        master, err = find_available_master("массаж", "11:00", [], None, day)
+        assert master["id"] == "Мастер №3 Ольга"
+
 
 class TestCountAvailableMasters:
     def test_all_free(self):
@@ -651,20 +655,20 @@ class TestBuildSlotKeyboard:
         # UPDATED: +1 для кнопки «← Назад к услугам»
         assert len(kb.inline_keyboard) == 3
         assert "11:00" in kb.inline_keyboard[0][0].text
-        assert kb.inline_keyboard[0][0].callback_data == "slot|массаж|11:00|book"
+        assert _decoded(kb.inline_keyboard[0][0]) == Callback(Action.SLOT, "массаж", "11:00")
 
     def test_has_back_button(self):
         """Новая кнопка «← Назад к услугам»."""
         suggested = [("11:00", 3)]
         kb = build_slot_keyboard("массаж", suggested, "book")
         last_row = kb.inline_keyboard[-1]
-        assert last_row[0].callback_data == "back_to_services"
+        assert _decoded(last_row[0]).action == Action.BACK_TO_SERVICES
         assert "Назад" in last_row[0].text
 
     def test_reschedule_action(self):
         suggested = [("11:00", 1)]
         kb = build_slot_keyboard("массаж", suggested, "reschedule")
-        assert "reschedule" in kb.inline_keyboard[0][0].callback_data
+        assert _decoded(kb.inline_keyboard[0][0]).reschedule
 
     def test_masters_label(self):
         suggested = [("11:00", 2)]
@@ -695,8 +699,7 @@ class TestBuildServicesKeyboard:
         """Без user_id — все кнопки start_book (нет ✅/⛔)."""
         kb = build_services_keyboard()
         for row in kb.inline_keyboard:
-            cb = row[0].callback_data
-            assert cb.startswith("start_book|") or cb.startswith("no_slots|")
+            assert _decoded(row[0]).action in (Action.START_BOOK, Action.NO_SLOTS)
 
     def test_already_booked_shows_checkmark(self):
         """Если пользователь записан — кнопка показывает ✅."""
@@ -706,12 +709,12 @@ class TestBuildServicesKeyboard:
         kb = build_services_keyboard(user_id="123")
         massage_row = None
         for row in kb.inline_keyboard:
-            if "массаж" in row[0].callback_data.lower() or "Массаж" in row[0].text:
+            if _decoded(row[0]).event == "массаж":
                 massage_row = row
                 break
         assert massage_row is not None
         assert "✅" in massage_row[0].text
-        assert massage_row[0].callback_data.startswith("my_booking_detail|")
+        assert _decoded(massage_row[0]).action == Action.BOOKING_DETAIL
 
     def test_no_slots_shows_blocked(self):
         """Если мест нет — кнопка показывает ⛔."""
@@ -724,12 +727,12 @@ class TestBuildServicesKeyboard:
         kb = build_services_keyboard(user_id="999")
         aroma_row = None
         for row in kb.inline_keyboard:
-            if "аромапсихолог" in row[0].callback_data or "Аромапсихолог" in row[0].text:
+            if _decoded(row[0]).event == "аромапсихолог":
                 aroma_row = row
                 break
         assert aroma_row is not None
         assert "⛔" in aroma_row[0].text
-        assert aroma_row[0].callback_data.startswith("no_slots|")
+        assert _decoded(aroma_row[0]).action == Action.NO_SLOTS
 
     def test_available_shows_active_button(self):
         """Если есть места и не записан — обычная кнопка start_book."""
@@ -737,7 +740,7 @@ class TestBuildServicesKeyboard:
         kb = build_services_keyboard(user_id="999")
         massage_row = None
         for row in kb.inline_keyboard:
-            if "start_book|массаж" in row[0].callback_data:
+            if _decoded(row[0]) == Callback(Action.START_BOOK, "массаж"):
                 massage_row = row
                 break
         assert massage_row is not None
@@ -798,6 +801,15 @@ class TestExecuteBooking:
         assert res["ok"] is False
         assert "Ближайшие" in res["text"]
 
+    async def test_full_slot_suggests_nearest_free(self):
+        """Занятый слот — в ответе ближайшие свободные, а не весь день."""
+        taken = [{"ID": i, "Время": t, "Мастер/Детали": "Записано"} for i, t in enumerate(["14:20", "14:30"])]
+        bot_module._sheet_cache = {"аромапсихолог": taken}
+        res = await execute_booking(123, "@user", "Test", "аромапсихолог", "14:20")
+        assert res["ok"] is False
+        assert "Ближайшие свободные: 14:10 (осталось 1 место), 14:00" in res["text"]
+        assert "14:40" in res["text"] and "16:50" not in res["text"]
+
     async def test_out_of_hours(self):
         bot_module._sheet_cache = {"массаж": []}
         res = await execute_booking(123, "@user", "Test", "массаж", "08:00")
@@ -899,6 +911,23 @@ class TestExecuteBooking:
         assert "11:00" not in times
         assert "12:00" in times
 
+    async def test_reschedule_updates_row_in_place(self, _patch_externals):
+        """Перенос правит ячейки «Время» и «Мастер/Детали» той же строки, без удаления и добавления."""
+        ws = _patch_externals["worksheet"]
+        ws.col_values.return_value = ["ID", "7", "123"]
+        bot_module._sheet_cache = {
+            "массаж": [{"ID": 7, "Время": "11:00"},
+                       {"ID": 123, "Username": "@user", "Время": "11:00", "Мастер/Детали": "Мастер №1 Виктор"}],
+        }
+        res = await execute_booking(123, "@user", "Test", "массаж", "12:00", is_reschedule=True)
+        assert res["ok"] is True
+        [[updates], _] = ws.batch_update.call_args
+        assert updates[0]["range"] == "D3:E3"
+        assert updates[0]["values"][0][0] == "12:00"
+        ws.append_row.assert_not_called()
+        ws.delete_rows.assert_not_called()
+        assert bot_module._sheet_cache["массаж"][1]["Время"] == "12:00"
+
     async def test_reschedule_text_format(self):
         """Перенос показывает «🔄 Перенесено»."""
         bot_module._sheet_cache = {
@@ -971,6 +1000,42 @@ class TestExecuteBooking:
         assert records[0]["Время"] == "14:00"
 
 
+@pytest.mark.asyncio
+class TestCancelAllBookings:
+    async def test_one_batch_across_sheets_bottom_up(self, _patch_externals):
+        """Все удаления — одним batch_update, на каждом листе снизу вверх."""
+        sheet = _patch_externals["sheet"]
+        massage, aroma = MagicMock(id=11), MagicMock(id=22)
+        massage.title, aroma.title = EVENTS_CONFIG["массаж"]["sheet"], EVENTS_CONFIG["аромапсихолог"]["sheet"]
+        sheet.worksheets.return_value = [massage, aroma]
+        sheet.values_batch_get.return_value = {"valueRanges": [
+            {"values": [["ID"], ["123"], ["5"]]},               # аромапсихолог
+            {"values": [["ID"], ["123"], ["7"], ["123"]]},      # массаж: дубль строки
+        ]}
+        bot_module._sheet_cache = {
+            "аромапсихолог": [{"ID": 123, "Время": "14:00"}, {"ID": 5, "Время": "14:10"}],
+            "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "Мастер №1 Виктор"}, {"ID": 7, "Время": "11:00"}],
+        }
+
+        text = await cancel_all_bookings(123)
+
+        assert "отменены" in text
+        sheet.batch_update.assert_called_once()
+        ranges = [r["deleteDimension"]["range"] for r in sheet.batch_update.call_args.args[0]["requests"]]
+        assert [(r["sheetId"], r["startIndex"]) for r in ranges] == [(22, 1), (11, 3), (11, 1)]
+        assert [r["ID"] for r in bot_module._sheet_cache["массаж"]] == [7]
+        assert [r["ID"] for r in bot_module._sheet_cache["аромапсихолог"]] == [5]
+
+    async def test_cache_untouched_when_batch_fails(self, _patch_externals):
+        sheet = _patch_externals["sheet"]
+        sheet.worksheets.return_value = []
+        sheet.values_batch_get.side_effect = RuntimeError("quota")
+        bot_module._sheet_cache = {"аромапсихолог": [{"ID": 123, "Время": "14:00"}]}
+        with pytest.raises(RuntimeError):
+            await cancel_all_bookings(123)
+        assert len(bot_module._sheet_cache["аромапсихолог"]) == 1
+
+
 # ╔══════════════════════════════════════════════╗
 # ║  9. send_program                             ║
 # ╚══════════════════════════════════════════════╝
@@ -1263,6 +1328,14 @@ def _make_callback(data, user_id=123, username="testuser", full_name="Test User"
     return cb
 
 
+def _make_button(action, event=None, time_str=None, mode="book", **kwargs):
+    return _make_callback(bot_module.callback_codec.encode(action, event, time_str, mode=mode), **kwargs)
+
+
+def _decoded(button):
+    return bot_module.callback_codec.decode(button.callback_data)
+
+
 def _make_state(data=None, state_val=None):
     st = AsyncMock()
     st.get_data = AsyncMock(return_value=data or {})
@@ -1503,9 +1576,9 @@ class TestHandleBookingHandler:
         kb = msg.reply.call_args.kwargs.get("reply_markup")
         assert kb is not None
         # Должны быть кнопки Перенести и Отменить
-        all_cb = [btn.callback_data for row in kb.inline_keyboard for btn in row]
-        assert any("start_reschedule" in cb for cb in all_cb)
-        assert any("confirm_cancel" in cb for cb in all_cb)
+        actions = {_decoded(btn).action for row in kb.inline_keyboard for btn in row}
+        assert Action.REQUEST_RESCHEDULE in actions
+        assert Action.CANCEL_BOOKING in actions
 
     async def test_fixed_time_no_slot_selection(self):
         bot_module._sheet_cache = {"нутрициолог": []}
@@ -1550,10 +1623,10 @@ class TestHandleBookingHandler:
 class TestProcessSlot:
     async def test_successful_slot_booking(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("slot|массаж|11:00|book")
+        cb = _make_button(Action.SLOT, "массаж", "11:00")
         state = _make_state(data={})
 
-        await bot_module.process_slot(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         state.clear.assert_called_once()
@@ -1565,10 +1638,10 @@ class TestProcessSlot:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "M1"}],
         }
-        cb = _make_callback("slot|массаж|12:00|reschedule")
+        cb = _make_button(Action.SLOT, "массаж", "12:00", mode="reschedule")
         state = _make_state(data={"preferred_master": None})
 
-        await bot_module.process_slot(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         last_text = cb.message.edit_text.call_args_list[-1][0][0]
         assert "12:00" in last_text
@@ -1578,30 +1651,30 @@ class TestProcessSlot:
         bot_module._sheet_cache = {
             "аромапсихолог": [{"ID": 999, "Время": "14:00", "Мастер/Детали": "Записано"}],
         }
-        cb = _make_callback("slot|аромапсихолог|14:00|book")
+        cb = _make_button(Action.SLOT, "аромапсихолог", "14:00")
         state = _make_state(data={})
 
-        await bot_module.process_slot(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         last_text = cb.message.edit_text.call_args_list[-1][0][0]
         assert "занято" in last_text.lower()
 
     async def test_slot_with_preferred_master(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("slot|массаж|11:00|book")
+        cb = _make_button(Action.SLOT, "массаж", "11:00")
         state = _make_state(data={"preferred_master": "Ольга"})
 
-        await bot_module.process_slot(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         last_text = cb.message.edit_text.call_args_list[-1][0][0]
         assert "Ольга" in last_text
 
     async def test_slot_without_action_defaults_to_book(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("slot|массаж|11:00")
+        cb = _make_button(Action.SLOT, "массаж", "11:00")
         state = _make_state(data={})
 
-        await bot_module.process_slot(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         last_text = cb.message.edit_text.call_args_list[-1][0][0]
         assert "записано" in last_text.lower() or "записан" in last_text.lower()
@@ -1612,10 +1685,10 @@ class TestProcessStartBook:
     async def test_shows_slots_with_service_card(self):
         """Показывает rich-карточку + слоты."""
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("start_book|массаж")
+        cb = _make_button(Action.START_BOOK, "массаж")
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         state.clear.assert_called()
@@ -1632,10 +1705,10 @@ class TestProcessStartBook:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "M1"}],
         }
-        cb = _make_callback("start_book|массаж")
+        cb = _make_button(Action.START_BOOK, "массаж")
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "уже записаны" in text.lower()
@@ -1643,10 +1716,10 @@ class TestProcessStartBook:
 
     async def test_fixed_time_books_immediately(self):
         bot_module._sheet_cache = {"нутрициолог": []}
-        cb = _make_callback("start_book|нутрициолог")
+        cb = _make_button(Action.START_BOOK, "нутрициолог")
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         state.clear.assert_called()
         state.set_state.assert_not_called()
@@ -1661,10 +1734,10 @@ class TestProcessStartBook:
                 for i in range(30)
             ],
         }
-        cb = _make_callback("start_book|нутрициолог")
+        cb = _make_button(Action.START_BOOK, "нутрициолог")
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "нет" in text.lower() or "мест" in text.lower()
@@ -1676,32 +1749,34 @@ class TestProcessStartBook:
             for i, s in enumerate(all_slots)
         ]
         bot_module._sheet_cache = {"аромапсихолог": records}
-        cb = _make_callback("start_book|аромапсихолог", user_id=999)
+        cb = _make_button(Action.START_BOOK, "аромапсихолог", user_id=999)
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "нет" in text.lower() or "мест" in text.lower() or "заняты" in text.lower()
 
-    async def test_unknown_event(self):
-        cb = _make_callback("start_book|пилатес")
+    async def test_legacy_payload_is_stale(self):
+        """Кнопки старого формата «start_book|…» — алерт вместо обработки."""
+        cb = _make_callback("start_book|массаж")
         state = _make_state()
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
-        text = cb.message.edit_text.call_args[0][0]
-        assert "не найдена" in text.lower()
+        cb.answer.assert_called_once()
+        assert cb.answer.call_args.kwargs.get("show_alert") is True
+        cb.message.edit_text.assert_not_called()
 
     async def test_clears_previous_state(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("start_book|массаж")
+        cb = _make_button(Action.START_BOOK, "массаж")
         state = _make_state(
             data={"event": "макияж", "action": "book"},
             state_val=BookingState.waiting_for_time.state,
         )
 
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         state.clear.assert_called()
 
@@ -1719,10 +1794,10 @@ class TestProcessBookingDetail:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "Мастер №1 Виктор"}],
         }
-        cb = _make_callback("my_booking_detail|массаж")
+        cb = _make_button(Action.BOOKING_DETAIL, "массаж")
         state = _make_state()
 
-        await bot_module.process_booking_detail(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         text = cb.message.edit_text.call_args[0][0]
@@ -1735,24 +1810,24 @@ class TestProcessBookingDetail:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "M1"}],
         }
-        cb = _make_callback("my_booking_detail|массаж")
+        cb = _make_button(Action.BOOKING_DETAIL, "массаж")
         state = _make_state()
 
-        await bot_module.process_booking_detail(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         kb = cb.message.edit_text.call_args.kwargs.get("reply_markup")
         assert kb is not None
-        all_cb = [btn.callback_data for row in kb.inline_keyboard for btn in row]
-        assert any("start_reschedule|массаж" in c for c in all_cb)
-        assert any("confirm_cancel|массаж" in c for c in all_cb)
-        assert any("back_to_services" in c for c in all_cb)
+        all_cb = [_decoded(btn) for row in kb.inline_keyboard for btn in row]
+        assert Callback(Action.REQUEST_RESCHEDULE, "массаж") in all_cb
+        assert Callback(Action.CANCEL_BOOKING, "массаж") in all_cb
+        assert Callback(Action.BACK_TO_SERVICES) in all_cb
 
     async def test_no_booking_found(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("my_booking_detail|массаж")
+        cb = _make_button(Action.BOOKING_DETAIL, "массаж")
         state = _make_state()
 
-        await bot_module.process_booking_detail(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "не найдена" in text.lower()
@@ -1761,10 +1836,10 @@ class TestProcessBookingDetail:
         bot_module._sheet_cache = {
             "гадалки": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "Гадалка Юлия"}],
         }
-        cb = _make_callback("my_booking_detail|гадалки")
+        cb = _make_button(Action.BOOKING_DETAIL, "гадалки")
         state = _make_state()
 
-        await bot_module.process_booking_detail(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "Юлия" in text
@@ -1779,10 +1854,10 @@ class TestProcessConfirmCancel:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "M1"}],
         }
-        cb = _make_callback("confirm_cancel|массаж")
+        cb = _make_button(Action.CANCEL_BOOKING, "массаж")
         state = _make_state()
 
-        await bot_module.process_confirm_cancel(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         assert len(bot_module._sheet_cache["массаж"]) == 0
@@ -1791,10 +1866,10 @@ class TestProcessConfirmCancel:
 
     async def test_cancel_nonexistent(self):
         bot_module._sheet_cache = {"массаж": []}
-        cb = _make_callback("confirm_cancel|массаж")
+        cb = _make_button(Action.CANCEL_BOOKING, "массаж")
         state = _make_state()
 
-        await bot_module.process_confirm_cancel(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "нет записи" in text.lower()
@@ -1808,10 +1883,10 @@ class TestProcessStartReschedule:
         bot_module._sheet_cache = {
             "массаж": [{"ID": 123, "Время": "11:00", "Мастер/Детали": "M1"}],
         }
-        cb = _make_callback("start_reschedule|массаж")
+        cb = _make_button(Action.REQUEST_RESCHEDULE, "массаж")
         state = _make_state()
 
-        await bot_module.process_start_reschedule(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         state.set_state.assert_called_with(BookingState.waiting_for_time)
@@ -1821,10 +1896,10 @@ class TestProcessStartReschedule:
         assert kb is not None
         # Кнопки содержат reschedule в callback_data
         slot_buttons = [
-            btn for row in kb.inline_keyboard for btn in row
-            if btn.callback_data.startswith("slot|")
+            _decoded(btn) for row in kb.inline_keyboard for btn in row
+            if _decoded(btn).action == Action.SLOT
         ]
-        assert all("reschedule" in btn.callback_data for btn in slot_buttons)
+        assert slot_buttons and all(cb.reschedule for cb in slot_buttons)
 
     async def test_no_slots_for_reschedule(self):
         """Если нет свободных слотов — сообщение + кнопка Назад."""
@@ -1834,17 +1909,17 @@ class TestProcessStartReschedule:
             for i, s in enumerate(all_slots)
         ]
         bot_module._sheet_cache = {"аромапсихолог": records}
-        cb = _make_callback("start_reschedule|аромапсихолог")
+        cb = _make_button(Action.REQUEST_RESCHEDULE, "аромапсихолог")
         state = _make_state()
 
-        await bot_module.process_start_reschedule(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         text = cb.message.edit_text.call_args[0][0]
         assert "нет" in text.lower()
         kb = cb.message.edit_text.call_args.kwargs.get("reply_markup")
         assert kb is not None
-        assert any("back_to_services" in btn.callback_data
-                    for row in kb.inline_keyboard for btn in row)
+        assert any(_decoded(btn).action == Action.BACK_TO_SERVICES
+                   for row in kb.inline_keyboard for btn in row)
 
 
 @pytest.mark.asyncio
@@ -1852,10 +1927,10 @@ class TestProcessBackToServices:
     """Тест back_to_services — навигация назад."""
 
     async def test_shows_services_keyboard(self):
-        cb = _make_callback("back_to_services")
+        cb = _make_button(Action.BACK_TO_SERVICES)
         state = _make_state()
 
-        await bot_module.process_back_to_services(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         state.clear.assert_called()
@@ -1870,10 +1945,10 @@ class TestProcessNoSlots:
     """Тест no_slots — popup alert вместо нового сообщения."""
 
     async def test_shows_alert(self):
-        cb = _make_callback("no_slots|аромапсихолог")
+        cb = _make_button(Action.NO_SLOTS, "аромапсихолог")
         state = _make_state()
 
-        await bot_module.process_no_slots(cb, state)
+        await bot_module.dispatch_callback(cb, state)
 
         cb.answer.assert_called_once()
         call_kwargs = cb.answer.call_args.kwargs
@@ -1976,19 +2051,121 @@ class TestFullScenarios:
         assert kb is not None
 
         # 2. Тап на услугу
-        cb = _make_callback("start_book|массаж")
+        cb = _make_button(Action.START_BOOK, "массаж")
         state = _make_state()
-        await bot_module.process_start_book(cb, state)
+        await bot_module.dispatch_callback(cb, state)
         state.set_state.assert_called_with(BookingState.waiting_for_time)
 
         # 3. Тап на слот
-        cb2 = _make_callback("slot|массаж|11:00|book")
+        cb2 = _make_button(Action.SLOT, "массаж", "11:00")
         state2 = _make_state(data={"action": "book", "event": "массаж"})
-        await bot_module.process_slot(cb2, state2)
+        await bot_module.dispatch_callback(cb2, state2)
         last_text = cb2.message.edit_text.call_args_list[-1][0][0]
         assert "записано" in last_text.lower() or "Записано" in last_text
 
         # 4. Проверяем запись
         bookings = get_all_user_bookings("123")
         assert len(bookings) == 1
-        assert bookings[0]["event"] == "массаж"
\ No newline at end of file
+        assert bookings[0]["event"] == "массаж"
+
+# ╔══════════════════════════════════════════════╗
+# ║  16. ФОНОВАЯ СИНХРОНИЗАЦИЯ                   ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _sheets_with(sheet, rows_by_event):
+    worksheets = {}
+    for ev, cfg in EVENTS_CONFIG.items():
+        ws = MagicMock()
+        rows = rows_by_event.get(ev, [])
+        ws.get_all_records.side_effect = lambda rows=rows: [dict(r) for r in rows]
+        worksheets[cfg["sheet"]] = ws
+    sheet.worksheet.side_effect = worksheets.__getitem__
+
+
+@pytest.mark.asyncio
+class TestBackgroundSync:
+    async def test_same_revision_skips_read(self, _patch_externals, monkeypatch):
+        sheet = _patch_externals["sheet"]
+        sheet.get_lastUpdateTime.return_value = "2026-10-19T10:00:00.000Z"
+        monkeypatch.setattr(bot_module, "_sheet_revision", "2026-10-19T10:00:00.000Z")
+        monkeypatch.setattr(bot_module, "_last_sync_ok", None)
+        assert await bot_module.background_sync() == 0
+        sheet.worksheet.assert_not_called()
+        assert bot_module._last_sync_ok is not None
+
+    async def test_only_changed_rows_touch_reminders(self, _patch_externals, monkeypatch):
+        sheet = _patch_externals["sheet"]
+        sheet.get_lastUpdateTime.return_value = "v2"
+        monkeypatch.setattr(bot_module, "_sheet_revision", "v1")
+        reminders = MagicMock()
+        monkeypatch.setattr(bot_module, "reminders", reminders)
+        aroma = ({"ID": 5, "Время": "14:00", "Мастер/Детали": "Записано"},)
+        bot_module._sheet_cache.update({ev: () for ev in EVENTS_CONFIG})
+        bot_module._sheet_cache["аромапсихолог"] = aroma
+        bot_module._sheet_cache["массаж"] = ({"ID": 1, "Время": "11:00", "Мастер/Детали": "Мастер №1 Виктор"},
+                                             {"ID": 2, "Время": "11:00", "Мастер/Детали": "Мастер №2 Нарек"})
+        _sheets_with(sheet, {
+            "аромапсихолог": list(aroma),
+            "массаж": [{"ID": 2, "Время": "12:00", "Мастер/Детали": "Мастер №2 Нарек"}],
+        })
+
+        assert await bot_module.background_sync() == 1
+
+        assert bot_module._sheet_cache["аромапсихолог"] is aroma
+        assert [r["ID"] for r in bot_module._sheet_cache["массаж"]] == [2]
+        assert reminders.cancel.call_args_list == [(("1", "массаж"),), (("2", "массаж"),)]
+        reminders.schedule.assert_called_once_with("2", "массаж", "12:00")
+        reminders.rebuild_from.assert_not_called()
+        assert bot_module._sheet_revision == "v2"
+
+    async def test_sheet_written_during_read_is_deferred(self, _patch_externals, monkeypatch):
+        sheet = _patch_externals["sheet"]
+        sheet.get_lastUpdateTime.return_value = "v2"
+        monkeypatch.setattr(bot_module, "_sheet_revision", "v1")
+        reminders = MagicMock()
+        monkeypatch.setattr(bot_module, "reminders", reminders)
+        bot_module._sheet_cache.update({ev: () for ev in EVENTS_CONFIG})
+        booked = {"ID": 1, "Время": "11:00", "Мастер/Детали": "Мастер №1 Виктор"}
+        admin = {"ID": 9, "Время": "15:00", "Мастер/Детали": "Мастер №2 Нарек"}
+        aroma = {"ID": 5, "Время": "14:00", "Мастер/Детали": "Записано"}
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            # Строки прочитаны до записи бота: в массаже только правка администратора
+            started.set()
+            release.wait(5)
+            return {**{ev: () for ev in EVENTS_CONFIG}, "массаж": (admin,), "аромапсихолог": (aroma,)}
+
+        monkeypatch.setattr(bot_module, "_fetch_all_sheets_sync", slow_fetch)
+        sync = asyncio.create_task(bot_module.background_sync())
+        await asyncio.to_thread(started.wait, 5)
+        async with bot_module.get_lock("массаж"):
+            bot_module._sheet_cache["массаж"] = (booked,)
+        release.set()
+
+        assert await sync == 1
+        # Лист массажа отложен: запись бота не затёрта устаревшими строками
+        assert bot_module._sheet_cache["массаж"] == (booked,)
+        assert bot_module._sheet_cache["аромапсихолог"] == (aroma,)
+        reminders.cancel.assert_not_called()
+        reminders.schedule.assert_called_once_with("5", "аромапсихолог", "14:00")
+        assert bot_module._sheet_revision == "v1"
+
+    async def test_failed_sync_backs_off(self, _patch_externals, monkeypatch):
+        """Ошибка чтения доходит до sync_loop — интервал растёт, а не остаётся прежним."""
+        sheet = _patch_externals["sheet"]
+        sheet.get_lastUpdateTime.return_value = "v2"
+        monkeypatch.setattr(bot_module, "_sheet_revision", "v1")
+        sheet.worksheet.side_effect = ConnectionError("sheets down")
+        loop = bot_module.sync_loop
+        monkeypatch.setattr(loop, "interval", loop.min_interval)
+        monkeypatch.setattr(loop, "stats", dict(loop.stats))
+        errors = loop.stats["errors"]
+
+        with pytest.raises(ConnectionError):
+            await bot_module.background_sync()
+        assert await loop.run_once()
+
+        assert loop.interval > loop.min_interval
+        assert loop.stats["errors"] == errors + 1
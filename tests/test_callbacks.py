@@ -0,0 +1,152 @@
+# tests/test_callbacks.py
+
+import base64
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.config import MASTERS_CONFIG
+from presentation.callbacks import Action, Callback, CallbackCodec, codec
+from presentation import handlers
+from presentation.keyboards import build_masters_keyboard, build_slot_keyboard
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. КОДЕК                                    ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestCallbackCodec:
+    @pytest.mark.parametrize("action", list(Action))
+    def test_roundtrip_every_action(self, action):
+        data = codec.encode(action, "салон предчувствий", "12:15", MASTERS_CONFIG["салон предчувствий"][1]["id"])
+        assert codec.decode(data) == Callback(
+            action, "салон предчувствий", "12:15", MASTERS_CONFIG["салон предчувствий"][1]["id"], False,
+        )
+
+    def test_short_ascii(self):
+        """Вместо ~90 байт UTF-8 в старом формате — 8 ASCII-символов."""
+        data = codec.encode(Action.MASTER, "салон предчувствий", "12:00", "Специалист Натэлла", mode="reschedule")
+        assert len(data.encode("utf-8")) == 8
+        assert data.isascii()
+
+    def test_reschedule_flag(self):
+        cb = codec.decode(codec.encode(Action.SLOT, "массаж", "11:10", mode="reschedule"))
+        assert cb.reschedule and cb.mode == "reschedule"
+        assert codec.decode(codec.encode(Action.SLOT, "массаж", "11:10")).mode == "book"
+
+    def test_optional_fields(self):
+        assert codec.decode(codec.encode(Action.BACK_TO_SERVICES)) == Callback(Action.BACK_TO_SERVICES)
+
+    @pytest.mark.parametrize("data", [
+        None, "", "back_to_services", "slot|массаж|12:00|book", "!!!!!!!!", "AAAAAAAA",
+    ])
+    def test_foreign_or_broken_data(self, data):
+        assert codec.decode(data) is None
+
+    def test_other_version_rejected(self):
+        data = codec.encode(Action.START_BOOK, "массаж")
+        raw = bytearray(base64.urlsafe_b64decode(data))
+        raw[0] = 99
+        assert codec.decode(base64.urlsafe_b64encode(bytes(raw)).decode()) is None
+
+    def test_own_config(self):
+        """bot.py использует собственные конфиги — кодек к ним привязывается."""
+        own = CallbackCodec(["a", "b"], {"b": [{"id": "m1"}, {"id": "m2"}]})
+        assert own.decode(own.encode(Action.MASTER, "b", "09:05", "m2")).master_id == "m2"
+
+    def test_filter_injects_callback(self):
+        check = codec.filter(Action.MASTER)
+        query = MagicMock(data=codec.encode(Action.MASTER, "массаж", "12:00", MASTERS_CONFIG["массаж"][0]["id"]))
+        assert check(query)["cb"].master_id == MASTERS_CONFIG["массаж"][0]["id"]
+        assert check(MagicMock(data=codec.encode(Action.SLOT, "массаж", "12:00"))) is False
+
+    def test_only_booking_changes_are_mutating(self):
+        assert codec.mutating(MagicMock(data=codec.encode(Action.SLOT, "массаж", "12:00")))
+        assert codec.mutating(MagicMock(data=codec.encode(Action.CANCEL_BOOKING, "массаж")))
+        assert not codec.mutating(MagicMock(data=codec.encode(Action.START_BOOK, "массаж")))
+        assert not codec.mutating(MagicMock(data=codec.encode(Action.BACK_TO_SERVICES)))
+        assert not codec.mutating(MagicMock(data="back_to_services"))
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. КЛАВИАТУРЫ И ДИСПЕТЧЕРИЗАЦИЯ             ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _buttons(kb):
+    return [b for row in kb.inline_keyboard for b in row]
+
+
+class TestKeyboards:
+    def test_slot_keyboard_is_packed(self):
+        kb = build_slot_keyboard("массаж", [("11:00", 3), ("11:10", 2)], action="reschedule")
+        cbs = [codec.decode(b.callback_data) for b in _buttons(kb)]
+        assert [(c.action, c.time, c.mode) for c in cbs] == [
+            (Action.SLOT, "11:00", "reschedule"), (Action.SLOT, "11:10", "reschedule"),
+        ]
+
+    def test_masters_keyboard_is_packed(self):
+        kb = build_masters_keyboard("массаж", "12:00", MASTERS_CONFIG["массаж"])
+        ids = [codec.decode(b.callback_data).master_id for b in _buttons(kb)[:-1]]
+        assert ids == [m["id"] for m in MASTERS_CONFIG["массаж"]]
+
+
+def _callback(data: str):
+    callback = MagicMock()
+    callback.data = data
+    callback.from_user.id = 42
+    callback.from_user.username = "user"
+    callback.from_user.full_name = "User"
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    return callback
+
+
+@pytest.mark.asyncio
+class TestDispatch:
+    async def test_every_action_has_handler(self):
+        assert set(handlers.CALLBACK_HANDLERS) == set(Action)
+
+    async def test_stale_button_answered(self):
+        callback = _callback("slot|массаж|12:00|book")
+        await handlers.dispatch_callback(callback, MagicMock())
+        callback.answer.assert_awaited_once()
+        assert callback.answer.await_args.kwargs["show_alert"] is True
+
+    async def test_master_selection_uses_config_master(self):
+        """Кнопка мастера бронирует ровно выбранного мастера, даже если часть занята."""
+        event = "салон предчувствий"
+        _, free = MASTERS_CONFIG[event]  # первый специалист занят
+        service = MagicMock()
+        service.execute_booking = AsyncMock(return_value={"ok": True, "text": "ok"})
+        service.hold_slot = AsyncMock(return_value={"ok": True})
+        service.get_available_masters = AsyncMock(return_value=[free])
+
+        callback = _callback(codec.encode(Action.SLOT, event, "12:00"))
+        await handlers.dispatch_callback(callback, service)
+        kb = callback.message.edit_text.await_args.kwargs["reply_markup"]
+        master_button = _buttons(kb)[0]
+
+        await handlers.dispatch_callback(_callback(master_button.callback_data), service)
+        assert service.execute_booking.await_args.kwargs["master_id"] == free["id"]
+
+    async def test_confirm_overlap_without_master(self):
+        service = MagicMock()
+        service.execute_booking = AsyncMock(return_value={"ok": True, "text": "ok"})
+        callback = _callback(codec.encode(Action.CONFIRM_OVERLAP, "массаж", "12:00", mode="reschedule"))
+        await handlers.dispatch_callback(callback, service)
+        kwargs = service.execute_booking.await_args.kwargs
+        assert kwargs["master_id"] is None and kwargs["force"] and kwargs["is_reschedule"]
+
+    async def test_full_slot_offers_waitlist(self):
+        """«Мест нет» → кнопка листа ожидания, которая ставит в очередь на тот же слот."""
+        service = MagicMock()
+        service.execute_booking = AsyncMock(return_value={"ok": False, "text": "Мест нет."})
+        service.join_waitlist = AsyncMock(return_value={"ok": True, "position": 1, "text": "в очереди"})
+        callback = _callback(codec.encode(Action.SLOT, "аромапсихолог", "14:00"))
+        await handlers.dispatch_callback(callback, service)
+        button = _buttons(callback.message.edit_text.await_args.kwargs["reply_markup"])[0]
+
+        await handlers.dispatch_callback(_callback(button.callback_data), service)
+        kwargs = service.join_waitlist.await_args.kwargs
+        assert (kwargs["event"], kwargs["time_str"]) == ("аромапсихолог", "14:00")
@@ -48,10 +48,6 @@ def clean_state():
 
     bot_module.sheet = mock_sheet
 
-    mock_scheduler = MagicMock()
-    mock_scheduler.get_job.return_value = None
-    bot_module.scheduler = mock_scheduler
-
     bot_module.bot = AsyncMock()
 
     yield {"worksheet": mock_ws, "sheet": mock_sheet}
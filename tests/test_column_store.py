@@ -0,0 +1,83 @@
+# tests/test_column_store.py
+
+import pytest
+
+from core.config import MASTERS_CONFIG
+from core.models import BookingRecord
+from infrastructure import column_store
+from infrastructure.column_store import ColumnStoreRepository, EventColumns
+from services.booking_service import BookingService
+from tests.test_booking_service import CountingRepository, DiffRepository
+
+EVENT = "массаж"
+VICTOR, NAREK, OLGA = (m["id"] for m in MASTERS_CONFIG[EVENT])
+
+
+def _r(uid, time_str="12:00", master=VICTOR):
+    return BookingRecord(uid, f"u{uid}", f"User {uid}", EVENT, time_str, master)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. СТОЛБЦЫ                                  ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestEventColumns:
+    @pytest.mark.parametrize("numpy", [True, False])
+    def test_counts(self, numpy, monkeypatch):
+        if not numpy:
+            monkeypatch.setattr(column_store, "np", None)
+        columns = EventColumns(EVENT, [_r("1"), _r("2", master=NAREK), _r("3", "12:10"), _r("4", "23:59", "Записано")])
+        assert columns.slot_counts() == {"12:00": 2, "12:10": 1, "23:59": 1}
+        assert columns.master_loads() == {VICTOR: 2, NAREK: 1, "Записано": 1}
+
+    def test_records_round_trip(self):
+        records = [_r("1"), _r("2", "12:10", OLGA)]
+        columns = EventColumns(EVENT, records)
+        assert list(columns.snapshot()) == records
+        assert columns.snapshot() is columns.snapshot()
+
+    def test_remove_and_move(self):
+        columns = EventColumns(EVENT, [_r("1"), _r("2"), _r("3")])
+        columns.remove(["2"])
+        columns.move("3", "12:20", OLGA)
+        assert [(r.user_id, r.time, r.master_id) for r in columns.snapshot()] == [
+            ("1", "12:00", VICTOR), ("3", "12:20", OLGA)
+        ]
+        assert columns.slot.itemsize == 2
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. РЕПОЗИТОРИЙ И СЕРВИС                     ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestColumnStoreRepository:
+    async def test_writes_reach_backend_and_columns(self):
+        backend = CountingRepository()
+        backend.data[EVENT] = [_r("1")]
+        repo = ColumnStoreRepository(backend)
+        await repo.sync()
+        service = BookingService(repo)
+
+        assert (await service.execute_booking("2", "u2", "User 2", EVENT, "12:00"))["ok"]
+        assert (await service.execute_booking("2", "u2", "User 2", EVENT, "12:10", is_reschedule=True))["ok"]
+        await service.cancel_booking("1", EVENT)
+
+        assert [(r.user_id, r.time) for r in backend.data[EVENT]] == [("2", "12:10")]
+        assert [(r.user_id, r.time) for r in await repo.get_records(EVENT)] == [("2", "12:10")]
+        occupancy = await service.occupancy(EVENT)
+        assert occupancy["12:10"] == 1 and occupancy["12:00"] == 0
+        assert list(occupancy) == service.get_slot_list(EVENT)
+
+    async def test_sync_applies_backend_row_diff(self):
+        backend = DiffRepository()
+        backend.sheet[EVENT] = [_r("1"), _r("2")]
+        repo = ColumnStoreRepository(backend)
+        await repo.sync()
+        backend.sheet[EVENT] = [_r("2", "12:30"), _r("3")]
+        await repo.sync()
+        assert set(repo.sync_changes()) == {EVENT}
+        assert sorted((r.user_id, r.time) for r in await repo.get_records(EVENT)) == [("2", "12:30"), ("3", "12:00")]
+        assert repo.columns(EVENT).slot_counts() == {"12:00": 1, "12:30": 1}
@@ -0,0 +1,115 @@
+# tests/test_event_log.py
+
+import pytest
+
+from core.models import BookingRecord
+from infrastructure.event_log import EventLogRepository
+from services.booking_service import BookingService
+from services.slot_holds import SlotHolds
+
+EVENT = "аромапсихолог"
+
+
+def _r(uid, time_str="14:00", event=EVENT):
+    return BookingRecord(uid, f"u{uid}", f"User {uid}", event, time_str, "Записано")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "bookings.jsonl")
+
+
+async def _open(path, **kwargs):
+    repo = EventLogRepository(path, clock=lambda: 1000.0, **kwargs)
+    await repo.sync()
+    return repo
+
+
+async def _state(repo):
+    return [(r.user_id, r.time) for r in await repo.get_records(EVENT)]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ЖУРНАЛ И ПРОИГРЫВАНИЕ                    ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestReplay:
+    async def test_state_restored_after_restart(self, path):
+        repo = await _open(path)
+        await repo.add_record(_r("1"))
+        await repo.add_records([_r("2"), _r("3", "14:10")])
+        await repo.move_record(EVENT, "1", "14:20", "Записано")
+        await repo.delete_record(EVENT, "2")
+        await repo.close()
+
+        again = await _open(path)
+        assert await _state(again) == [("1", "14:20"), ("3", "14:10")]
+        assert again.metrics()["replayed"] == 4
+
+    async def test_torn_last_line_dropped(self, path):
+        repo = await _open(path)
+        await repo.add_record(_r("1"))
+        await repo.close()
+        with open(path, "ab") as f:
+            f.write(b'{"seq": 2, "op": "bo')
+
+        again = await _open(path)
+        assert await _state(again) == [("1", "14:00")]
+        await again.add_record(_r("2"))
+        await again.close()
+        assert await _state(await _open(path)) == [("1", "14:00"), ("2", "14:00")]
+
+    async def test_numeric_cell_loaded_as_string(self, path):
+        """Числовая ячейка в журнале (ручная правка, импорт) не роняет загрузку."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"seq": 1, "op": "book", "event": "%s", "user_id": "1", "record": ["1", "u1", "User 1", "14:00", 3]}\n' % EVENT)
+
+        repo = await _open(path)
+        (record,) = await repo.get_records(EVENT)
+        assert record.master_id == "3"
+        assert record.master_id is BookingRecord("2", "", "", EVENT, "14:10", "3").master_id
+
+    async def test_import_replaces_state(self, path):
+        repo = await _open(path)
+        await repo.add_record(_r("1"))
+        repo.import_records([_r("7", "15:00"), _r("8", "10:00", event="макияж")])
+        assert await _state(repo) == [("7", "15:00")]
+        assert [r.user_id for r in await repo.get_records("макияж")] == ["8"]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. СНИМКИ И ИСТОРИЯ                         ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestCompaction:
+    async def test_restart_reads_only_tail(self, path):
+        repo = await _open(path, compact_every=3)
+        for i in range(5):
+            await repo.add_record(_r(str(i), "14:10" if i % 2 else "14:00"))
+        await repo.close()
+        assert repo.metrics()["compactions"] == 1
+
+        again = await _open(path, compact_every=3)
+        assert again.metrics()["replayed"] == 2
+        assert [uid for uid, _ in await _state(again)] == ["0", "1", "2", "3", "4"]
+        assert (await again.snapshot(EVENT)).count("14:10") == 2
+
+    async def test_history_keeps_everything(self, path):
+        repo = await _open(path, compact_every=2)
+        await repo.add_record(_r("1", "12:20"))
+        await repo.move_record(EVENT, "1", "14:00", "Записано")
+        await repo.delete_records([(EVENT, "1"), (EVENT, "2")])
+        ops = [(e["op"], e.get("time")) for e in repo.history(user_id="1")]
+        assert ops == [("book", None), ("move", "14:00"), ("cancel", None)]
+        assert repo.history(user_id="1")[0]["record"][3] == "12:20"
+
+    async def test_service_logs_holds(self, path):
+        repo = await _open(path)
+        service = BookingService(repo, holds=SlotHolds())
+        assert (await service.hold_slot("1", EVENT, "14:00"))["ok"]
+        assert (await service.execute_booking("1", "u1", "User 1", EVENT, "14:00"))["ok"]
+        assert [e["op"] for e in repo.history(user_id="1")] == ["hold", "book"]
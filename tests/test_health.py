@@ -102,4 +102,13 @@ async def test_readyz_returns_cached_events_count():
     bot_module._sheet_cache = {"массаж": [], "макияж": [], "гадалки": []}
     resp = await handle_readyz(_make_request())
     assert resp.status == 200
-    assert b'"cached_events": 3' in resp.body
\ No newline at end of file
+    assert b'"cached_events": 3' in resp.body
+
+# ── Metrics ──
+
+@pytest.mark.asyncio
+async def test_metrics_reports_outbound_queue():
+    """/metrics отдаёт глубину исходящей очереди."""
+    resp = await bot_module.handle_metrics(_make_request())
+    assert resp.status == 200
+    assert b'"queue_depth": 0' in resp.body
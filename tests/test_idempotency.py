@@ -0,0 +1,167 @@
+# tests/test_idempotency.py
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiogram.types import Update
+
+from infrastructure.idempotency import CallbackIdempotencyMiddleware, IdempotencyCache, callback_key
+
+TOKEN = "1234567890:ABCdefGHIjklMNOpqrsTUVwxyz123456789"
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _counting(result="ok", delay=0.0):
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+
+    return factory, calls
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. КЭШ РЕЗУЛЬТАТОВ                          ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestIdempotencyCache:
+    async def test_repeat_returns_cached_result(self):
+        cache = IdempotencyCache()
+        factory, calls = _counting({"ok": True})
+        assert await cache.run("k", factory) == ({"ok": True}, False)
+        assert await cache.run("k", factory) == ({"ok": True}, True)
+        assert len(calls) == 1
+
+    async def test_concurrent_duplicates_run_once(self):
+        cache = IdempotencyCache()
+        factory, calls = _counting("booked", delay=0.01)
+        results = await asyncio.gather(*(cache.run("k", factory) for _ in range(5)))
+        assert len(calls) == 1
+        assert [r for r, _ in results] == ["booked"] * 5
+        assert sum(dup for _, dup in results) == 4
+
+    async def test_expires_after_ttl(self):
+        clock = FakeClock()
+        cache = IdempotencyCache(ttl=10, clock=clock)
+        factory, calls = _counting()
+        await cache.run("k", factory)
+        clock.t += 11
+        assert await cache.run("k", factory) == ("ok", False)
+        assert len(calls) == 2
+        assert cache.metrics()["entries"] == 1
+
+    async def test_in_flight_head_does_not_block_purge(self):
+        clock = FakeClock()
+        cache = IdempotencyCache(ttl=10, clock=clock)
+        slow, _ = _counting(delay=0.05)
+        head = asyncio.create_task(cache.run("slow", slow))
+        await asyncio.sleep(0)
+        for i in range(3):
+            await cache.run(f"k{i}", _counting()[0])
+        clock.t += 11
+        await cache.run("fresh", _counting()[0])
+        # Истёкшие завершённые за «зависшей» головой удалены, сама голова ждёт результата
+        assert cache.metrics()["entries"] == 2
+        assert await head == ("ok", False)
+
+    async def test_error_is_not_cached(self):
+        cache = IdempotencyCache()
+        failing = AsyncMock(side_effect=RuntimeError("sheets down"))
+        with pytest.raises(RuntimeError):
+            await cache.run("k", failing)
+        factory, calls = _counting()
+        assert await cache.run("k", factory) == ("ok", False)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. MIDDLEWARE ДЛЯ CALLBACK                  ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _callback_update(update_id: int, data: str = "slot", message_id: int = 7, user_id: int = 100) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+            "message": {
+                "message_id": message_id, "date": 1_760_000_000,
+                "chat": {"id": user_id, "type": "private"}, "text": "слоты",
+            },
+        },
+    }
+
+
+@pytest.mark.asyncio
+class TestCallbackMiddleware:
+    async def test_key_includes_message_and_data(self):
+        a = Update.model_validate(_callback_update(1)).callback_query
+        b = Update.model_validate(_callback_update(2)).callback_query
+        c = Update.model_validate(_callback_update(3, message_id=8)).callback_query
+        assert callback_key(a) == callback_key(b) == (100, 7, "slot")
+        assert callback_key(c) != callback_key(a)
+
+    async def test_double_tap_books_once(self):
+        """Одинаковые тапы (одновременно и подряд) выполняют хэндлер один раз на кнопку."""
+        execute_booking = AsyncMock(return_value={"ok": True})
+        router = Router()
+
+        @router.callback_query()
+        async def on_slot(callback: types.CallbackQuery):
+            await asyncio.sleep(0.01)
+            return await execute_booking(callback.from_user.id, callback.data)
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        dp.callback_query.outer_middleware(CallbackIdempotencyMiddleware(IdempotencyCache()))
+        bot = Bot(TOKEN)
+        answered = AsyncMock()
+        try:
+            with pytest.MonkeyPatch.context() as mp:
+                mp.setattr(types.CallbackQuery, "answer", answered)
+                updates = [Update.model_validate(_callback_update(i), context={"bot": bot}) for i in range(3)]
+                await asyncio.gather(dp.feed_update(bot, updates[0]), dp.feed_update(bot, updates[1]))
+                await dp.feed_update(bot, updates[2])
+                # Другая кнопка того же сообщения — выполняется
+                await dp.feed_update(bot, Update.model_validate(_callback_update(4, data="other"), context={"bot": bot}))
+        finally:
+            await bot.session.close()
+        assert execute_booking.await_count == 2
+        assert answered.await_count == 2  # «часики» сняты у обоих дублей
+
+    async def test_navigation_is_not_deduplicated(self):
+        """Сообщение редактируется на месте: «назад» → та же услуга снова открывает её, а не молчит."""
+        opened = AsyncMock()
+        router = Router()
+
+        @router.callback_query()
+        async def on_callback(callback: types.CallbackQuery):
+            await opened(callback.data)
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        dp.callback_query.outer_middleware(CallbackIdempotencyMiddleware(
+            IdempotencyCache(), mutating=lambda callback: callback.data == "slot"))
+        bot = Bot(TOKEN)
+        try:
+            with pytest.MonkeyPatch.context() as mp:
+                mp.setattr(types.CallbackQuery, "answer", AsyncMock())
+                for i, data in enumerate(["service", "back", "service", "slot", "slot"]):
+                    update = Update.model_validate(_callback_update(i, data=data), context={"bot": bot})
+                    await dp.feed_update(bot, update)
+        finally:
+            await bot.session.close()
+        assert [c.args[0] for c in opened.await_args_list] == ["service", "back", "service", "slot"]
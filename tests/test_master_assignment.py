@@ -0,0 +1,88 @@
+# tests/test_master_assignment.py
+
+import pytest
+
+from core.config import MASTERS_CONFIG
+from core.masters import MASTER_MASKS
+from core.models import BookingRecord
+from services.booking_service import BookingService
+from services.master_assignment import STRATEGIES, AssignmentStrategy, get_strategy
+from services.occupancy import OccupancyIndex
+from tests.test_booking_service import InMemoryRepository
+
+EVENT = "массаж"
+VICTOR, NAREK, OLGA = MASTERS_CONFIG[EVENT]
+SLOTS = BookingService(InMemoryRepository()).get_slot_list(EVENT)
+
+
+def _index(*bookings):
+    return OccupancyIndex.build(
+        BookingRecord(f"u{i}", "", "", EVENT, time_str, master) for i, (time_str, master) in enumerate(bookings)
+    )
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. СТРАТЕГИИ                                ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestStrategies:
+    @pytest.mark.parametrize("name", list(STRATEGIES))
+    def test_returns_free_master(self, name):
+        free = [NAREK, OLGA]
+        assert get_strategy(name).choose(_index(), EVENT, "11:00", free, SLOTS) in free
+
+    def test_unknown_strategy(self):
+        with pytest.raises(ValueError):
+            get_strategy("nope")
+
+    def test_base_is_abstract(self):
+        with pytest.raises(TypeError):
+            AssignmentStrategy()
+
+    def test_least_loaded(self):
+        index = _index(("11:00", VICTOR["id"]), ("11:10", VICTOR["id"]), ("11:20", NAREK["id"]))
+        assert get_strategy("least_loaded").choose(index, EVENT, "12:00", [VICTOR, NAREK, OLGA], SLOTS) is OLGA
+
+    def test_break_aware_packs_next_to_break(self):
+        """13:20 — перед перерывом Виктора: запись к нему не рвёт чужое свободное время."""
+        assert get_strategy("break_aware").choose(_index(), EVENT, "13:20", [VICTOR, NAREK, OLGA], SLOTS) is VICTOR
+
+    def test_most_free_counts_breaks(self):
+        index = _index(("11:00", NAREK["id"]))
+        # У Виктора и Ольги по перерыву, у Нарека ещё и запись
+        choice = get_strategy("most_free").choose(index, EVENT, "12:00", [VICTOR, NAREK, OLGA], SLOTS)
+        assert choice in (VICTOR, OLGA)
+
+
+@pytest.mark.asyncio
+class TestServiceAssignment:
+    async def test_booking_uses_strategy(self):
+        service = BookingService(InMemoryRepository(), assignment=get_strategy("least_loaded"))
+        for i, time_str in enumerate(["11:00", "11:10", "11:20"]):
+            await service.execute_booking(str(i), "", "", EVENT, time_str)
+        assert sorted(r.master_id for r in service.repo.data[EVENT]) == sorted(m["id"] for m in MASTERS_CONFIG[EVENT])
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. БИТОВЫЕ МАСКИ                            ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestMasterMasks:
+    def test_breaks_and_bookings(self):
+        masks = MASTER_MASKS[EVENT]
+        # 13:30 — перерыв Виктора
+        assert masks.members(masks.free("13:30")) == [NAREK, OLGA]
+        index = _index(("13:30", NAREK["id"]), ("13:30", "Записано"))
+        free = masks.free("13:30", index.busy_mask(EVENT, "13:30"))
+        assert free.bit_count() == 1 and free & masks.bit(OLGA["id"])
+        assert masks.bit("Записано") == 0
+
+    def test_index_clears_bit_on_remove(self):
+        record = BookingRecord("1", "", "", EVENT, "12:00", VICTOR["id"])
+        index = OccupancyIndex.build([record])
+        assert index.busy_mask(EVENT, "12:00") == MASTER_MASKS[EVENT].bit(VICTOR["id"])
+        index.remove(record)
+        assert index.busy_mask(EVENT, "12:00") == 0
+
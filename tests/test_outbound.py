@@ -0,0 +1,185 @@
+# tests/test_outbound.py
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from infrastructure.rate_limit import TokenBucket
+from infrastructure.telegram_outbound import (
+    Lane, OutboundDispatcher, OutboundRequestMiddleware, OutboundStopped, background_lane,
+)
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. TOKEN BUCKET                             ║
+# ╚══════════════════════════════════════════════╝
+
+
+class TestTokenBucket:
+    def test_burst_then_delay(self):
+        b = TokenBucket(rate=10, capacity=2)
+        assert b.consume(now=b._updated)
+        assert b.consume(now=b._updated)
+        assert not b.consume(now=b._updated)
+        assert b.delay(now=b._updated) == pytest.approx(0.1)
+
+    def test_refill(self):
+        b = TokenBucket(rate=10, capacity=1)
+        t0 = b._updated
+        assert b.consume(now=t0)
+        assert b.consume(now=t0 + 0.1)
+
+    def test_block(self):
+        b = TokenBucket(rate=100, capacity=5)
+        b.block(0.5)
+        assert b.delay() > 0.4
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. ДИСПЕТЧЕР                                ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestOutboundDispatcher:
+    async def test_passthrough_when_not_started(self):
+        """Без start() запрос уходит сразу — удобно для тестов и скриптов."""
+        d = OutboundDispatcher()
+        call = AsyncMock(return_value="ok")
+        assert await d.submit(call, chat_id=1) == "ok"
+        call.assert_awaited_once()
+
+    async def test_returns_result(self):
+        d = OutboundDispatcher()
+        d.start()
+        try:
+            assert await d.submit(AsyncMock(return_value=42), chat_id=1) == 42
+            assert d.metrics()["sent"] == 1
+        finally:
+            await d.stop()
+
+    async def test_interactive_before_background(self):
+        """При исчерпанном глобальном лимите интерактив обслуживается первым."""
+        d = OutboundDispatcher(global_rate=20, per_chat_rate=100, per_chat_burst=100)
+        d._global.tokens = 0
+        order = []
+
+        def make(tag):
+            async def call():
+                order.append(tag)
+            return call
+
+        d.start()
+        try:
+            tasks = [asyncio.create_task(d.submit(make(f"bg{i}"), chat_id=i, lane=Lane.BACKGROUND)) for i in range(3)]
+            tasks += [asyncio.create_task(d.submit(make(f"ui{i}"), chat_id=10 + i)) for i in range(3)]
+            await asyncio.sleep(0)
+            assert d.metrics()["queue_depth"] == 6
+            assert d.metrics()["queue_depth_background"] == 3
+            await asyncio.gather(*tasks)
+        finally:
+            await d.stop()
+        assert order[:3] == ["ui0", "ui1", "ui2"]
+
+    async def test_background_lane_context(self):
+        d = OutboundDispatcher()
+        d._worker = MagicMock()  # не обрабатываем очередь
+        with background_lane():
+            task = asyncio.create_task(d.submit(AsyncMock(), chat_id=1))
+        await asyncio.sleep(0)
+        assert d.metrics()["queue_depth_background"] == 1
+        task.cancel()
+
+    async def test_per_chat_limit_does_not_block_other_chats(self):
+        d = OutboundDispatcher(global_rate=1000, per_chat_rate=0.5, per_chat_burst=1)
+        sent = []
+
+        def make(tag):
+            async def call():
+                sent.append(tag)
+            return call
+
+        d.start()
+        try:
+            await d.submit(make("a1"), chat_id=1)
+            slow = asyncio.create_task(d.submit(make("a2"), chat_id=1))
+            await d.submit(make("b1"), chat_id=2)
+            assert sent == ["a1", "b1"]
+            slow.cancel()
+        finally:
+            await d.stop()
+
+    async def test_retry_after_is_retried(self):
+        method = SendMessage(chat_id=1, text="x")
+        call = AsyncMock(side_effect=[TelegramRetryAfter(method, "flood", 0), "ok"])
+        d = OutboundDispatcher(per_chat_rate=100)
+        d.start()
+        try:
+            assert await d.submit(call, chat_id=1) == "ok"
+        finally:
+            await d.stop()
+        assert call.await_count == 2
+        assert d.metrics()["retry_after"] == 1
+
+    async def test_retry_after_gives_up(self):
+        method = SendMessage(chat_id=1, text="x")
+        call = AsyncMock(side_effect=TelegramRetryAfter(method, "flood", 0))
+        d = OutboundDispatcher(per_chat_rate=100, max_retries=2)
+        d.start()
+        try:
+            with pytest.raises(TelegramRetryAfter):
+                await d.submit(call, chat_id=1)
+        finally:
+            await d.stop()
+        assert call.await_count == 3
+        assert d.metrics()["failed"] == 1
+
+    async def test_stop_fails_queued_jobs(self):
+        """Запросы, не дождавшиеся лимита, получают OutboundStopped, а не висят."""
+        d = OutboundDispatcher(global_rate=1000, per_chat_rate=0.01, per_chat_burst=1)
+        d.start()
+        await d.submit(AsyncMock(), chat_id=1)
+        queued = asyncio.create_task(d.submit(AsyncMock(), chat_id=1))
+        await asyncio.sleep(0)
+        assert d.queue_depth == 1
+        await d.stop()
+        with pytest.raises(OutboundStopped):
+            await asyncio.wait_for(queued, timeout=1)
+        assert d.queue_depth == 0
+
+    async def test_stop_waits_for_in_flight(self):
+        """Уже отправленный запрос доходит до конца и отдаёт свой результат."""
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "ok"
+
+        d = OutboundDispatcher()
+        d.start()
+        pending = asyncio.create_task(d.submit(call, chat_id=1))
+        await asyncio.sleep(0.01)
+        stopping = asyncio.create_task(d.stop())
+        await asyncio.sleep(0)
+        assert not stopping.done()
+        release.set()
+        await stopping
+        assert await pending == "ok"
+
+    async def test_middleware_skips_methods_without_chat(self):
+        d = OutboundDispatcher()
+        d.submit = AsyncMock()
+        mw = OutboundRequestMiddleware(d)
+        make_request = AsyncMock(return_value="updates")
+        method = MagicMock(spec=[])
+        assert await mw(make_request, MagicMock(), method) == "updates"
+        d.submit.assert_not_called()
+
+    async def test_middleware_routes_chat_methods(self):
+        d = OutboundDispatcher()
+        mw = OutboundRequestMiddleware(d)
+        make_request = AsyncMock(return_value="sent")
+        assert await mw(make_request, MagicMock(), SendMessage(chat_id=5, text="hi")) == "sent"
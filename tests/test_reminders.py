@@ -0,0 +1,120 @@
+# tests/test_reminders.py
+
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from services.reminder_service import ReminderService, ReminderStore
+
+
+def _at(hh_mm: str) -> datetime:
+    now = datetime.now()
+    h, m = map(int, hh_mm.split(":"))
+    return now.replace(hour=h, minute=m, second=0, microsecond=0)
+
+
+@pytest.fixture
+def frozen_now():
+    """Фиксируем «сейчас» = 10:00 сегодняшнего дня."""
+    fake_now = _at("10:00")
+    with patch("services.reminder_service.datetime") as dt:
+        dt.now.return_value = fake_now
+        dt.strptime.side_effect = datetime.strptime
+        yield fake_now
+
+
+def _service(path=":memory:", sender=None, **kwargs):
+    return ReminderService(ReminderStore(path), sender or AsyncMock(), **kwargs)
+
+
+@pytest.mark.asyncio
+class TestReminderService:
+    async def test_fires_three_minutes_before(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        assert await svc.fire_due(_at("13:56")) == 0
+        assert await svc.fire_due(_at("13:57")) == 1
+        svc.sender.assert_awaited_once_with("1", "массаж", "14:00")
+
+    async def test_fires_once(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        await svc.fire_due(_at("13:57"))
+        assert await svc.fire_due(_at("13:58")) == 0
+
+    async def test_past_booking_not_scheduled(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "макияж", "09:30")
+        assert svc.metrics()["pending"] == 0
+
+    async def test_cancel(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        svc.cancel("1", "массаж")
+        assert await svc.fire_due(_at("14:00")) == 0
+
+    async def test_reschedule_replaces(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        svc.schedule("1", "массаж", "15:00")
+        assert svc.metrics()["pending"] == 1
+        assert await svc.fire_due(_at("13:57")) == 0
+        assert await svc.fire_due(_at("14:57")) == 1
+
+    async def test_batch_of_fifty_is_concurrency_limited(self, frozen_now):
+        """50 напоминаний в 14:57 уходят одной пачкой, не больше N параллельно."""
+        active = 0
+        peak = 0
+
+        async def sender(*_):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        svc = _service(sender=sender, concurrency=5)
+        for i in range(50):
+            svc.schedule(str(i), "массаж", "15:00")
+        assert await svc.fire_due(_at("14:57")) == 50
+        assert peak == 5
+        assert svc.metrics()["sent"] == 50
+
+    async def test_sender_error_does_not_break_batch(self, frozen_now):
+        sender = AsyncMock(side_effect=[RuntimeError("boom"), None])
+        svc = _service(sender=sender)
+        svc.schedule("1", "массаж", "14:00")
+        svc.schedule("2", "массаж", "14:00")
+        assert await svc.fire_due(_at("13:57")) == 2
+        assert svc.metrics() == {"pending": 0, "sent": 1, "failed": 1, "notices": 0}
+
+    async def test_survives_restart(self, frozen_now, tmp_path):
+        path = str(tmp_path / "reminders.sqlite3")
+        _service(path).schedule("1", "массаж", "14:00")
+
+        restarted = _service(path)
+        assert await restarted.fire_due(_at("13:57")) == 1
+
+    async def test_rebuild_keeps_sent_marks(self, frozen_now):
+        """Пересборка после рестарта не дублирует уже отправленные напоминания."""
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        await svc.fire_due(_at("13:57"))
+
+        svc.rebuild_from([("1", "массаж", "14:00"), ("2", "макияж", "11:00")])
+        assert svc.metrics()["pending"] == 1
+        assert await svc.fire_due(_at("14:00")) == 1
+        svc.sender.assert_awaited_with("2", "макияж", "11:00")
+
+    async def test_rebuild_drops_cancelled(self, frozen_now):
+        svc = _service()
+        svc.schedule("1", "массаж", "14:00")
+        svc.rebuild_from([])
+        assert svc.metrics()["pending"] == 0
+
+    async def test_missed_reminder_sent_on_first_tick(self, frozen_now):
+        """Если бот лежал в минуту напоминания, но запись ещё впереди — шлём сразу."""
+        svc = _service()
+        svc.rebuild_from([("1", "макияж", "10:02")])
+        assert await svc.fire_due(frozen_now) == 1
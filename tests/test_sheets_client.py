@@ -0,0 +1,231 @@
+# tests/test_sheets_client.py
+
+import asyncio
+import pytest
+
+from core.config import EVENTS_CONFIG
+from core.models import BookingRecord
+from infrastructure.google_sheets import GoogleSheetsRepository
+from infrastructure.sheets_client import SheetsAPIError
+from services.booking_service import BookingService
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. КЛИЕНТ                                   ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestSheetsClient:
+    async def test_token_fetched_once_and_reused(self, client, fake):
+        await client.sheet_ids()
+        await client.sheet_ids()
+        assert fake.tokens_issued == 1
+        assert client.metrics() == {"requests": 2, "token_refreshes": 1}
+
+    async def test_revoked_token_refreshed(self, client, fake):
+        await client.sheet_ids()
+        fake.revoke = True
+        await client.sheet_ids()
+        assert fake.tokens_issued == 2
+
+    async def test_error_carries_status(self, client, fake):
+        await client.sheet_ids()
+        fake.fail_next = 429
+        with pytest.raises(SheetsAPIError) as e:
+            await client.sheet_ids()
+        assert e.value.status == 429 and e.value.retry_after == 2.0
+
+    async def test_append_and_read_back(self, client):
+        await client.append_rows("'Массаж'!A1", [["1", "u", "U", "12:00", "Мастер №1 Виктор"]])
+        [rows] = await client.batch_get(["'Массаж'"])
+        assert rows[1] == ["1", "u", "U", "12:00", "Мастер №1 Виктор"]
+
+    async def test_session_is_reused(self, client):
+        await client.sheet_ids()
+        session = client._session
+        await client.sheet_ids()
+        assert client._session is session
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. РЕПОЗИТОРИЙ                              ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestGoogleSheetsRepository:
+    async def test_sync_reads_all_sheets_in_one_call(self, client, fake):
+        fake.sheets["Массаж"]["rows"].append(["7", "u7", "User 7", "12:00", "Мастер №2 Нарек"])
+        fake.sheets["Макияж"]["rows"].append(["8", "u8"])  # неполная строка
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.sync()
+        assert [c for c in fake.calls if c[1] == "/values:batchGet"] == fake.calls
+        assert await repo.get_records("массаж") == (
+            BookingRecord("7", "u7", "User 7", "массаж", "12:00", "Мастер №2 Нарек"),
+        )
+        assert (await repo.get_records("макияж"))[0].time == ""
+        assert repo.get_last_sync_time() is not None
+
+    async def test_rows_parsed_by_header_into_shared_strings(self, client, fake):
+        fake.sheets["Массаж"]["rows"] = [["Время", "ID", "Мастер/Детали", "Заметка"],
+                                        ["12:00", "1", "Мастер №1 Виктор", "x"],
+                                        ["12:00", "2"]]
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.sync()
+        first, second = await repo.get_records("массаж")
+        assert (first.user_id, first.username, first.time, first.master_id) == ("1", "", "12:00", "Мастер №1 Виктор")
+        assert (second.user_id, second.master_id) == ("2", "")
+        assert first.time is second.time
+        with pytest.raises(AttributeError):
+            first.time = "13:00"
+
+    async def test_add_and_delete(self, client, fake):
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.add_record(BookingRecord("1", "u1", "User 1", "массаж", "12:00", "Мастер №1 Виктор"))
+        await repo.add_record(BookingRecord("2", "u2", "User 2", "массаж", "12:10", "Мастер №1 Виктор"))
+        await repo.delete_record("массаж", "1")
+        assert [r[0] for r in fake.sheets["Массаж"]["rows"]] == ["ID", "2"]
+        assert [r.user_id for r in await repo.get_records("массаж")] == ["2"]
+
+    async def test_add_records_single_batch(self, client, fake):
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.add_records([
+            BookingRecord("1", "u1", "User 1", "массаж", "12:00", "Мастер №1 Виктор"),
+            BookingRecord("1", "u1", "User 1", "макияж", "10:00", "Записано"),
+        ])
+        assert [c for c in fake.calls if c[1] == ":batchUpdate"] == [("POST", ":batchUpdate")]
+        assert fake.sheets["Макияж"]["rows"][1][3] == "10:00"
+
+    async def test_delete_records_one_batch_bottom_up(self, client, fake):
+        fake.sheets["Массаж"]["rows"] += [["1"], ["2"], ["1"]]
+        fake.sheets["Макияж"]["rows"] += [["1"], ["3"]]
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.sync()
+        fake.calls.clear()
+        await repo.delete_records([("массаж", "1"), ("макияж", "1")])
+        assert [c for c in fake.calls if c[1] != ""] == [("GET", "/values:batchGet"), ("POST", ":batchUpdate")]
+        assert fake.sheets["Массаж"]["rows"][1:] == [["2"]]
+        assert fake.sheets["Макияж"]["rows"][1:] == [["3"]]
+        assert [r.user_id for r in await repo.get_records("массаж")] == ["2"]
+
+    async def test_move_updates_row_in_place(self, client, fake):
+        fake.sheets["Массаж"]["rows"] += [["1", "u1", "User 1", "12:00", "Мастер №1 Виктор"],
+                                          ["2", "u2", "User 2", "12:00", "Мастер №2 Нарек"]]
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.sync()
+        before = await repo.get_records("массаж")
+        fake.calls.clear()
+        await repo.move_record("массаж", "1", "13:00", "Мастер №2 Нарек")
+        assert [c for c in fake.calls if c[0] == "POST"] == [("POST", "/values:batchUpdate")]
+        assert fake.sheets["Массаж"]["rows"][1] == ["1", "u1", "User 1", "13:00", "Мастер №2 Нарек"]
+        # Новый снимок с записью на прежней позиции; выданный ранее снимок не меняется
+        after = await repo.get_records("массаж")
+        assert [(r.user_id, r.time) for r in after] == [("1", "13:00"), ("2", "12:00")]
+        assert [(r.user_id, r.time) for r in before] == [("1", "12:00"), ("2", "12:00")]
+        assert (await repo.snapshot("массаж")).count("12:00") == 1
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  3. ПРОВЕРКА ИЗМЕНЕНИЙ ПРИ СИНХРОНИЗАЦИИ     ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _massage(uid, time_str="12:00", master="Мастер №1 Виктор"):
+    return [uid, f"u{uid}", f"User {uid}", time_str, master]
+
+
+@pytest.mark.asyncio
+class TestChangeDetection:
+    async def test_same_version_skips_read(self, drive_client, fake):
+        fake.edit("Массаж", [_massage("1")])
+        repo = GoogleSheetsRepository("", "", client=drive_client)
+        await repo.sync()
+        fake.calls.clear()
+        await repo.sync()
+        assert fake.calls == [] and fake.drive_calls == 2
+        assert repo.sync_changes() == {}
+        assert repo.metrics()["sync"]["skipped"] == 1
+        assert [r.user_id for r in await repo.get_records("массаж")] == ["1"]
+
+    async def test_changed_sheet_applied_as_row_diff(self, drive_client, fake):
+        fake.edit("Массаж", [_massage("1"), _massage("2")])
+        fake.edit("Макияж", [["3", "u3", "User 3", "10:00", "Записано"]])
+        repo = GoogleSheetsRepository("", "", client=drive_client)
+        await repo.sync()
+        makeup = await repo.snapshot("макияж")
+
+        fake.edit("Массаж", [_massage("1"), _massage("2", "13:00"), _massage("4")])
+        await repo.sync()
+        [(event, diff)] = repo.sync_changes().items()
+        assert event == "массаж"
+        assert [(r.user_id, r.time) for r in diff.removed] == [("2", "12:00")]
+        assert [(r.user_id, r.time) for r in diff.added] == [("2", "13:00"), ("4", "12:00")]
+        assert {(r.user_id, r.time) for r in await repo.get_records("массаж")} == {
+            ("1", "12:00"), ("2", "13:00"), ("4", "12:00")
+        }
+        # Неизменённый лист не разбирался — снимок тот же объект
+        assert await repo.snapshot("макияж") is makeup
+        assert repo.metrics()["sync"]["sheets_unchanged"] == len(EVENTS_CONFIG) - 1
+
+    async def test_own_writes_give_empty_diff(self, drive_client, fake):
+        repo = GoogleSheetsRepository("", "", client=drive_client)
+        await repo.sync()
+        await repo.add_record(BookingRecord("1", "u1", "User 1", "массаж", "12:00", "Мастер №1 Виктор"))
+        await repo.sync()
+        assert fake.calls[-1] == ("GET", "/values:batchGet")
+        assert repo.sync_changes() == {}
+
+    async def test_without_drive_every_sync_reads(self, client, fake):
+        repo = GoogleSheetsRepository("", "", client=client)
+        await repo.sync()
+        await repo.sync()
+        assert fake.calls == [("GET", "/values:batchGet")] * 2 and fake.drive_calls == 0
+
+    async def test_booking_during_slow_read_is_kept(self, drive_client, fake):
+        repo = GoogleSheetsRepository("", "", client=drive_client)
+        service = BookingService(repo)
+        await service.sync()
+        # Администратор добавил строку, затем бот записал пользователя, пока sync читал лист
+        fake.edit("Массаж", [_massage("9", "15:00")])
+        gate = asyncio.Event()
+        fake.read_gate = gate
+        sync = asyncio.create_task(service.sync())
+        await fake.read_started.wait()
+        result = await service.execute_booking("1", "u1", "User 1", "массаж", "12:00",
+                                               master_id="Мастер №1 Виктор")
+        gate.set()
+        await sync
+
+        assert result["ok"]
+        # Прочитанные строки не застали запись — лист отложен, а не «удалил» её
+        assert "массаж" not in repo.sync_changes()
+        assert repo.metrics()["sync"]["sheets_deferred"] == 1
+        assert [r.user_id for r in await repo.get_records("массаж")] == ["1"]
+        assert (await service.occupancy("массаж"))["12:00"] == 1
+        # Версия не запомнена: следующий sync перечитывает лист и применяет правку администратора
+        await service.sync()
+        assert [r.user_id for r in repo.sync_changes()["массаж"].added] == ["9"]
+        assert {r.user_id for r in await repo.get_records("массаж")} == {"1", "9"}
+        assert [r.user_id for r in await service.get_user_bookings("1")] == ["1"]
+
+    async def test_cancel_during_slow_read_stays_cancelled(self, drive_client, fake):
+        fake.edit("Массаж", [_massage("1")])
+        repo = GoogleSheetsRepository("", "", client=drive_client)
+        service = BookingService(repo)
+        await service.sync()
+        fake.edit("Массаж", [_massage("1"), _massage("9", "15:00")])
+        gate = asyncio.Event()
+        fake.read_gate = gate
+        sync = asyncio.create_task(service.sync())
+        await fake.read_started.wait()
+        await service.cancel_booking("1", "массаж")
+        gate.set()
+        await sync
+
+        # Отменённая запись не возвращается из прочитанных до отмены строк
+        assert await repo.get_records("массаж") == ()
+        assert await service.get_user_bookings("1") == ()
+        await service.sync()
+        assert [r.user_id for r in await repo.get_records("массаж")] == ["9"]
+        assert await service.get_user_bookings("1") == ()
@@ -0,0 +1,128 @@
+# tests/test_sheets_quota.py
+
+import asyncio
+import random
+import pytest
+
+from infrastructure.sheets_client import SheetsAPIError
+from infrastructure.sheets_quota import SheetsQuota, background_sheets
+
+
+def _quota(**kwargs):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    quota = SheetsQuota(rng=random.Random(1), sleep=sleep, **kwargs)
+    return quota, delays
+
+
+def _failing(*errors, result="ok"):
+    errors = list(errors)
+
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return call
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ПОВТОРЫ                                  ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestRetries:
+    async def test_read_5xx_retried_with_jittered_backoff(self):
+        quota, delays = _quota(base_delay=1.0)
+        assert await quota.run("read", _failing(SheetsAPIError(500, "x"), SheetsAPIError(503, "x"))) == "ok"
+        assert len(delays) == 2
+        assert 0 <= delays[0] <= 1.0 and 0 <= delays[1] <= 2.0
+        assert quota.stats["read"]["retries"] == 2
+
+    async def test_write_5xx_not_retried(self):
+        """Запись могла примениться — повтор задвоил бы строку."""
+        quota, delays = _quota()
+        with pytest.raises(SheetsAPIError):
+            await quota.run("write", _failing(SheetsAPIError(500, "x")))
+        assert delays == [] and quota.stats["write"]["failed"] == 1
+
+    async def test_429_blocks_bucket_by_retry_after(self):
+        quota, delays = _quota()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        assert await quota.run("write", _failing(SheetsAPIError(429, "quota", retry_after=0.05))) == "ok"
+        assert loop.time() - start >= 0.05
+        assert quota.stats["write"]["throttled"] == 1
+
+    async def test_gives_up_after_max_retries(self):
+        quota, delays = _quota(max_retries=2)
+        with pytest.raises(SheetsAPIError):
+            await quota.run("read", _failing(*[SheetsAPIError(502, "x")] * 5))
+        assert len(delays) == 2 and quota.stats["read"]["failed"] == 1
+
+    async def test_client_errors_not_retried(self):
+        quota, delays = _quota()
+        with pytest.raises(SheetsAPIError):
+            await quota.run("read", _failing(SheetsAPIError(400, "bad range")))
+        assert delays == []
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. КВОТЫ И ПРИОРИТЕТЫ                       ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestQuota:
+    async def test_interactive_before_background(self):
+        quota, _ = _quota(reads_per_minute=1200)  # токен раз в 50 мс
+        quota._buckets["read"].tokens = 0
+        order = []
+
+        async def call(name):
+            order.append(name)
+
+        async def background():
+            with background_sheets():
+                await quota.run("read", lambda: call("sync"))
+
+        sync = asyncio.create_task(background())
+        await asyncio.sleep(0)
+        await quota.run("read", lambda: call("user"))
+        await sync
+        assert order == ["user", "sync"]
+
+    async def test_reads_do_not_spend_write_quota(self):
+        quota, _ = _quota(reads_per_minute=60, writes_per_minute=60)
+        for _ in range(30):
+            await quota.run("read", _failing())
+        metrics = quota.metrics()
+        assert metrics["read"]["headroom"] == pytest.approx(0.5, abs=0.02)
+        assert metrics["write"]["headroom"] == 1.0
+
+    async def test_headroom_is_zero_while_throttled(self):
+        quota, _ = _quota()
+        quota._buckets["read"].block(5.0)
+        assert quota.headroom("read") == 0.0
+        assert quota.headroom("write") == 1.0
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        quota, _ = _quota(reads_per_minute=60)
+        quota._buckets["read"].tokens = 0
+        task = asyncio.create_task(quota.run("read", _failing()))
+        await asyncio.sleep(0.01)
+        assert quota.metrics()["read"]["waiting"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert quota.metrics()["read"]["waiting"] == 0
+
+    async def test_client_retries_throttled_request(self, client, fake):  # noqa: F811
+        client.quota, _ = _quota()
+        await client.sheet_ids()
+        fake.fail_next, fake.retry_after = 429, "0.05"
+        assert await client.sheet_ids()
+        assert client.metrics()["quota"]["read"]["throttled"] == 1
@@ -0,0 +1,196 @@
+# tests/test_timer_wheel.py
+
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from infrastructure.timer_wheel import TimerWheel, WHEEL_SLOTS, WHEEL_BLOCKS
+from services.reminder_service import ReminderService, ReminderStore
+
+T0 = 1_700_000_040.0  # начало минуты
+MIN = 60.0
+
+
+class FakeClock:
+    def __init__(self, t: float = T0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _wheel(clock=None):
+    return TimerWheel(clock=clock or FakeClock())
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ПЛАНИРОВАНИЕ И ОТМЕНА                    ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestSchedule:
+    async def test_fires_at_its_minute(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule(("1", "массаж"), T0 + 5 * MIN, handler, "a")
+        assert await wheel.run_due(T0 + 4 * MIN) == 0
+        assert await wheel.run_due(T0 + 5 * MIN) == 1
+        handler.assert_awaited_once_with(["a"])
+        assert len(wheel) == 0
+
+    async def test_cancel(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", T0 + MIN, handler)
+        assert wheel.cancel("k")
+        assert not wheel.cancel("k")
+        assert await wheel.run_due(T0 + 10 * MIN) == 0
+        handler.assert_not_awaited()
+
+    async def test_reschedule_replaces(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", T0 + MIN, handler, "old")
+        wheel.schedule("k", T0 + 3 * MIN, handler, "new")
+        assert len(wheel) == 1
+        assert await wheel.run_due(T0 + 2 * MIN) == 0
+        await wheel.run_due(T0 + 3 * MIN)
+        handler.assert_awaited_once_with(["new"])
+
+    async def test_past_due_fires_on_next_tick(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", T0 - 10 * MIN, handler)
+        assert await wheel.run_due(T0 + MIN) == 1
+
+    async def test_accepts_datetime(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", datetime.fromtimestamp(T0 + 2 * MIN), handler)
+        assert await wheel.run_due(T0 + 2 * MIN) == 1
+
+    async def test_sync_handler(self):
+        wheel = _wheel()
+        got = []
+        wheel.schedule("k", T0 + MIN, got.extend, "x")
+        await wheel.run_due(T0 + MIN)
+        assert got == ["x"]
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. УРОВНИ КОЛЕСА                            ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestLevels:
+    @pytest.mark.parametrize("minutes", [59, 61, 3 * WHEEL_SLOTS + 7, WHEEL_SLOTS * WHEEL_BLOCKS + 30])
+    async def test_fires_exactly_once_across_levels(self, minutes):
+        """Таймеры в часах и сутках вперёд каскадируются и срабатывают ровно в свой тик."""
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", T0 + minutes * MIN, handler)
+        assert await wheel.run_due(T0 + (minutes - 1) * MIN) == 0
+        assert await wheel.run_due(T0 + minutes * MIN) == 1
+
+    async def test_overflow_is_counted(self):
+        wheel = _wheel()
+        wheel.schedule("far", T0 + 2 * WHEEL_SLOTS * WHEEL_BLOCKS * MIN, AsyncMock())
+        assert wheel.metrics()["overflow"] == 1
+
+    async def test_cancel_after_cascade(self):
+        wheel = _wheel()
+        handler = AsyncMock()
+        wheel.schedule("k", T0 + 2 * WHEEL_SLOTS * MIN, handler)
+        await wheel.run_due(T0 + (WHEEL_SLOTS + 30) * MIN)
+        assert wheel.cancel("k")
+        assert await wheel.run_due(T0 + 3 * WHEEL_SLOTS * MIN) == 0
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  3. ПАЧКИ И ФОНОВЫЙ ЦИКЛ                     ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestBatches:
+    async def test_one_call_per_handler_per_tick(self):
+        wheel = _wheel()
+        reminders, holds = AsyncMock(), AsyncMock()
+        for i in range(50):
+            wheel.schedule(("r", i), T0 + MIN, reminders, i)
+        wheel.schedule(("h", 1), T0 + MIN, holds, "hold")
+        assert await wheel.run_due(T0 + MIN) == 51
+        reminders.assert_awaited_once()
+        assert sorted(reminders.await_args.args[0]) == list(range(50))
+        holds.assert_awaited_once_with(["hold"])
+
+    async def test_handler_error_does_not_break_others(self):
+        wheel = _wheel()
+        ok = AsyncMock()
+        wheel.schedule("a", T0 + MIN, AsyncMock(side_effect=RuntimeError("boom")))
+        wheel.schedule("b", T0 + MIN, ok)
+        assert await wheel.run_due(T0 + MIN) == 2
+        ok.assert_awaited_once()
+
+    async def test_background_loop(self):
+        """Фоновая задача просыпается на границе тика и раздаёт пачку."""
+        wheel = TimerWheel(tick_seconds=0.01, clock=lambda: asyncio.get_running_loop().time())
+        fired = asyncio.Event()
+        wheel.schedule("k", asyncio.get_running_loop().time() + 0.03, lambda _: fired.set())
+        wheel.start()
+        try:
+            await asyncio.wait_for(fired.wait(), timeout=1)
+        finally:
+            await wheel.stop()
+        assert wheel.metrics()["fired"] == 1
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  4. НАПОМИНАНИЯ ЧЕРЕЗ КОЛЕСО                 ║
+# ╚══════════════════════════════════════════════╝
+
+
+def _at(hh_mm: str) -> datetime:
+    h, m = map(int, hh_mm.split(":"))
+    return datetime.now().replace(hour=h, minute=m, second=0, microsecond=0)
+
+
+@pytest.fixture
+def frozen_now():
+    fake_now = _at("10:00")
+    with patch("services.reminder_service.datetime") as dt:
+        dt.now.return_value = fake_now
+        dt.strptime.side_effect = datetime.strptime
+        yield fake_now
+
+
+@pytest.mark.asyncio
+class TestRemindersOnWheel:
+    async def test_reminder_fires_from_wheel(self, frozen_now):
+        wheel = TimerWheel(clock=FakeClock(frozen_now.timestamp()))
+        svc = ReminderService(ReminderStore(":memory:"), AsyncMock(), wheel=wheel)
+        svc.schedule("1", "массаж", "14:00")
+        assert ("reminder", "1", "массаж") in wheel
+        assert await wheel.run_due(_at("13:56").timestamp()) == 0
+        assert await wheel.run_due(_at("13:57").timestamp()) == 1
+        svc.sender.assert_awaited_once_with("1", "массаж", "14:00")
+        # Отметка в хранилище: после рестарта не отправим повторно
+        assert svc.metrics()["pending"] == 0
+
+    async def test_cancel_removes_timer(self, frozen_now):
+        wheel = TimerWheel(clock=FakeClock(frozen_now.timestamp()))
+        svc = ReminderService(ReminderStore(":memory:"), AsyncMock(), wheel=wheel)
+        svc.schedule("1", "массаж", "14:00")
+        svc.cancel("1", "массаж")
+        assert len(wheel) == 0
+
+    async def test_rebuild_syncs_wheel(self, frozen_now):
+        wheel = TimerWheel(clock=FakeClock(frozen_now.timestamp()))
+        svc = ReminderService(ReminderStore(":memory:"), AsyncMock(), wheel=wheel)
+        svc.schedule("1", "массаж", "14:00")
+        svc.rebuild_from([("2", "макияж", "11:00")])
+        assert ("reminder", "1", "массаж") not in wheel
+        assert ("reminder", "2", "макияж") in wheel
@@ -0,0 +1,173 @@
+# tests/test_update_scheduler.py
+
+import asyncio
+import pytest
+
+from aiogram.types import Update
+
+from infrastructure.update_scheduler import UpdateScheduler, UpdateSchedulingMiddleware, update_key
+
+
+def _update(update_id: int, user_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": "x",
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+        },
+    })
+
+
+async def _run_load(workers: int, users: int, per_user: int, delay: float):
+    """Нагрузка: users пользователей по per_user тапов, каждый хэндлер «спит» delay.
+
+    Возвращает пик одновременно работающих хэндлеров, журнал, число пересечений
+    хэндлеров одного пользователя и планировщик — без замеров времени.
+    """
+    log = []
+    active_users = set()
+    overlaps = 0
+    peak = 0
+
+    def job(user, seq):
+        async def run():
+            nonlocal overlaps, peak
+            if user in active_users:
+                overlaps += 1
+            active_users.add(user)
+            peak = max(peak, len(active_users))
+            await asyncio.sleep(delay)
+            active_users.discard(user)
+            log.append((user, seq))
+        return run
+
+    scheduler = UpdateScheduler(workers=workers, max_pending=users * per_user)
+    scheduler.start()
+    # Тапы перемешаны между пользователями, как в реальном потоке апдейтов
+    for seq in range(per_user):
+        for user in range(users):
+            assert scheduler.submit(user, job(user, seq))
+    await scheduler.stop()
+    return peak, log, overlaps, scheduler
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ПОРЯДОК И ПАРАЛЛЕЛИЗМ                    ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestUpdateScheduler:
+    async def test_fifo_within_user(self):
+        _, log, overlaps, _ = await _run_load(workers=8, users=5, per_user=10, delay=0)
+        for user in range(5):
+            assert [seq for u, seq in log if u == user] == list(range(10))
+        assert overlaps == 0
+
+    async def test_same_user_never_runs_concurrently(self):
+        """Двойной тап (slot, затем c_ov) одного пользователя не гоняется сам с собой."""
+        _, _, overlaps, _ = await _run_load(workers=8, users=1, per_user=20, delay=0.001)
+        assert overlaps == 0
+
+    async def test_idle_queues_evicted(self):
+        _, _, _, scheduler = await _run_load(workers=4, users=50, per_user=2, delay=0)
+        assert scheduler.metrics()["queues"] == 0
+        assert scheduler.metrics()["processed"] == 100
+
+    async def test_rejects_over_limit(self):
+        scheduler = UpdateScheduler(workers=1, max_pending=2)
+
+        async def noop():
+            pass
+
+        assert scheduler.submit(1, noop) and scheduler.submit(2, noop)
+        assert not scheduler.submit(3, noop)
+        assert scheduler.metrics()["rejected"] == 1
+
+    async def test_put_waits_for_space(self):
+        scheduler = UpdateScheduler(workers=1, max_pending=1)
+        gate = asyncio.Event()
+
+        async def blocked():
+            await gate.wait()
+
+        scheduler.start()
+        await scheduler.put(1, blocked)
+        waiting = asyncio.create_task(scheduler.put(2, blocked))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        gate.set()
+        await asyncio.wait_for(waiting, timeout=1)
+        await scheduler.stop()
+
+    async def test_handler_error_does_not_stop_queue(self):
+        scheduler = UpdateScheduler(workers=1)
+        done = []
+
+        async def boom():
+            raise RuntimeError("boom")
+
+        async def ok():
+            done.append(1)
+
+        scheduler.start()
+        scheduler.submit(1, boom)
+        scheduler.submit(1, ok)
+        await scheduler.stop()
+        assert done == [1]
+        assert scheduler.metrics()["failed"] == 1
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  2. НАГРУЗКА: МАСШТАБИРОВАНИЕ ПО N           ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestLoad:
+    @pytest.mark.parametrize("workers", [1, 4, 16])
+    async def test_concurrency_scales_with_workers(self, workers):
+        """40 пользователей × 5 тапов: одновременно работают ровно N хэндлеров, порядок сохранён."""
+        peak, log, overlaps, _ = await _run_load(workers, users=40, per_user=5, delay=0.001)
+        assert peak == workers
+        assert overlaps == 0
+        for user in range(40):
+            assert [seq for u, seq in log if u == user] == list(range(5))
+
+    async def test_single_user_does_not_scale(self):
+        """Один пользователь остаётся последовательным при любом N."""
+        peak, log, overlaps, _ = await _run_load(workers=16, users=1, per_user=20, delay=0.001)
+        assert peak == 1
+        assert overlaps == 0
+        assert len(log) == 20
+
+    async def test_users_limited_by_workers(self):
+        """Пользователей меньше, чем воркеров, — параллелизм не выше числа пользователей."""
+        peak, _, overlaps, _ = await _run_load(workers=16, users=3, per_user=10, delay=0.001)
+        assert peak == 3
+        assert overlaps == 0
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  3. КЛЮЧИ И MIDDLEWARE                       ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestMiddleware:
+    async def test_update_key_is_user(self):
+        assert update_key(_update(1, user_id=77)) == 77
+
+    async def test_middleware_enqueues_and_returns(self):
+        scheduler = UpdateScheduler(workers=2)
+        mw = UpdateSchedulingMiddleware(scheduler)
+        handled = []
+
+        async def handler(event, data):
+            handled.append((event.update_id, data["x"]))
+
+        scheduler.start()
+        for i in range(3):
+            assert await mw(handler, _update(i, user_id=5), {"x": i}) is None
+        await scheduler.stop()
+        assert handled == [(0, 0), (1, 1), (2, 2)]
@@ -0,0 +1,149 @@
+# tests/test_webhook.py
+
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from aiogram import Bot, Dispatcher, Router, types
+from aiohttp.test_utils import TestClient, TestServer
+
+from infrastructure.update_scheduler import UpdateScheduler
+from infrastructure.webhook import SECRET_HEADER, TelegramWebhook
+from web.health import HealthServer
+
+TOKEN = "1234567890:ABCdefGHIjklMNOpqrsTUVwxyz123456789"
+
+
+def _recorded_message(update_id: int, user_id: int = 100, text: str = "Моя программа") -> dict:
+    """Апдейт в том виде, в каком его присылает Telegram."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1_760_000_000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+            "text": text,
+        },
+    }
+
+
+def _recorded_callback(update_id: int, user_id: int = 100, data: str = "AQEA__8A") -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Анна"},
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1, "date": 1_760_000_000,
+                "chat": {"id": user_id, "type": "private"}, "text": "меню",
+            },
+        },
+    }
+
+
+def _dispatcher(seen: list, gate: asyncio.Event = None) -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def on_message(message: types.Message, marker: str):
+        if gate:
+            await gate.wait()
+        seen.append((message.text, marker))
+
+    @router.callback_query()
+    async def on_callback(callback: types.CallbackQuery, marker: str):
+        seen.append((callback.data, marker))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def _client(webhook: TelegramWebhook) -> TestClient:
+    health = HealthServer(MagicMock(), port=0)
+    webhook.register(health.app)
+    health.add_metrics("webhook", webhook.metrics)
+    client = TestClient(TestServer(health.app))
+    await client.start_server()
+    return client
+
+
+# ╔══════════════════════════════════════════════╗
+# ║  1. ПРИЁМ АПДЕЙТОВ                           ║
+# ╚══════════════════════════════════════════════╝
+
+
+@pytest.mark.asyncio
+class TestWebhook:
+    async def test_recorded_updates_are_processed(self):
+        seen = []
+        bot = Bot(TOKEN)
+        webhook = TelegramWebhook(_dispatcher(seen), bot, "/tg", marker="di")
+        webhook.scheduler.start()
+        client = await _client(webhook)
+        try:
+            for update in (_recorded_message(1), _recorded_callback(2)):
+                resp = await client.post("/tg", json=update)
+                assert resp.status == 200
+            await webhook.stop()
+        finally:
+            await client.close()
+            await bot.session.close()
+        assert seen == [("Моя программа", "di"), ("AQEA__8A", "di")]
+
+    async def test_ack_before_processing(self):
+        """Telegram получает 200 сразу, даже если хэндлер ещё работает."""
+        seen, gate = [], asyncio.Event()
+        bot = Bot(TOKEN)
+        webhook = TelegramWebhook(_dispatcher(seen, gate), bot, "/tg", marker="x")
+        webhook.scheduler.start()
+        client = await _client(webhook)
+        try:
+            resp = await asyncio.wait_for(client.post("/tg", json=_recorded_message(1)), timeout=1)
+            assert resp.status == 200
+            assert seen == []
+            gate.set()
+            await webhook.stop()
+        finally:
+            await client.close()
+            await bot.session.close()
+        assert seen == [("Моя программа", "x")]
+
+    async def test_secret_token_checked(self):
+        bot = Bot(TOKEN)
+        webhook = TelegramWebhook(_dispatcher([]), bot, "/tg", secret_token="s3cret", marker="x")
+        client = await _client(webhook)
+        try:
+            assert (await client.post("/tg", json=_recorded_message(1))).status == 401
+            resp = await client.post("/tg", json=_recorded_message(1), headers={SECRET_HEADER: "s3cret"})
+            assert resp.status == 200
+        finally:
+            await client.close()
+            await bot.session.close()
+
+    async def test_full_queue_asks_telegram_to_retry(self):
+        bot = Bot(TOKEN)
+        webhook = TelegramWebhook(_dispatcher([]), bot, "/tg", scheduler=UpdateScheduler(max_pending=1), marker="x")
+        client = await _client(webhook)  # воркеры не запущены — очередь не разбирается
+        try:
+            assert (await client.post("/tg", json=_recorded_message(1))).status == 200
+            resp = await client.post("/tg", json=_recorded_message(2))
+            assert resp.status == 503
+            metrics = await (await client.get("/metrics")).json()
+            assert metrics["webhook"]["rejected"] == 1
+        finally:
+            await client.close()
+            await bot.session.close()
+
+    async def test_malformed_update_acknowledged(self):
+        bot = Bot(TOKEN)
+        webhook = TelegramWebhook(_dispatcher([]), bot, "/tg", marker="x")
+        client = await _client(webhook)
+        try:
+            assert (await client.post("/tg", data=b"not json")).status == 200
+        finally:
+            await client.close()
+            await bot.session.close()
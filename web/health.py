@@ -1,5 +1,6 @@
 from aiohttp import web
 from datetime import datetime
+from typing import Callable, Dict
 from core.interfaces import IBookingRepository
 from core.config import SYNC_STALE_MINUTES
 
@@ -7,6 +8,16 @@ class HealthServer:
     def __init__(self, repo: IBookingRepository, port: int):
         self.repo = repo
         self.port = port
+        self._metrics: Dict[str, Callable[[], dict]] = {}
+        # Общее приложение: сюда же монтируется webhook Telegram
+        self.app = web.Application()
+        self.app.router.add_get("/healthz", self.handle_healthz)
+        self.app.router.add_get("/readyz", self.handle_readyz)
+        self.app.router.add_get("/metrics", self.handle_metrics)
+
+    def add_metrics(self, name: str, provider: Callable[[], dict]) -> None:
+        """Регистрирует источник метрик для /metrics (например, очередь исходящих)."""
+        self._metrics[name] = provider
 
     async def handle_healthz(self, request: web.Request):
         return web.json_response({"status": "alive"})
@@ -17,11 +28,12 @@ class HealthServer:
             return web.json_response({"status": "not ready"}, status=503)
         return web.json_response({"status": "ready"})
 
-    async def start(self):
-        app = web.Application()
-        app.router.add_get("/healthz", self.handle_healthz)
-        app.router.add_get("/readyz", self.handle_readyz)
-        runner = web.AppRunner(app)
+    async def handle_metrics(self, request: web.Request):
+        return web.json_response({name: provider() for name, provider in self._metrics.items()})
+
+    async def start(self) -> web.AppRunner:
+        runner = web.AppRunner(self.app)
         await runner.setup()
         site = web.TCPSite(runner, "0.0.0.0", self.port)
-        await site.start()
\ No newline at end of file
+        await site.start()
+        return runner